@@ -0,0 +1,70 @@
+"""
+Assorter means on a CVRTable: the per-CVR `assort` callable versus the NumPy kernel compiled from the spec.
+
+Builds `--cards` synthetic ranked CVRs for one contest with `--candidates` candidates, makes plurality,
+supermajority, and IRV assertions, and for each times
+    assort: Assorter.assort called on every card
+    kernel: Assorter.mean on a CVRTable, which evaluates the spec with Assorter.kernel
+and checks that they agree.
+
+    python benchmarks/assorter_kernels.py --cards 1000000 --candidates 6
+
+(with shangrla installed, or with the repository root on PYTHONPATH).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from shangrla.core.Audit import Assertion, Audit, Contest, CVR
+from shangrla.core.CVRTable import CVRTable
+from shangrla.core.NonnegMean import NonnegMean
+
+
+def timed(f) -> tuple:
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=200000)
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cands = [f"cand-{j}" for j in range(args.candidates)]
+    cvr_list = []
+    for i in range(args.cards):
+        ranked = rng.permutation(cands)[: rng.integers(0, args.candidates + 1)]
+        cvr_list.append(CVR(id=str(i), votes={"c": {str(c): r + 1 for r, c in enumerate(ranked)}}))
+    table = CVRTable.from_cvrs(cvr_list)
+
+    contest = Contest.from_dict({
+        "id": "c", "name": "c", "risk_limit": 0.05, "cards": args.cards, "n_winners": 1,
+        "choice_function": Contest.SOCIAL_CHOICE_FUNCTION.SUPERMAJORITY, "share_to_win": 2 / 3,
+        "candidates": cands, "winner": [cands[0]], "audit_type": Audit.AUDIT_TYPE.CARD_COMPARISON,
+        "test": NonnegMean.alpha_mart, "use_style": True,
+    })
+    assertions = list(Assertion.make_plurality_assertions(contest, cands[:1], cands[1:2]).values())
+    assertions += Assertion.make_supermajority_assertion(contest, 2 / 3, cands[0], cands[1:]).values()
+    assertions += Assertion.make_assertions_from_json(contest, cands, [
+        {"winner": cands[0], "loser": cands[1], "assertion_type": Assertion.WINNER_ONLY},
+        {"winner": cands[0], "loser": cands[1], "assertion_type": Assertion.IRV_ELIMINATION,
+         "already_eliminated": cands[2:]},
+    ]).values()
+
+    print(f"{'kind':>16} {'assort (s)':>10} {'kernel (s)':>10} {'speedup':>8}")
+    for a in assertions:
+        expected, assort_seconds = timed(lambda: np.mean([a.assorter.assort(c) for c in cvr_list]))
+        mean, kernel_seconds = timed(lambda: a.assorter.mean(table, use_style=False))
+        assert np.isclose(mean, expected)
+        print(f"{a.assorter.spec['kind']:>16} {assort_seconds:>10.3f} {kernel_seconds:>10.3f} "
+              f"{assort_seconds / kernel_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Scaling of CVR.set_card_in_batch_lex with the size of a tally batch.
+
+For each batch size, times the previous implementation (a linear `list.index` search per card) and the
+bulk implementation (one grouped sort) on `--pools` tally pools of that size, and checks that they agree.
+
+    python benchmarks/card_in_batch.py --sizes 1000 2000 5000 10000 20000 50000
+
+(with shangrla installed, or with the repository root on PYTHONPATH).
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from shangrla.core.Audit import CVR
+from shangrla.core.CVRTable import CVRTable
+
+
+def index_search(cvr_list) -> list:
+    tally_pool_dict = defaultdict(list)
+    for c in cvr_list:
+        tally_pool_dict[c.tally_pool].append(c.id)
+    for id_list in tally_pool_dict.values():
+        id_list.sort()
+    return [tally_pool_dict[c.tally_pool].index(c.id) for c in cvr_list]
+
+
+def timed(f) -> tuple:
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument("--pools", type=int, default=2, help="number of tally pools")
+    parser.add_argument("--max-index-search", type=int, default=50000,
+                        help="skip the list.index implementation above this batch size")
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'batch size':>10} {'index (s)':>10} {'bulk (s)':>10} {'table (s)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        n = size * args.pools
+        cvr_list = [
+            CVR(id=f"{rng.integers(10**9):09d}", tally_pool=f"pool-{i % args.pools}", votes={})
+            for i in range(n)
+        ]
+        table = CVRTable.from_cvrs(cvr_list)
+        _, bulk_seconds = timed(lambda: CVR.set_card_in_batch_lex(cvr_list))
+        _, table_seconds = timed(lambda: CVR.set_card_in_batch_lex(table))
+        assert table.card_in_batch.tolist() == [c.card_in_batch for c in cvr_list]
+        if size <= args.max_index_search:
+            expected, index_seconds = timed(lambda: index_search(cvr_list))
+            assert expected == [c.card_in_batch for c in cvr_list]
+            print(f"{size:>10} {index_seconds:>10.3f} {bulk_seconds:>10.3f} {table_seconds:>10.3f} "
+                  f"{index_seconds / bulk_seconds:>7.1f}x")
+        else:
+            print(f"{size:>10} {'':>10} {bulk_seconds:>10.3f} {table_seconds:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Memory used per card by CVR and CompactCVR on a synthetic election.
+
+Builds `--sample` cards of each kind from JSON text (so that, as with the Dominion and Hart readers, every
+card starts with its own copies of contest and candidate ids), measures the memory retained with tracemalloc,
+and extrapolates to `--cards` cards.
+
+    python benchmarks/cvr_memory.py --cards 5000000 --contests 40
+
+(with shangrla installed, or with the repository root on PYTHONPATH).
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+import numpy as np
+
+from shangrla.core.Audit import CVR, CompactCVR
+
+
+def synthetic_records(n: int, n_contests: int, n_candidates: int, contests_per_card: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        contests = rng.choice(n_contests, size=contests_per_card, replace=False)
+        votes = {
+            f"contest_{c:03d}": {f"candidate_{c:03d}_{rng.integers(n_candidates):02d}": 1}
+            for c in sorted(contests)
+        }
+        yield json.dumps({"id": f"{i % 1000}-{i // 1000}-{i}", "tally_pool": str(i % 1000), "votes": votes})
+
+
+def bytes_per_card(cls, records: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cvrs = [cls(**json.loads(r)) for r in records]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cvrs
+    return (after - before) / len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=5_000_000, help="number of cards to extrapolate to")
+    parser.add_argument("--sample", type=int, default=20_000, help="number of cards actually built")
+    parser.add_argument("--contests", type=int, default=40, help="number of contests in the election")
+    parser.add_argument("--contests-per-card", type=int, default=None, help="default: all contests")
+    parser.add_argument("--candidates", type=int, default=4, help="candidates per contest")
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args()
+    per_card = args.contests_per_card or args.contests
+
+    records = list(synthetic_records(args.sample, args.contests, args.candidates, per_card, args.seed))
+    # the CompactCVRs of the sample share intern tables, as those read by one reader call do. Intern the labels
+    # before measuring, so the shared tables are not charged to the sample.
+    with CompactCVR.interning() as interned:
+        CompactCVR.from_cvrs([CVR(**json.loads(r)) for r in records[:100]])
+        for cls in (CVR, CompactCVR):
+            b = bytes_per_card(cls, records)
+            gib = b * args.cards / 2**30
+            print(f"{cls.__name__:>10}: {b:8.0f} bytes/card; {gib:7.2f} GiB for {args.cards:,} cards")
+    print(f"intern tables: {len(interned.contests)} contests, {len(interned.candidates)} candidates")
+
+
+if __name__ == "__main__":
+    main()
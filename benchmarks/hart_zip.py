@@ -0,0 +1,104 @@
+"""
+Throughput of the Hart zip reader on a synthetic zip of Hart XML CVRs.
+
+Writes a zip of `--sheets` synthetic sheets (to `--zip`, or to a temporary file), then times
+    read_cvr:  the original reader, applied serially to every member
+    parse_cvr: Hart.read_cvrs_zip with workers=1
+    workers=N: Hart.read_cvrs_zip with workers=N
+and checks that all three give the same CVRs.
+
+    python benchmarks/hart_zip.py --sheets 500000 --workers 8
+
+(with shangrla installed, or with the repository root on PYTHONPATH).
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import numpy as np
+
+from shangrla.formats.Hart import Hart
+
+HEADER = (
+    '<?xml version="1.0"?>\n<Cvr xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns="http://tempuri.org/CVRDesign.xsd">\n  <Contests>\n'
+)
+
+
+def synthetic_sheet(rng, batch: int, sheet: int, n_contests: int, n_candidates: int) -> str:
+    contests = []
+    for c in range(n_contests):
+        k = rng.integers(n_candidates + 1)
+        if k == n_candidates:
+            options = "      <Options/>\n      <Undervotes>1</Undervotes>\n"
+        elif k == 0:
+            options = (
+                "      <Options>\n        <Option>\n          <Id>w</Id>\n          <Value>1</Value>\n"
+                "          <WriteInData>\n            <Text/>\n          </WriteInData>\n"
+                "        </Option>\n      </Options>\n"
+            )
+        else:
+            options = (
+                f"      <Options>\n        <Option>\n          <Name>Candidate {c}-{k}</Name>\n"
+                f"          <Id>{c}-{k}</Id>\n          <Value>1</Value>\n        </Option>\n      </Options>\n"
+            )
+        contests.append(f"    <Contest>\n      <Name>CONTEST {c}</Name>\n      <Id>{c}</Id>\n{options}    </Contest>\n")
+    return (
+        HEADER
+        + "".join(contests)
+        + f"  </Contests>\n  <BatchSequence>{batch}</BatchSequence>\n  <SheetNumber>{sheet}</SheetNumber>\n"
+        + "  <PrecinctSplit>\n    <Name>1</Name>\n    <Id>1</Id>\n  </PrecinctSplit>\n"
+        + f"  <BatchNumber>{batch}</BatchNumber>\n  <CvrGuid>{batch}-{sheet}</CvrGuid>\n</Cvr>\n"
+    )
+
+
+def write_zip(path: str, sheets: int, contests: int, candidates: int, seed: int):
+    rng = np.random.default_rng(seed)
+    with ZipFile(path, "w", compression=ZIP_DEFLATED) as z:
+        for i in range(sheets):
+            batch, sheet = divmod(i, 250)
+            z.writestr(f"cvrs/{batch}_{sheet}.xml", synthetic_sheet(rng, batch, sheet, contests, candidates))
+
+
+def read_serial(path: str) -> list:
+    with ZipFile(path, "r") as data:
+        return [
+            Hart.read_cvr(data.read(name).decode()) for name in data.namelist() if name.endswith(".xml")
+        ]
+
+
+def timed(label: str, f, sheets: int):
+    start = time.perf_counter()
+    result = f()
+    seconds = time.perf_counter() - start
+    print(f"{label:>12}: {seconds:8.2f} s; {sheets / seconds:10,.0f} sheets/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets", type=int, default=500_000)
+    parser.add_argument("--contests", type=int, default=10, help="contests per sheet")
+    parser.add_argument("--candidates", type=int, default=4, help="candidates per contest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--zip", default=None, help="zip to write (and keep); default: a temporary file")
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.zip or os.path.join(tmp, "hart.zip")
+        if not os.path.exists(path):
+            write_zip(path, args.sheets, args.contests, args.candidates, args.seed)
+        reference = timed("read_cvr", lambda: read_serial(path), args.sheets)
+        fast = timed("parse_cvr", lambda: Hart.read_cvrs_zip(path), args.sheets)
+        parallel = timed(f"workers={args.workers}", lambda: Hart.read_cvrs_zip(path, workers=args.workers), args.sheets)
+        expected = [str(c) for c in reference]
+        assert [str(c) for c in fast] == expected
+        assert [str(c) for c in parallel] == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Margins of the IRV assertions of a many-candidate contest: per-CVR `assort` versus the rank-matrix kernels.
+
+Builds `--cards` synthetic ranked CVRs for one IRV contest with `--candidates` candidates and a RAIRE-like
+set of assertions: for each round, when the last candidates have been eliminated, an IRV_ELIMINATION
+assertion of the first candidate against each other candidate still standing, plus WINNER_ONLY assertions.
+Times
+    assort: Assorter.assort called on every card of the first `--check` cards, extrapolated to all cards
+    kernel: Assertion.assorter_means on a CVRTable; assertions with the same remaining candidates share
+            their first preferences
+and checks that they agree on the cards checked.
+
+    python benchmarks/irv_rank_matrix.py --cards 200000 --candidates 20
+
+(with shangrla installed, or with the repository root on PYTHONPATH).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from shangrla.core.Audit import Assertion, Audit, Contest, CVR
+from shangrla.core.CVRTable import CVRTable
+from shangrla.core.NonnegMean import NonnegMean
+
+
+def timed(f) -> tuple:
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=200000)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--check", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cands = [f"cand-{j}" for j in range(args.candidates)]
+    weights = np.linspace(2, 1, args.candidates)
+    cvr_list = []
+    for i in range(args.cards):
+        n_ranked = rng.integers(1, args.candidates + 1)
+        ranked = rng.choice(cands, size=n_ranked, replace=False, p=weights / weights.sum())
+        cvr_list.append(CVR(id=str(i), votes={"c": {str(c): r + 1 for r, c in enumerate(ranked)}}))
+    table = CVRTable.from_cvrs(cvr_list)
+
+    contest = Contest.from_dict({
+        "id": "c", "name": "c", "risk_limit": 0.05, "cards": args.cards, "n_winners": 1,
+        "choice_function": Contest.SOCIAL_CHOICE_FUNCTION.IRV, "candidates": cands, "winner": [cands[0]],
+        "audit_type": Audit.AUDIT_TYPE.CARD_COMPARISON, "test": NonnegMean.alpha_mart, "use_style": True,
+    })
+    json_assertions = [
+        {"winner": cands[0], "loser": loser, "assertion_type": Assertion.WINNER_ONLY} for loser in cands[1:]
+    ]
+    for k in range(args.candidates, 1, -1):
+        json_assertions += [
+            {"winner": cands[0], "loser": loser, "assertion_type": Assertion.IRV_ELIMINATION,
+             "already_eliminated": cands[k:]}
+            for loser in cands[1:k]
+        ]
+    assertions = Assertion.make_assertions_from_json(contest, cands, json_assertions)
+
+    check = cvr_list[: args.check]
+    expected, assort_seconds = timed(
+        lambda: {k: np.mean([a.assorter.assort(c) for c in check]) for k, a in assertions.items()}
+    )
+    _, kernel_seconds = timed(lambda: Assertion.assorter_means(assertions, table, use_style=True))
+    checked = Assertion.assorter_means(assertions, CVRTable.from_cvrs(check), use_style=True)
+    assert all(np.isclose(checked[k], expected[k]) for k in assertions)
+    assort_seconds *= args.cards / len(check)
+
+    print(f"{len(assertions)} assertions, {args.candidates} candidates, {args.cards} cards")
+    print(f"assort (extrapolated): {assort_seconds:10.3f} s")
+    print(f"kernel:                {kernel_seconds:10.3f} s  ({assort_seconds / kernel_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+In-memory cache of assorter values on sampled cards, reused across rounds of an audit
+"""
+
+import numpy as np
+from collections.abc import Callable, Collection, Hashable
+
+
+##########################################################################################
+class AssorterCache:
+    """
+    Assorter values of the MVRs and CVRs of the sample, kept from one round of an audit to the next.
+
+    Values are keyed by (assertion id, record id, record version) within each sample ("mvr" or "cvr"), because
+    the MVR and the CVR of a card share its id. The assertion id is (contest id, assertion key). Each round,
+    only the cards sampled since the previous round are assorted; the values for the other cards are reused.
+
+    A record's version starts at 0 and is incremented by `invalidate`. Call `invalidate` with the ids of MVRs
+    that have been corrected (e.g., after a ballot is re-read), so their values are computed again; the values
+    for the previous versions are discarded.
+
+    Example
+    -------
+        cache = AssorterCache()
+        for round in rounds:
+            ...
+            p_max = Assertion.set_p_values(contests, mvr_sample, cvr_sample, cache=cache)
+            sample_size = audit.find_sample_size(contests, cvrs, mvr_sample, cvr_sample, cache=cache)
+        cache.invalidate(["card-17"], sample="mvr")  # the MVR of card-17 was corrected
+        print(cache.hit_rate)
+
+    Attributes
+    ----------
+    hits, misses: int
+        number of values that were and were not found in the cache
+    """
+
+    SAMPLES = ("mvr", "cvr")
+
+    def __init__(self):
+        self._values = {}  # (assertion id, sample) -> {(record id, version): value}
+        self._versions = {sample: {} for sample in self.SAMPLES}  # sample -> {record id: version}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._values.values())
+
+    def __str__(self) -> str:
+        return f"AssorterCache: values: {len(self)} hits: {self.hits} misses: {self.misses}"
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        fraction of the values requested that were found in the cache; nan if none has been requested
+        """
+        n = self.hits + self.misses
+        return self.hits / n if n else np.nan
+
+    def version(self, record_id: Hashable, sample: str = "mvr") -> int:
+        """
+        the current version of a record
+        """
+        return self._versions[sample].get(record_id, 0)
+
+    def _keys(self, sample: str, ids: Collection) -> list:
+        versions = self._versions[sample]
+        return [(i, versions.get(i, 0)) for i in ids]
+
+    def missing(self, assertion_id: Hashable, sample: str, ids: Collection) -> np.ndarray:
+        """
+        which records do not have a cached value for the assertion
+
+        Parameters
+        ----------
+        assertion_id: hashable
+            (contest id, assertion key)
+        sample: str
+            "mvr" or "cvr"
+        ids: Collection
+            record ids
+
+        Returns
+        -------
+        np.array of bool, one per id
+        """
+        stored = self._values.get((assertion_id, sample), {})
+        return np.array([k not in stored for k in self._keys(sample, ids)], dtype=bool)
+
+    def values(self, assertion_id: Hashable, sample: str, ids: Collection, evaluate: Callable) -> np.ndarray:
+        """
+        The assorter values of the records, computing only those that are not cached
+
+        Parameters
+        ----------
+        assertion_id: hashable
+            (contest id, assertion key)
+        sample: str
+            "mvr" or "cvr"
+        ids: Collection
+            record ids
+        evaluate: callable
+            maps an np.array of positions in `ids` to the assorter values of those records. Exceptions it raises
+            are passed on, and nothing is cached.
+
+        Returns
+        -------
+        np.array of float, one per id
+
+        Side effects
+        ------------
+        caches the values computed; updates hits and misses
+        """
+        stored = self._values.setdefault((assertion_id, sample), {})
+        keys = self._keys(sample, ids)
+        found = [stored.get(k) for k in keys]
+        positions = np.array([p for p, v in enumerate(found) if v is None], dtype=np.int64)
+        out = np.array([np.nan if v is None else v for v in found], dtype=float)
+        if len(positions) > 0:
+            new = np.asarray(evaluate(positions), dtype=float)
+            out[positions] = new
+            stored.update(zip([keys[p] for p in positions.tolist()], new.tolist()))
+        self.hits += len(keys) - len(positions)
+        self.misses += len(positions)
+        return out
+
+    def invalidate(self, ids: Collection = None, sample: str = "mvr") -> int:
+        """
+        Increment the version of records, discarding their cached values; with ids=None, discard every value
+
+        Parameters
+        ----------
+        ids: Collection [optional]
+            ids of the records that have changed, e.g., corrected MVRs
+        sample: str
+            "mvr" or "cvr"
+
+        Returns
+        -------
+        number of values discarded
+        """
+        if ids is None:
+            discarded = len(self)
+            self._values = {}
+            return discarded
+        versions = self._versions[sample]
+        old = self._keys(sample, ids)
+        for i, v in old:
+            versions[i] = v + 1
+        discarded = 0
+        for (_, s), stored in self._values.items():
+            if s == sample:
+                for k in old:
+                    discarded += stored.pop(k, None) is not None
+        return discarded
@@ -1,16 +1,29 @@
+import contextvars
 import math
+import os
 import numpy as np
 import json
 import csv
+import heapq
+import pickle
+import tempfile
 import types
 import warnings
+from array import array
 from collections import OrderedDict, defaultdict
-from collections.abc import Collection
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from contextlib import ExitStack, contextmanager
+from itertools import islice
 from typing import Tuple
 from cryptorandom.cryptorandom import int_from_hash
 from cryptorandom.sample import random_permutation
 from cryptorandom.sample import sample_by_index
 from .NonnegMean import NonnegMean
+from .AssorterCache import AssorterCache
+from .Compressed import Compressed
+from .CVRAccumulator import CVRAccumulator
+from .CVRStore import CVRStore
+from .CVRTable import ContestIndex, CVRTable, InternTable
 
 
 ##########################################################################################
@@ -99,9 +112,12 @@ class NpEncoder(json.JSONEncoder):
 ##########################################################################################
 
 
-class CVR:
+class CVRBase:
     """
-    Generic class for cast-vote records.
+    Generic class for cast-vote records: the methods shared by CVR, CompactCVR, and PhantomCVR.
+
+    CVRBase declares no instance attributes (`__slots__ = ()`), so its subclasses decide how to store them:
+    CVR keeps them in a per-instance dict; CompactCVR and PhantomCVR keep them in slots.
 
     The CVR class does not necessarily impose voting rules. For instance, the social choice
     function might consider a CVR that contains two votes in a contest to be an overvote.
@@ -160,6 +176,9 @@ class CVR:
          does the CVR have the contest?
     cvrs_to_json:
          represent CVR list as json
+    to_dict: represent a CVR as a dict
+    write_ndjson, iter_ndjson, read_ndjson:
+         write and read CVRs (or MVRs) as newline-delimited JSON, one CVR at a time
     from_dict: create a CVR from a dict
     from_dict_of_dicts:
          create dict of CVRs from a list of dicts
@@ -167,11 +186,13 @@ class CVR:
          create CVRs from the RAIRE representation
     """
 
+    __slots__ = ()
+
     def __init__(
         self,
         id: object = None,
         card_in_batch: int = None,
-        votes: dict = {},
+        votes: dict = None,
         phantom: bool = False,
         tally_pool: object = None,
         pool: bool = False,
@@ -181,7 +202,7 @@ class CVR:
     ):
         self.id = id  # identifier
         self.card_in_batch = card_in_batch # position of the corresponding card in a physical batch. Used for ONEAudit.
-        self.votes = votes  # contest/vote dict
+        self.votes = votes if votes is not None else {}  # contest/vote dict
         self.phantom = phantom  # is this a phantom CVR?
         self.tally_pool = tally_pool  # what tallying pool of cards does this CVR belong to (used by ONEAudit)?
         self.pool = pool  # pool votes on this CVR within its tally_pool?
@@ -330,6 +351,118 @@ class CVR:
     def cvrs_to_json(cls, cvr):
         return json.dumps(cvr)
 
+    def to_dict(self) -> dict:
+        """
+        the attributes of the CVR as a dict, in the form read by from_dict
+        """
+        return {
+            "id": self.id,
+            "card_in_batch": self.card_in_batch,
+            "votes": self.votes,
+            "phantom": self.phantom,
+            "tally_pool": self.tally_pool,
+            "pool": self.pool,
+            "sample_num": self.sample_num,
+            "p": self.p,
+            "sampled": self.sampled,
+        }
+
+    @classmethod
+    def write_ndjson(cls, cvrs: Iterable, f, append: bool = False) -> int:
+        """
+        Write CVRs (or MVRs) as newline-delimited JSON: one line per CVR, in the form of to_dict.
+        Each CVR is written as it is reached, so `cvrs` can be a generator (e.g., Dominion.iter_cvrs) and
+        the collection is never held in memory as one JSON document.
+
+        Parameters
+        ----------
+        cvrs: iterable of CVRs
+        f: str, path, or writable text file
+            if a path, the file is opened (and closed)
+        append: bool
+            if f is a path, append to the file instead of replacing it; e.g., to add MVRs as they are entered
+
+        Returns
+        -------
+        the number of CVRs written
+        """
+        if isinstance(f, (str, os.PathLike)):
+            with open(f, "a" if append else "w") as fh:
+                return cls.write_ndjson(cvrs, fh)
+        n = 0
+        for c in cvrs:
+            f.write(json.dumps(c.to_dict(), cls=NpEncoder) + "\n")
+            n += 1
+        return n
+
+    @classmethod
+    def iter_ndjson(cls, f) -> Iterator["CVR"]:
+        """
+        Generator of the CVRs (or MVRs) in a newline-delimited JSON file, one line at a time. Blank lines
+        are skipped. Fields missing from a line take their defaults, as in from_dict. A compressed file is
+        decompressed as it is read (see Compressed.open).
+
+        Parameters
+        ----------
+        f: str, path, or readable text file
+
+        Yields
+        ------
+        CVR objects
+
+        Raises
+        ------
+        ValueError if a line is not a JSON object
+        """
+        if isinstance(f, (str, os.PathLike)):
+            with Compressed.open(f) as fh:
+                yield from cls.iter_ndjson(fh)
+            return
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                c = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {line_num} is not valid JSON: {e}") from e
+            if not isinstance(c, dict):
+                raise ValueError(f"line {line_num} is not a JSON object")
+            yield cls.from_record(c)
+
+    @classmethod
+    def read_ndjson(cls, f, accumulators: Collection = None) -> list:
+        """
+        Read the CVRs (or MVRs) in a newline-delimited JSON file into a list
+
+        Parameters
+        ----------
+        f: str, path, or readable text file
+        accumulators: collection of CVRAccumulators [optional]
+            each CVR is added to each accumulator as it is read
+
+        Returns
+        -------
+        list of CVR objects
+        """
+        return list(CVRAccumulator.feed(cls.iter_ndjson(f), accumulators))
+
+    @classmethod
+    def from_record(cls, c: dict) -> "CVR":
+        """
+        Construct a CVR from a dict containing cvr data; see from_dict
+        """
+        return cls(
+            id=c["id"],
+            card_in_batch=c.get("card_in_batch"),
+            votes=c["votes"],
+            phantom=c.get("phantom", False),
+            pool=c.get("pool", False),
+            tally_pool=c.get("tally_pool"),
+            sample_num=c.get("sample_num"),
+            p=c.get("p"),
+            sampled=c.get("sampled"),
+        )
+
     @classmethod
     def from_dict(cls, cvr_dict: list[dict]) -> list:
         """
@@ -343,27 +476,7 @@ class CVR:
         ---------
         list of CVR objects
         """
-        cvr_list = []
-        for c in cvr_dict:
-            phantom = False if "phantom" not in c.keys() else c["phantom"]
-            pool = False if "pool" not in c.keys() else c["pool"]
-            tally_pool = None if "tally_pool" not in c.keys() else c["tally_pool"]
-            sample_num = None if "sample_num" not in c.keys() else c["sample_num"]
-            p = None if "p" not in c.keys() else c["p"]
-            sampled = None if "sampled" not in c.keys() else c["sampled"]
-            cvr_list.append(
-                CVR(
-                    id=c["id"],
-                    votes=c["votes"],
-                    phantom=phantom,
-                    pool=pool,
-                    tally_pool=tally_pool,
-                    sample_num=sample_num,
-                    p=p,
-                    sampled=sampled,
-                )
-            )
-        return cvr_list
+        return [cls.from_record(c) for c in cvr_dict]
 
     @classmethod
     def from_raire(cls, raire: list, phantom: bool = False) -> Tuple[list, int]:
@@ -393,28 +506,24 @@ class CVR:
         list of CVR objects corresponding to the RAIRE cvrs, merged
         number of CVRs read (before merging)
         """
-        skip = int(raire[0][0])
-        cvr_list = []
-        for c in raire[(skip + 1) :]:
-            contest_id = c[0]
-            id = c[1]
-            votes = {}
-            for j in range(2, len(c)):
-                votes[str(c[j])] = j - 1
-            cvr_list.append(
-                CVR.from_vote(votes, id=id, contest_id=contest_id, phantom=phantom)
-            )
-        return CVR.merge_cvrs(cvr_list), len(raire) - skip
+        votes, n_rows, skip = cls.merge_raire_rows(raire)
+        return [cls(id=id, votes=v, phantom=phantom) for id, v in votes.items()], n_rows - skip
 
     @classmethod
-    def from_raire_file(cls, cvr_file: str = None) -> Tuple[list, int, int]:
+    def from_raire_file(cls, cvr_file: str = None, accumulators: Collection = None) -> Tuple[list, int, int]:
         """
         Read CVR data from a file; construct list of CVR objects from the data
 
+        The file is read in a single pass: rows are merged into per-ballot votes as they are read, so the
+        raw rows are never held in memory. A compressed file (gzip, bzip2, xz, or zstd) is decompressed as it
+        is read; see Compressed.open.
+
         Parameters
         ----------
         cvr_file : str
             filename
+        accumulators: collection of CVRAccumulators [optional]
+            each merged CVR is added to each accumulator as it is constructed
 
         Returns
         -------
@@ -424,16 +533,54 @@ class CVR:
         unique_ids: int
             number of distinct CVR identifiers read
         """
-        cvr_in = []
-        with open(cvr_file) as f:
-            cvr_reader = csv.reader(f, delimiter=",", quotechar='"')
-            for row in cvr_reader:
-                cvr_in.append(row)
-        cvrs, cvrs_read = CVR.from_raire(cvr_in)
-        return cvrs, cvrs_read, len(cvrs)
+        with Compressed.open(cvr_file) as f:
+            votes, n_rows, skip = cls.merge_raire_rows(csv.reader(f, delimiter=",", quotechar='"'))
+        cvrs = list(CVRAccumulator.feed((cls(id=id, votes=v) for id, v in votes.items()), accumulators))
+        return cvrs, n_rows - skip, len(cvrs)
 
     @classmethod
-    def merge_cvrs(cls, cvr_list: list) -> list:
+    def merge_raire_rows(cls, raire) -> Tuple[dict, int, int]:
+        """
+        Merge the ballot rows of RAIRE-format data into votes for each ballot id, in one pass
+
+        Equivalent to creating a single-contest CVR for each row and merging them with `merge_cvrs`: ballot ids
+        are kept in order of first appearance, and if an id has more than one row for a contest, the later row
+        replaces the earlier one.
+
+        Parameters
+        ----------
+        raire: iterable of lists
+            rows of RAIRE-format data, e.g., from csv.reader() (see from_raire)
+
+        Returns
+        -------
+        votes: dict
+            key is ballot id; value is the votes dict for that ballot
+        n_rows: int
+            number of rows read, including the header rows
+        skip: int
+            number of contests declared in the first row
+        """
+        rows = iter(raire)
+        skip = int(next(rows)[0])
+        n_rows = 1
+        for _ in range(skip):
+            next(rows)
+            n_rows += 1
+        votes = {}
+        for c in rows:
+            n_rows += 1
+            ballot = votes.get(c[1])
+            if ballot is None:
+                ballot = votes[c[1]] = {}
+            ranks = {}
+            for j in range(2, len(c)):
+                ranks[str(c[j])] = j - 1
+            ballot[c[0]] = ranks
+        return votes, n_rows, skip
+
+    @classmethod
+    def merge_cvrs(cls, cvr_list: list, max_in_memory: int = None, tmp_dir: str = None) -> list:
         """
         Takes a list of CVRs that might contain duplicated ballot ids and merges the votes
         so that each identifier is listed only once, and votes from different records for that
@@ -444,40 +591,105 @@ class CVR:
 
         If any of the CVRs has phantom==False, sets phantom=False in the result.
         If only one of a multiple has `tally_pool`, set the tally_pool to that value; if they disagree, throw an error.
-        Set `pool=True` if any CVR with the ID has `pool=True`
+        Set `pool=True` if any CVR with the ID has `pool=True`, and `pool=False` otherwise.
 
+        If `max_in_memory` is set, the merge is done externally: the CVRs are read in runs of `max_in_memory`,
+        each run is sorted by id and written to a temporary file, and the runs are merged by id. Only one run
+        and the merged result are held in memory at a time, so `cvr_list` can be a generator over a very large
+        input. The result is the same as for the in-memory merge, in the same order (by first mention of each id),
+        but consists of copies of the input CVRs.
 
         Parameters:
         -----------
-        cvr_list: list of CVRs
+        cvr_list: list (or, if max_in_memory is set, iterable) of CVRs
+        max_in_memory: int [optional]
+            if set, the number of input CVRs per sorted run for the external merge
+        tmp_dir: str [optional]
+            directory for the temporary files of the external merge; default is the system default
 
         Returns:
         -----------
         list of merged CVRs
         """
+        if max_in_memory is not None:
+            return cls._merge_cvrs_external(cvr_list, max_in_memory, tmp_dir)
         od = OrderedDict()
         for c in cvr_list:
             if c.id not in od:
                 od[c.id] = c
             else:
-                od[c.id].votes = {**od[c.id].votes, **c.votes}
-                od[c.id].phantom = c.phantom and od[c.id].phantom
-                od[c.id].pool = c.pool or od[c.id].pool
-                if (
-                    (od[c.id].tally_pool is None and c.tally_pool is None)
-                    or (od[c.id].tally_pool is not None and c.tally_pool is None)
-                    or (od[c.id].tally_pool == c.tally_pool)
-                ):
-                    pass
-                elif od[c.id].tally_pool is None and c.tally_pool is not None:
-                    od[c.id].tally_pool = c.tally_pool
-                else:
-                    raise ValueError(
-                        f"two CVRs with the same ID have different tally_pools: \n{str(od)=}\n{str(c)=}"
-                    )
-                od[c.id].pool = od[c.id] or c.pool
+                cls._merge_cvr(od[c.id], c)
         return [v for v in od.values()]
 
+    @classmethod
+    def _merge_cvr(cls, merged: "CVR", c: "CVR"):
+        """
+        merge the later mention `c` of a ballot id into `merged`, in place, as described in merge_cvrs
+        """
+        merged.votes = {**merged.votes, **c.votes}
+        merged.phantom = c.phantom and merged.phantom
+        merged.pool = c.pool or merged.pool
+        if (
+            (merged.tally_pool is None and c.tally_pool is None)
+            or (merged.tally_pool is not None and c.tally_pool is None)
+            or (merged.tally_pool == c.tally_pool)
+        ):
+            pass
+        elif merged.tally_pool is None and c.tally_pool is not None:
+            merged.tally_pool = c.tally_pool
+        else:
+            raise ValueError(
+                f"two CVRs with the same ID have different tally_pools: \n{str(merged)=}\n{str(c)=}"
+            )
+
+    @classmethod
+    def _merge_cvrs_external(cls, cvr_list, max_in_memory: int, tmp_dir: str = None) -> list:
+        """
+        external-sort implementation of merge_cvrs
+        """
+        if max_in_memory < 1:
+            raise ValueError(f"max_in_memory must be positive: {max_in_memory=}")
+
+        def key(c):
+            # sort by type name first, so that ids of different types need not be comparable
+            return (type(c.id).__name__, c.id)
+
+        def read_run(f):
+            f.seek(0)
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+        with ExitStack() as stack:
+            runs = []
+            it = iter(cvr_list)
+            seq = 0
+            while run := list(islice(it, max_in_memory)):
+                records = sorted(
+                    ((key(c), seq + i, c) for i, c in enumerate(run)), key=lambda r: (r[0], r[1])
+                )
+                seq += len(run)
+                del run
+                f = stack.enter_context(tempfile.TemporaryFile(dir=tmp_dir))
+                for r in records:
+                    pickle.dump(r, f, protocol=pickle.HIGHEST_PROTOCOL)
+                del records
+                runs.append(f)
+            # records for each id arrive consecutively, in input order; remember where each id first appeared
+            merged = []
+            current_key = None
+            stack.enter_context(CompactCVR.interning())  # unpickled CompactCVRs share intern tables
+            for k, s, c in heapq.merge(*[read_run(f) for f in runs], key=lambda r: (r[0], r[1])):
+                if merged and k == current_key:
+                    cls._merge_cvr(merged[-1][1], c)
+                else:
+                    merged.append((s, c))
+                    current_key = k
+        merged.sort(key=lambda r: r[0])
+        return [c for _, c in merged]
+
     @classmethod
     def check_tally_pools(cls, cvr_list: Collection["CVR"], force: bool = True) -> list:
         """
@@ -522,34 +734,76 @@ class CVR:
         return [v for v in od.values()]
 
     @classmethod
-    def set_card_in_batch_lex(cls, cvr_list: Collection["CVR"], tally_pool: dict=None ) -> dict:
+    def set_card_in_batch_lex(
+        cls, cvr_list: Collection["CVR"], tally_pool: dict = None, return_positions: bool = False
+    ) -> dict:
         '''
         For each CVR, set `card_in_batch` to the lexicographic position of its ID within its tally batch.
         Primarily useful to set a canonical ordering of CVRs for ONEAudit when tally batches are physical batches.
 
+        All the positions are found by sorting the CVRs by tally_pool, then by ID within each tally_pool, so the
+        cost is O(n log n) however large the batches are. IDs are only compared within a tally_pool, so different
+        tally_pools can use different types of ID. If an ID occurs more than once in a tally batch, every occurrence
+        gets the position of the first.
+
         Parameters
         ----------
         cvr_list: list of CVRs
             the CVRs to assign card_in_batch to
+        return_positions: bool [optional], default False
+            if True, also return the positions as an array, in the order of cvr_list
 
         Returns
         -------
         tally_pool_dict: defaultdict 
             keys are values of tally_pool; values are sorted lists of CVR IDs in that tally_pool
+        positions: np.array of int64
+            only if `return_positions`: the `card_in_batch` of each CVR
 
         Side Effects
         ------------
         Set `card_in_batch` to the lexicographic position of the CVR ID within its tally_batch     
         '''
+        if isinstance(cvr_list, CVRTable):
+            ids = cvr_list.id
+            codes = cvr_list.tally_pool
+            labels = lambda code: None if code < 0 else cvr_list.tally_pools[code]
+        else:
+            ids = np.empty(len(cvr_list), dtype=object)
+            ids[:] = [c.id for c in cvr_list]
+            pools = InternTable()
+            codes = np.array([pools.code(c.tally_pool) for c in cvr_list], dtype=np.int64)
+            labels = lambda code: pools[code]
+        n = len(ids)
+        # sort by pool, then sort the ids within each pool, so ids in different pools are never compared
+        order = np.argsort(codes, kind="stable")
+        groups = np.r_[0, np.flatnonzero(codes[order][1:] != codes[order][:-1]) + 1, n] if n else []
+        for lo, hi in zip(groups[:-1], groups[1:]):
+            order[lo:hi] = order[lo:hi][np.argsort(ids[order[lo:hi]], kind="stable")]
+        sorted_codes = codes[order]
+        sorted_ids = ids[order]
+        idx = np.arange(n, dtype=np.int64)
+        new_pool = np.r_[True, sorted_codes[1:] != sorted_codes[:-1]][:n]
+        new_id = new_pool | np.r_[True, sorted_ids[1:] != sorted_ids[:-1]][:n]
+        pool_start = np.maximum.accumulate(np.where(new_pool, idx, 0)) if n else idx
+        id_start = np.maximum.accumulate(np.where(new_id, idx, 0)) if n else idx
+        positions = np.empty(n, dtype=np.int64)
+        positions[order] = id_start - pool_start
+        # keys in order of first appearance in cvr_list
         tally_pool_dict = defaultdict(list)
-        for c in cvr_list:
-            tally_pool_dict[c.tally_pool].append(c.id)
-        for tp, id_list in tally_pool_dict.items():
-            id_list.sort()
-        for c in cvr_list:
-            c.card_in_batch = tally_pool_dict[c.tally_pool].index(c.id)
-        return tally_pool_dict
-                          
+        pool_codes, first = np.unique(codes, return_index=True)
+        for code in pool_codes[np.argsort(first)].tolist():
+            tally_pool_dict[labels(code)]
+        bounds = np.r_[np.flatnonzero(new_pool), n]
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            tally_pool_dict[labels(int(sorted_codes[lo]))] = sorted_ids[lo:hi].tolist()
+        if isinstance(cvr_list, CVRTable):
+            cvr_list.card_in_batch[:] = positions
+        else:
+            for c, pos in zip(cvr_list, positions.tolist()):
+                c.card_in_batch = pos
+        return (tally_pool_dict, positions) if return_positions else tally_pool_dict
+
     @classmethod
     def from_vote(
         cls, vote: str, id: object = 1, contest_id: str = "AvB", phantom: bool = False
@@ -569,7 +823,7 @@ class CVR:
         --------
         CVR containing that vote in the contest "AvB", with CVR id=1.
         """
-        return CVR(id=id, votes={contest_id: vote}, phantom=phantom)
+        return cls(id=id, votes={contest_id: vote}, phantom=phantom)
 
     @classmethod
     def as_vote(cls, v) -> int:
@@ -595,6 +849,14 @@ class CVR:
         dict: keys are tally_pool with pool==True, values are the set of contests mentioned on any CVR in that tally_pool
         """
         tally_pools = defaultdict(set)
+        if isinstance(cvrs, CVRTable):
+            pooled = np.flatnonzero(cvrs.pool[cvrs.entry_row])
+            for tp, con in set(zip(cvrs.tally_pool[cvrs.entry_row[pooled]].tolist(),
+                                   cvrs.con_code[pooled].tolist())):
+                tally_pools[None if tp < 0 else cvrs.tally_pools[tp]].add(cvrs.contests[con])
+            for tp in set(cvrs.tally_pool[cvrs.pool].tolist()):  # pooled CVRs with no contests
+                tally_pools[None if tp < 0 else cvrs.tally_pools[tp]]
+            return tally_pools
         for c in cvrs:
             if c.pool:
                 tally_pools[c.tally_pool] =  tally_pools[c.tally_pool].union(set(c.votes.keys()))
@@ -618,6 +880,14 @@ class CVR:
         bool : True if any contest is added to any CVR
         """
         added = False
+        if isinstance(cvrs, CVRTable):
+            for tp, cons in tally_pools.items():
+                code = cvrs.tally_pools.get(tp) if tp is not None else -1
+                if tp is not None and code < 0:
+                    continue
+                rows = np.flatnonzero((cvrs.tally_pool == code) & cvrs.pool)
+                added = cvrs.update_votes(rows, cons) or added
+            return added
         for c in [d for d in cvrs if (d.tally_pool in tally_pools.keys() and d.pool)]:
             added = (
                 c.update_votes({con: {} for con in tally_pools[c.tally_pool]}) or added
@@ -632,8 +902,9 @@ class CVR:
         cvr_list: "list[CVR]" = None,
         prefix: str = "phantom-",
         tally_pool = None, 
-        pool = False
-        
+        pool = False,
+        contest_index: ContestIndex = None,
+        virtual: bool = False,
     ) -> Tuple[list, int]:
         """
         Make phantom CVRs as needed for phantom cards; set contest parameters `cards` (if not set) and `cvrs`
@@ -661,11 +932,15 @@ class CVR:
             label for tally_pool for pooled CVRs for ONEAudit
         pool: bool
             pool the votes for the CVRs?
-        
+        contest_index: ContestIndex [optional]
+            index of the contests on the CVRs in cvr_list; built if not supplied or not current
+        virtual: bool
+            if True and cvr_list is a list, return a PhantomCVRs list that refers to cvr_list and represents
+            the phantoms without creating a CVR object for each (a CVRTable stores phantoms as columns anyway)
 
         Returns
         -------
-        cvr_list: list of CVR objects
+        cvr_list: list of CVR objects (PhantomCVRs if `virtual`)
             the reported CVRs and the phantom CVRs
         n_phantoms: int
             number of phantom cards added
@@ -682,14 +957,44 @@ class CVR:
         max_cards = stratum.max_cards
         phantom_vrs = []
         n_cvrs = len(cvr_list)
-        for c, con in contests.items():  # set contest parameters
-            con.cvrs = np.sum(
-                [cvr.has_contest(con.id) for cvr in cvr_list if not cvr.phantom]
+        index = ContestIndex.of(cvr_list, contest_index)
+        if isinstance(cvr_list, CVRTable):
+            for c, con in contests.items():  # set contest parameters
+                con.cvrs = index.count(con.id, where=~cvr_list.phantom)
+                con.cards = (
+                    max_cards if ((con.cards is None) or (not use_style)) else con.cards
+                )
+            if not use_style:
+                phantoms = max_cards - n_cvrs
+                contest_rows = {}
+            else:
+                contest_rows = {con.id: np.arange(max(con.cards - con.cvrs, 0)) for con in contests.values()}
+                phantoms = max([0] + [len(r) for r in contest_rows.values()])
+            phantom_vrs = CVRTable.empty_cvrs(
+                [prefix + str(i + 1) for i in range(max(phantoms, 0))],
+                contest_rows=contest_rows,
+                phantom=True,
+                tally_pool=tally_pool,
+                pool=pool,
             )
+            return CVRTable.concatenate([cvr_list, phantom_vrs]), phantoms
+        real = np.array([not cvr.phantom for cvr in cvr_list], dtype=bool)
+        for c, con in contests.items():  # set contest parameters
+            con.cvrs = index.count(con.id, where=real)
             con.cards = (
                 max_cards if ((con.cards is None) or (not use_style)) else con.cards
             )
         # Note: this will need to change for stratified audits
+        if virtual:
+            if not use_style:
+                phantoms, contest_phantoms = max_cards - n_cvrs, {}
+            else:
+                contest_phantoms = {con.id: con.cards - con.cvrs for con in contests.values()}
+                phantoms = max([0] + list(contest_phantoms.values()))
+            return (
+                PhantomCVRs(cvr_list, phantoms, prefix, contest_phantoms, tally_pool=tally_pool, pool=pool),
+                phantoms,
+            )
         if not use_style:  #  make (max_cards - len(cvr_list)) phantoms
             phantoms = max_cards - n_cvrs
             for i in range(phantoms):
@@ -733,6 +1038,12 @@ class CVR:
         ------------
         assigns (or overwrites) sample numbers in each CVR in cvr_list
         """
+        if isinstance(cvr_list, CVRTable):
+            cvr_list.set_sample_nums([int_from_hash(prng.nextRandom()) for _ in range(len(cvr_list))])
+            return True
+        if isinstance(cvr_list, (PhantomCVRs, CVRStore)):
+            cvr_list.set_sample_nums(int_from_hash(prng.nextRandom()) for _ in range(len(cvr_list)))
+            return True
         for cvr in cvr_list:
             cvr.sample_num = int_from_hash(prng.nextRandom())
         return True
@@ -745,7 +1056,8 @@ class CVR:
         prepare the MVRs and CVRs for comparison by putting them into the same (random) order
         in which the CVRs were selected
 
-        conduct data integrity checks.
+        conduct data integrity checks: the MVRs are joined to the CVRs by id (see `align_by_id`), and every
+        CVR without an MVR, MVR without a CVR, or repeated id is reported at once.
 
         Side-effects: sorts the mvr sample into the same order as the cvr sample
 
@@ -755,9 +1067,10 @@ class CVR:
             the manually determined votes for the audited cards
         cvr_sample: list of CVR objects
             the electronic vote record for the audited cards
-        sample_order: dict
-            dict to look up selection order of the cards. Keys are card ids. Values are dicts
-            containing "selection_order" (which draw yielded the card) and "serial" (the card's original position)
+        sample_order: dict or list
+            the selection order of the cards: either a dict whose keys are card ids and whose values are dicts
+            containing "selection_order" (which draw yielded the card) and "serial" (the card's original
+            position), or a list of the card ids in selection order
 
         Returns
         -------
@@ -766,17 +1079,81 @@ class CVR:
         ------------
         sorts the mvr sample into the same order as the cvr sample
         """
-        mvr_sample.sort(key=lambda x: sample_order[x.id]["selection_order"])
-        cvr_sample.sort(key=lambda x: sample_order[x.id]["selection_order"])
-        assert len(cvr_sample) == len(
-            mvr_sample
-        ), "Number of cvrs ({}) and number of mvrs ({}) differ".format(
-            len(cvr_sample), len(mvr_sample)
-        )
-        for i in range(len(cvr_sample)):
-            assert (
-                mvr_sample[i].id == cvr_sample[i].id
-            ), f"Mismatch between id of cvr ({cvr_sample[i].id}) and mvr ({mvr_sample[i].id})"
+        mvr_rows, cvr_rows = cls.align_by_id(mvr_sample, cvr_sample)
+        selection = cls._selection_positions(sample_order)
+        ids = [c.id for c in cvr_sample]
+        order = np.argsort(np.fromiter((selection[i] for i in ids), dtype=np.int64, count=len(ids)), kind="stable")
+        mvr_sample[:] = [mvr_sample[i] for i in mvr_rows[order].tolist()]
+        cvr_sample[:] = [cvr_sample[i] for i in cvr_rows[order].tolist()]
+
+    @classmethod
+    def _selection_positions(cls, sample_order) -> dict:
+        """
+        dict mapping each card id to its position in the selection order, from either form of `sample_order`
+        accepted by prep_comparison_sample
+        """
+        if isinstance(sample_order, dict):
+            return {k: v["selection_order"] for k, v in sample_order.items()}
+        return {k: i for i, k in enumerate(sample_order)}
+
+    @classmethod
+    def index_ids(cls, cvr_list: "Collection[CVR]" = None) -> dict:
+        """
+        dict mapping each CVR id to its position in cvr_list (the first position, if the id is repeated).
+        For a CVRTable, the index is built once and kept with the table.
+        """
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list.id_index
+        index = {}
+        for row, c in enumerate(cvr_list):
+            index.setdefault(c.id, row)
+        return index
+
+    @classmethod
+    def align_by_id(
+        cls, mvr_sample: "Collection[CVR]" = None, cvr_sample: "Collection[CVR]" = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Join MVRs to CVRs by id
+
+        Parameters
+        ----------
+        mvr_sample: collection of CVR objects
+            the manually determined votes for the audited cards
+        cvr_sample: collection of CVR objects (or CVRTable)
+            the electronic vote records for the audited cards
+
+        Returns
+        -------
+        mvr_rows: np.array of int
+        cvr_rows: np.array of int
+            mvr_sample[mvr_rows[k]] and cvr_sample[cvr_rows[k]] have the same id, for every k; cvr_rows is
+            0, 1, ..., len(cvr_sample)-1
+
+        Raises
+        ------
+        ValueError listing every CVR id with no MVR, every MVR id with no CVR, and every repeated id
+        """
+        cvr_index = cls.index_ids(cvr_sample)
+        mvr_index = cls.index_ids(mvr_sample)
+        problems = []
+        missing = [i for i in cvr_index if i not in mvr_index]
+        if missing:
+            problems.append(f"{len(missing)} CVRs have no MVR: {missing}")
+        extra = [i for i in mvr_index if i not in cvr_index]
+        if extra:
+            problems.append(f"{len(extra)} MVRs have no CVR: {extra}")
+        for name, sample, index in [("CVR", cvr_sample, cvr_index), ("MVR", mvr_sample, mvr_index)]:
+            if len(index) < len(sample):
+                counts = defaultdict(int)
+                for c in sample:
+                    counts[c.id] += 1
+                problems.append(f"repeated {name} ids: {[i for i, n in counts.items() if n > 1]}")
+        if problems:
+            raise ValueError("MVRs and CVRs do not match. " + "; ".join(problems))
+        ids = cvr_sample.id.tolist() if isinstance(cvr_sample, CVRTable) else [c.id for c in cvr_sample]
+        mvr_rows = np.fromiter((mvr_index[i] for i in ids), dtype=np.int64, count=len(ids))
+        return mvr_rows, np.arange(len(ids), dtype=np.int64)
 
     @classmethod
     def prep_polling_sample(cls, mvr_sample: list, sample_order: dict):
@@ -789,9 +1166,8 @@ class CVR:
         ----------
         mvr_sample: list
             list of CVR objects
-        sample_order: dict of dicts
-            dict to look up selection order of the cards. Keys are card identifiers. Values are dicts
-            containing "selection_order" (which draw yielded the card) and "serial" (the card's original position)
+        sample_order: dict of dicts or list
+            the selection order of the cards, in either form accepted by prep_comparison_sample
 
         Returns
         -------
@@ -800,7 +1176,8 @@ class CVR:
         -------------
         mvr_sample is reordered into the random selection order
         """
-        mvr_sample.sort(key=lambda x: sample_order[x.id]["selection_order"])
+        selection = cls._selection_positions(sample_order)
+        mvr_sample.sort(key=lambda x: selection[x.id])
 
     @classmethod
     def sort_cvr_sample_num(cls, cvr_list: list):
@@ -822,6 +1199,9 @@ class CVR:
         ------------
         cvr_list is sorted by sample_num
         """
+        if isinstance(cvr_list, CVRTable):
+            cvr_list.permute(np.argsort(cvr_list.sample_num, kind="stable"))
+            return True
         cvr_list.sort(key=lambda x: x.sample_num)
         return True
 
@@ -831,6 +1211,7 @@ class CVR:
         cvr_list: "list[CVR]" = None,
         contests: dict = None,
         sampled_cvr_indices: list = None,
+        contest_index: ContestIndex = None,
     ) -> list:
         """
         Sample CVR ids for contests to attain sample sizes in contests, a dict of Contest objects
@@ -846,12 +1227,20 @@ class CVR:
             dict of Contest objects. Contest sample sizes must be set before calling this function.
         sampled_cvr_indices: list
             indices of cvrs already in the sample
+        contest_index: ContestIndex [optional]
+            index of the contests on the CVRs in cvr_list; built if not supplied or not current
 
         Returns
         -------
         sampled_cvr_indices: list
             indices of CVRs to sample (0-indexed)
         """
+        if isinstance(cvr_list, CVRStore):
+            return CVR._consistent_sampling_store(cvr_list, contests, sampled_cvr_indices)
+        index = ContestIndex.of(cvr_list, contest_index)
+        if isinstance(cvr_list, CVRTable):
+            return CVR._consistent_sampling_table(cvr_list, contests, sampled_cvr_indices, index)
+        member = {c: index.mask(con.id) for c, con in contests.items()}
         current_sizes = defaultdict(int)
         contest_in_progress = lambda c: (current_sizes[c.id] < c.sample_size)
         if sampled_cvr_indices is None:
@@ -859,7 +1248,7 @@ class CVR:
         else:
             for sam in sampled_cvr_indices:
                 for c, con in contests.items():
-                    current_sizes[c] += 1 if cvr_list[sam].has_contest(con.id) else 0
+                    current_sizes[c] += 1 if member[c][sam] else 0
         sorted_cvr_indices = [
             i for i, cv in sorted(enumerate(cvr_list), key=lambda x: x[1].sample_num)
         ]
@@ -869,16 +1258,14 @@ class CVR:
                 [
                     (
                         contest_in_progress(con)
-                        and cvr_list[sorted_cvr_indices[inx]].has_contest(con.id)
+                        and member[c][sorted_cvr_indices[inx]]
                     )
                     for c, con in contests.items()
                 ]
             ):
                 sampled_cvr_indices.append(sorted_cvr_indices[inx])
                 for c, con in contests.items():
-                    if cvr_list[sorted_cvr_indices[inx]].has_contest(
-                        con.id
-                    ) and contest_in_progress(con):
+                    if member[c][sorted_cvr_indices[inx]] and contest_in_progress(con):
                         con.sample_threshold = cvr_list[
                             sorted_cvr_indices[inx]
                         ].sample_num
@@ -888,6 +1275,64 @@ class CVR:
             cvr_list[i].sampled = True
         return sampled_cvr_indices
 
+    @classmethod
+    def _consistent_sampling_table(
+        cls,
+        cvr_list: CVRTable = None,
+        contests: dict = None,
+        sampled_cvr_indices: list = None,
+        contest_index: ContestIndex = None,
+    ) -> list:
+        """
+        consistent_sampling for a CVRTable.
+
+        Walking the CVRs in order of sample_num, a CVR is selected if it contains a contest whose sample
+        size has not yet been attained. Equivalently, for each contest, the CVRs that contain it are selected
+        in sample_num order until that contest's sample size is reached; the sample is the union over contests.
+        """
+        if sampled_cvr_indices is None:
+            sampled_cvr_indices = []
+        order = np.argsort(cvr_list.sample_num, kind="stable")
+        start = len(sampled_cvr_indices)
+        selected = np.zeros(len(cvr_list), dtype=bool)
+        index = ContestIndex.of(cvr_list, contest_index)
+        for c, con in contests.items():
+            mask = index.mask(con.id)
+            current = int(np.sum(mask[np.asarray(sampled_cvr_indices, dtype=np.int64)]))
+            positions = np.flatnonzero(mask[order[start:]])[: max(con.sample_size - current, 0)]
+            selected[positions] = True
+            if len(positions) > 0:
+                con.sample_threshold = cvr_list.sample_num_list([order[start + positions[-1]]])[0]
+        sampled_cvr_indices.extend(order[start:][selected[: len(order) - start]].tolist())
+        cvr_list.sampled[np.asarray(sampled_cvr_indices, dtype=np.int64)] = True
+        return sampled_cvr_indices
+
+    @classmethod
+    def _consistent_sampling_store(
+        cls,
+        cvr_list: CVRStore = None,
+        contests: dict = None,
+        sampled_cvr_indices: list = None,
+    ) -> list:
+        """
+        consistent_sampling for a CVRStore, as for a CVRTable, using the store's sample_num and contest indexes
+        """
+        if sampled_cvr_indices is None:
+            sampled_cvr_indices = []
+        order = cvr_list.sample_order()
+        start = len(sampled_cvr_indices)
+        selected = np.zeros(len(cvr_list), dtype=bool)
+        for c, con in contests.items():
+            mask = cvr_list.has_contest(con.id)
+            current = int(np.sum(mask[np.asarray(sampled_cvr_indices, dtype=np.int64)]))
+            positions = np.flatnonzero(mask[order[start:]])[: max(con.sample_size - current, 0)]
+            selected[positions] = True
+            if len(positions) > 0:
+                con.sample_threshold = cvr_list.sample_num_list([order[start + positions[-1]]])[0]
+        sampled_cvr_indices.extend(order[start:][selected[: len(order) - start]].tolist())
+        cvr_list.set_sampled(sampled_cvr_indices)
+        return sampled_cvr_indices
+
     @classmethod
     def tabulate_styles(cls, cvr_list: "Collection[CVR]" = None):
         """
@@ -903,6 +1348,8 @@ class CVR:
         a dict of styles and the counts of those styles
         """
         # iterate through and find all the unique styles
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list.tabulate_styles()
         style_counts = defaultdict(int)
         for cvr in cvr_list:
             style_counts[frozenset(cvr.votes.keys())] += 1
@@ -926,15 +1373,17 @@ class CVR:
             sub key is the candidate in the contest
             value is the number of votes for that candidate in that contest
         """
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list.tabulate_votes()
         d = defaultdict(lambda: defaultdict(int))
         for c in cvr_list:
             for con, votes in c.votes.items():
-                for cand in votes:
-                    d[con][cand] += CVR.as_vote(c.get_vote_for(con, cand))
+                for cand, vote in votes.items():
+                    d[con][cand] += CVR.as_vote(vote)
         return d
 
     @classmethod
-    def tabulate_cards_contests(cls, cvr_list: Collection = None):
+    def tabulate_cards_contests(cls, cvr_list: Collection = None, contest_index: ContestIndex = None):
         """
         Tabulate the number of cards containing each contest
 
@@ -942,6 +1391,8 @@ class CVR:
         ----------
         cvr_list: Collection
             collection of CVR objects
+        contest_index: ContestIndex [optional]
+            index of the contests on the CVRs in cvr_list; used if it is current
 
         Returns
         -------
@@ -949,12 +1400,518 @@ class CVR:
             main key is contest
             value is the number of cards containing that contest
         """
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list.tabulate_cards_contests()
+        if contest_index is not None and contest_index.is_current(cvr_list):
+            return contest_index.counts()
         d = defaultdict(int)
         for c in cvr_list:
             for con in c.votes:
                 d[con] += 1
         return d
 
+    @classmethod
+    def tabulate(
+        cls, cvr_list: "Collection[CVR]" = None, con_dict: dict = None, enforce_rules: bool = True
+    ) -> tuple:
+        """
+        Compute tabulate_votes, tabulate_styles, tabulate_cards_contests, and Contest.tally in a single pass
+        over the CVRs. The CVRs are read once into a CVRTable (unless they already are one); the aggregates
+        are then computed from its arrays.
+
+        Parameters
+        ----------
+        cvr_list: Collection
+            collection of CVR objects, or a CVRTable
+        con_dict: dict [optional]
+            dict of Contest objects to tally, as for Contest.tally
+        enforce_rules: bool
+            as for Contest.tally
+
+        Returns
+        -------
+        votes: dict of dicts, as returned by tabulate_votes
+        styles: dict, as returned by tabulate_styles
+        cards_contests: dict, as returned by tabulate_cards_contests
+
+        Side Effects
+        ------------
+        Sets the `tally` dict for the contests in con_dict, if their social choice function is appropriate
+        """
+        table = cvr_list if isinstance(cvr_list, CVRTable) else CVRTable.from_cvrs(cvr_list)
+        cons = Contest._start_tallies(con_dict) if con_dict else []
+        return table.tabulate({c.id: c for c in cons}, enforce_rules=enforce_rules)
+
+
+
+##########################################################################################
+class CVR(CVRBase):
+    """
+    Cast-vote record whose attributes are stored in a per-instance dict; see CVRBase.
+    """
+
+
+##########################################################################################
+class CompactCVR(CVRBase):
+    """
+    Memory-lean cast-vote record.
+
+    Behaves like CVR, but stores its attributes in __slots__ rather than in a per-instance dict (it has no
+    __dict__), and stores its votes as integer codes into intern tables rather than as a dict of dicts.
+
+    The intern tables are shared by the CompactCVRs read together: by one call of from_dict, from_raire,
+    from_raire_file, read_ndjson, iter_ndjson, or from_cvrs, or within a `with CompactCVR.interning():` block.
+    Within a group, each contest id and candidate id is stored once, however many cards mention it. A
+    CompactCVR constructed on its own has tables of its own. The tables are freed with the last CompactCVR
+    that uses them.
+
+    The votes on a card are held in an array of codes and a tuple of vote values. For a card with n contests,
+    the array contains
+            n, the n contest codes, n+1 offsets into the array delimiting each contest's candidates,
+            then the candidate codes for each contest in turn
+    and the tuple contains the value of the vote for each of those candidates, in the same order.
+    The order of contests on the card and of candidates within each contest is preserved.
+
+    The `votes` attribute is reconstructed on demand. Assigning to `votes` or calling `update_votes` re-encodes
+    the votes, but modifying the dict returned by `votes` in place does not change the CVR.
+
+    A pickled CompactCVR carries its votes as a dict; unpickling re-encodes them into the tables of the
+    enclosing `interning` block, if any.
+
+    Attributes
+    ----------
+    contests: InternTable
+        contest ids of the CompactCVRs that share this card's tables
+    candidates: InternTable
+        candidate ids of the CompactCVRs that share this card's tables
+    """
+
+    class Interned:
+        """
+        intern tables shared by a group of CompactCVRs
+        """
+
+        __slots__ = ("contests", "candidates")
+
+        def __init__(self):
+            self.contests = InternTable()
+            self.candidates = InternTable()
+
+    __slots__ = (
+        "id",
+        "card_in_batch",
+        "phantom",
+        "tally_pool",
+        "pool",
+        "sample_num",
+        "p",
+        "sampled",
+        "_interned",
+        "_codes",
+        "_vals",
+    )
+
+    _scope = contextvars.ContextVar("CompactCVR.interning", default=None)
+
+    def __init__(self, *args, interned: "CompactCVR.Interned" = None, **kwargs):
+        self._interned = interned or self._scope.get() or CompactCVR.Interned()
+        super().__init__(*args, **kwargs)
+
+    def __reduce__(self):
+        return (type(self).from_record, (self.to_dict(),))
+
+    contests = property(lambda self: self._interned.contests)
+    candidates = property(lambda self: self._interned.candidates)
+
+    @classmethod
+    @contextmanager
+    def interning(cls, interned: "CompactCVR.Interned" = None):
+        """
+        Context in which the CompactCVRs constructed share intern tables
+
+        Parameters
+        ----------
+        interned: CompactCVR.Interned [optional]
+            the tables to share; default the tables of the enclosing `interning` block, if any, else new tables
+
+        Yields
+        ------
+        the CompactCVR.Interned in use
+        """
+        interned = interned or cls._scope.get() or CompactCVR.Interned()
+        token = cls._scope.set(interned)
+        try:
+            yield interned
+        finally:
+            cls._scope.reset(token)
+
+    @classmethod
+    def from_dict(cls, cvr_dict: list[dict]) -> list:
+        with cls.interning():
+            return super().from_dict(cvr_dict)
+
+    @classmethod
+    def from_raire(cls, raire: list, phantom: bool = False) -> Tuple[list, int]:
+        with cls.interning():
+            return super().from_raire(raire, phantom=phantom)
+
+    @classmethod
+    def from_raire_file(cls, cvr_file: str = None, accumulators: Collection = None) -> Tuple[list, int, int]:
+        with cls.interning():
+            return super().from_raire_file(cvr_file, accumulators=accumulators)
+
+    @classmethod
+    def read_ndjson(cls, f, accumulators: Collection = None) -> list:
+        with cls.interning():
+            return super().read_ndjson(f, accumulators=accumulators)
+
+    @classmethod
+    def iter_ndjson(cls, f) -> Iterator["CompactCVR"]:
+        cvrs = super().iter_ndjson(f)
+        interned = cls._scope.get() or CompactCVR.Interned()
+        while True:
+            # share the tables only while a CVR is being read, not while the caller holds the generator
+            with cls.interning(interned):
+                c = next(cvrs, None)
+            if c is None:
+                return
+            yield c
+
+    @property
+    def votes(self) -> dict:
+        codes, vals = self._codes, self._vals
+        n = codes[0]
+        base = 2 * n + 2
+        return {
+            self.contests[codes[1 + i]]: {
+                self.candidates[codes[j]]: vals[j - base] for j in range(codes[n + 1 + i], codes[n + 2 + i])
+            }
+            for i in range(n)
+        }
+
+    @votes.setter
+    def votes(self, votes: dict):
+        n = len(votes)
+        con_codes = [self.contests.code(con) for con in votes]
+        ptr = [2 * n + 2]
+        cand_codes = []
+        vals = []
+        for cand_votes in votes.values():
+            for cand, v in cand_votes.items():
+                cand_codes.append(self.candidates.code(cand))
+                vals.append(v)
+            ptr.append(ptr[-1] + len(cand_votes))
+        self._codes = array("i", [n, *con_codes, *ptr, *cand_codes])
+        self._vals = tuple(vals)
+
+    def _contest_pos(self, contest_id: str) -> int:
+        """
+        position of contest_id among the contests on this card, or -1 if the card does not contain it
+        """
+        con = self.contests.get(contest_id)
+        if con < 0:
+            return -1
+        try:
+            return self._codes.index(con, 1, self._codes[0] + 1) - 1
+        except ValueError:
+            return -1
+
+    def get_vote_for(self, contest_id: str, candidate: str):
+        i = self._contest_pos(contest_id)
+        cand = self.candidates.get(candidate)
+        if i < 0 or cand < 0:
+            return False
+        codes = self._codes
+        n = codes[0]
+        try:
+            j = codes.index(cand, codes[n + 1 + i], codes[n + 2 + i])
+        except ValueError:
+            return False
+        return self._vals[j - 2 * n - 2]
+
+    def has_contest(self, contest_id: str) -> bool:
+        return self._contest_pos(contest_id) >= 0
+
+    def update_votes(self, votes: dict) -> bool:
+        """
+        Update the votes for any contests the CVR already contains; add any contests and votes not already contained
+
+        Parameters
+        ----------
+        votes: dict of dict of dicts
+           key is a contest id; value is a dict of votes--keys and values
+
+        Returns
+        -------
+        added: bool
+            True if the contest was already present; else false
+
+        Side effects
+        ------------
+        updates the CVR to add the contest if it was not already present and to update the votes
+        """
+        current = self.votes
+        added = False
+        for c, v in votes.items():
+            if c in current:
+                current[c].update(v)
+            else:
+                current[c] = dict(v)
+                added = True
+        self.votes = current
+        return added
+
+    @classmethod
+    def from_cvrs(cls, cvr_list: "Collection[CVR]") -> list:
+        """
+        Convert a collection of CVRs (including a CVRTable) to a list of CompactCVRs
+
+        Parameters
+        ----------
+        cvr_list: Collection of CVRs
+
+        Returns
+        -------
+        list of CompactCVR objects with the same attributes and votes, sharing intern tables
+        """
+        interned = cls._scope.get() or CompactCVR.Interned()
+        return [
+            cls(
+                interned=interned,
+                id=c.id,
+                card_in_batch=c.card_in_batch,
+                votes=c.votes,
+                phantom=c.phantom,
+                tally_pool=c.tally_pool,
+                pool=c.pool,
+                sample_num=c.sample_num,
+                p=c.p,
+                sampled=c.sampled,
+            )
+            for c in cvr_list
+        ]
+
+
+##########################################################################################
+class PhantomCVR(CVRBase):
+    """
+    A phantom CVR in a PhantomCVRs list: a view of position `j` of the list's phantom columns.
+
+    Views are created on access and hold no data of their own; assigning to `id`, `sample_num`, `p`, `sampled`,
+    `card_in_batch`, or `votes` updates the list, so the change is seen by every later view of the phantom
+    (e.g., Dominion.raire_to_dominion renames phantoms). So do changes made in place to `votes`: the list
+    stores a phantom's votes the first time they are read. `phantom`, `tally_pool`, and `pool` are read-only.
+    """
+
+    __slots__ = ("_cvrs", "_j")
+
+    def __init__(self, cvrs: "PhantomCVRs", j: int):
+        self._cvrs = cvrs
+        self._j = j
+
+    @property
+    def id(self):
+        return self._cvrs.phantom_id(self._j)
+
+    @id.setter
+    def id(self, id):
+        self._cvrs.changed_ids[self._j] = id
+
+    phantom = property(lambda self: True)
+    tally_pool = property(lambda self: self._cvrs.tally_pool)
+    pool = property(lambda self: self._cvrs.pool)
+
+    def _column(name: str):
+        return property(
+            lambda self: self._cvrs.columns[name][self._j],
+            lambda self, v: self._cvrs.columns[name].__setitem__(self._j, v),
+        )
+
+    sample_num = _column("sample_num")
+    p = _column("p")
+    sampled = _column("sampled")
+    card_in_batch = _column("card_in_batch")
+    del _column
+
+    @property
+    def votes(self) -> dict:
+        return self._cvrs.phantom_votes(self._j)
+
+    @votes.setter
+    def votes(self, votes: dict):
+        self._cvrs.changed_votes[self._j] = votes
+        self._cvrs.version += 1
+
+    def has_contest(self, contest_id: str) -> bool:
+        return self._cvrs.phantom_has_contest(self._j, contest_id)
+
+    def update_votes(self, votes: dict) -> bool:
+        current = self.votes
+        added = False
+        for c, v in votes.items():
+            if c in current:
+                current[c].update(v)
+            else:
+                current[c] = v
+                added = True
+        self._cvrs.changed_votes[self._j] = current
+        if added:
+            self._cvrs.version += 1
+        return added
+
+
+##########################################################################################
+class PhantomCVRs(Sequence):
+    """
+    A list of CVRs followed by phantom CVRs that are not stored as objects.
+
+    Returned by CVR.make_phantoms(..., virtual=True). Phantom j (0-based) has id `prefix + str(j+1)` and,
+    if `contest_phantoms` is given, contains (with no votes) each contest c for which j < contest_phantoms[c],
+    in the order of `contest_phantoms`; otherwise it contains no contests. This is exactly what make_phantoms
+    creates when it materializes the phantoms, but the phantoms cost a few list slots each rather than a CVR object.
+
+    The list behaves like the list `cvr_list + phantoms`: it can be indexed, sliced, iterated, and sorted,
+    and indexing a phantom position returns a PhantomCVR view. The CVRs themselves are not copied: the list
+    refers to `cvrs`, which should not be modified while the PhantomCVRs list is in use.
+
+    Attributes
+    ----------
+    cvrs: list of CVR objects
+        the (real) CVRs
+    n_phantoms: int
+        number of phantoms
+    prefix: str
+        prefix for the phantom ids
+    contest_phantoms: dict
+        key is a contest id; value is the number of phantoms, starting with the first, that contain the contest
+    tally_pool, pool:
+        tally_pool and pool of every phantom
+    columns: dict of lists
+        per-phantom `sample_num`, `p`, `sampled`, and `card_in_batch`
+    changed_votes: dict
+        votes of individual phantoms that have been assigned or read, keyed by phantom number
+    changed_ids: dict
+        ids assigned to individual phantoms, keyed by phantom number
+    version: int
+        incremented when the list is reordered or the votes of a phantom are assigned or gain a contest, so that
+        a ContestIndex of the list can tell whether it is current
+    """
+
+    def __init__(
+        self,
+        cvrs: list = None,
+        n_phantoms: int = 0,
+        prefix: str = "phantom-",
+        contest_phantoms: dict = None,
+        tally_pool=None,
+        pool: bool = False,
+    ):
+        self.cvrs = [] if cvrs is None else cvrs
+        self.n_phantoms = max(n_phantoms, 0)
+        self.prefix = prefix
+        self.contest_phantoms = dict(contest_phantoms or {})
+        self.tally_pool = tally_pool
+        self.pool = pool
+        self.columns = {
+            "sample_num": [None] * self.n_phantoms,
+            "p": [None] * self.n_phantoms,
+            "sampled": [False] * self.n_phantoms,
+            "card_in_batch": [None] * self.n_phantoms,
+        }
+        self.changed_votes = {}
+        self.changed_ids = {}
+        self.version = 0
+        self.order = None  # physical position of each item, once the list has been reordered
+
+    def __len__(self) -> int:
+        return len(self.cvrs) + self.n_phantoms
+
+    def _physical(self, i: int) -> int:
+        return i if self.order is None else int(self.order[i])
+
+    def _item(self, k: int) -> CVR:
+        n = len(self.cvrs)
+        return self.cvrs[k] if k < n else PhantomCVR(self, k - n)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("PhantomCVRs index out of range")
+        return self._item(self._physical(i))
+
+    def __iter__(self):
+        n = len(self.cvrs)
+        if self.order is None:
+            yield from self.cvrs
+            for j in range(self.n_phantoms):
+                yield PhantomCVR(self, j)
+        else:
+            for k in self.order.tolist():
+                yield self.cvrs[k] if k < n else PhantomCVR(self, k - n)
+
+    def __add__(self, other) -> list:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> list:
+        return list(other) + list(self)
+
+    def __str__(self) -> str:
+        return f"PhantomCVRs: {len(self.cvrs)} CVRs and {self.n_phantoms} phantoms"
+
+    def is_phantom(self, i: int) -> bool:
+        return self._physical(i) >= len(self.cvrs)
+
+    def phantom_id(self, j: int):
+        """
+        the id of phantom j
+        """
+        return self.changed_ids.get(j, self.prefix + str(j + 1))
+
+    def phantom_votes(self, j: int) -> dict:
+        """
+        the votes on phantom j. The dict is stored in `changed_votes` the first time it is returned, so changes
+        made to it in place persist, as for the votes of a CVR object.
+        """
+        votes = self.changed_votes.get(j)
+        if votes is None:
+            votes = self.changed_votes[j] = {c: {} for c, k in self.contest_phantoms.items() if j < k}
+        return votes
+
+    def phantom_has_contest(self, j: int, contest_id: str) -> bool:
+        """
+        does phantom j contain the contest? Does not store its votes
+        """
+        votes = self.changed_votes.get(j)
+        if votes is None:
+            return j < self.contest_phantoms.get(contest_id, 0)
+        return contest_id in votes
+
+    def sort(self, key=None, reverse: bool = False):
+        """
+        reorder the list in place, as list.sort does; the phantoms are not materialized
+        """
+        keys = [x if key is None else key(x) for x in self]
+        order = sorted(range(len(self)), key=keys.__getitem__, reverse=reverse)
+        current = np.arange(len(self)) if self.order is None else self.order
+        self.order = current[np.asarray(order, dtype=np.int64)]
+        self.version += 1
+
+    def set_sample_nums(self, values: Collection):
+        """
+        assign sample numbers to the items, in order
+        """
+        n = len(self.cvrs)
+        column = self.columns["sample_num"]
+        for i, v in enumerate(values):
+            k = self._physical(i)
+            if k < n:
+                self.cvrs[k].sample_num = v
+            else:
+                column[k - n] = v
+
 
 ##########################################################################################
 class Audit:
@@ -1031,6 +1988,8 @@ class Audit:
         cvrs: list = None,
         mvr_sample: list = None,
         cvr_sample: list = None,
+        contest_index: ContestIndex = None,
+        cache: AssorterCache = None,
     ) -> int:
         """
         Estimate sample size for each contest and overall to allow the audit to complete.
@@ -1047,6 +2006,10 @@ class Audit:
             manually ascertained votes
         cvr_sample: list of CVR objects
             CVRs corresponding to the cards that were manually inspected
+        contest_index: ContestIndex [optional]
+            index of the contests on `cvrs`; built if not supplied or not current. Used only if use_style.
+        cache: AssorterCache [optional]
+            assorter values of the MVRs and CVRs sampled in previous rounds; only the new cards are assorted
 
         Returns
         -------
@@ -1067,61 +2030,91 @@ class Audit:
         # unless style information is being used, the sample size is the same for every contest.
         old = 0 if stratum.use_style else len(mvr_sample)
         old_sizes = {c: old for c in contests.keys()}
+        if stratum.use_style:
+            index = ContestIndex.of(cvrs, contest_index)
+            sampled = (
+                cvrs.sampled
+                if isinstance(cvrs, CVRTable)
+                else np.array([bool(cvr.sampled) for cvr in cvrs], dtype=bool)
+            )
+        assertions = [asn for con in contests.values() for asn in con.assertions.values() if not asn.proved]
+        tables = None if mvr_sample is None else Assertion._columnar(assertions, mvr_sample, cvr_sample)
+        cvr_tables = None  # the cvrs as CVRTables, for ONEAudit, converted at most once (False if not needed)
         for c, con in contests.items():
             if stratum.use_style:
-                old_sizes[c] = np.sum(
-                    np.array([cvr.sampled for cvr in cvrs if cvr.has_contest(c)])
-                )
+                old_sizes[c] = index.count(c, where=sampled)
             new_size = 0
-            for a, asn in con.assertions.items():
-                if not asn.proved:
-                    if mvr_sample is not None:  # use MVRs to estimate the next sample size. Set `prefix=True` to use data
-                        data, u = asn.mvrs_to_data(mvr_sample, cvr_sample)
-                        new_size = max(
-                            new_size,
-                            asn.find_sample_size(
-                                data=data,
-                                prefix=True,
-                                reps=self.reps,
-                                quantile=self.quantile,
-                                seed=self.sim_seed,
-                            ),
-                        )
-                    else:
-                        data = None
-                        if con.audit_type == Audit.AUDIT_TYPE.ONEAUDIT:
-                            if cvrs is None:
-                                raise ValueError("ONEAudit sample size estimate requires cvrs.")
-                            data, u = asn.mvrs_to_data(cvrs, cvrs, use_all=True)
-                            # the following treatment of overstatement errors is a little crude because it assigns 
-                            # errors to ONEAudit CVRs as if they were "raw" CVRs rather than averages,
-                            # but it should be conservative as a result.
-                            if self.error_rate_1:
-                                idx = np.arange(0, len(data), math.floor(1/self.error_rate_1))
-                                data[idx] = asn.make_overstatement(overs=1/2)
-                            if self.error_rate_2:
-                                idx = np.arange(0, len(data), math.floor(1/self.error_rate_2))
-                                data[idx] = asn.make_overstatement(overs=1)
-                        new_size = max(
-                            new_size,
-                            asn.find_sample_size(
-                                data=data,
-                                rate_1=self.error_rate_1,
-                                rate_2=self.error_rate_2,
-                                reps=self.reps,
-                                quantile=self.quantile,
-                                seed=self.sim_seed
-                            )
+            unproved = {a: asn for a, asn in con.assertions.items() if not asn.proved}
+            if mvr_sample is not None:
+                contest_data = Assertion.contest_mvrs_to_data(
+                    unproved, mvr_sample, cvr_sample, cache=cache, tables=tables
+                )
+            elif con.audit_type == Audit.AUDIT_TYPE.ONEAUDIT and unproved:
+                if cvrs is None:
+                    raise ValueError("ONEAudit sample size estimate requires cvrs.")
+                if cvr_tables is None:
+                    columns = Assertion._columnar(assertions, cvrs)
+                    cvr_tables = False if columns is None else columns * 2
+                contest_data = Assertion.contest_mvrs_to_data(
+                    unproved, cvrs, cvrs, use_all=True, tables=cvr_tables or None
+                )
+            for a, asn in unproved.items():
+                if mvr_sample is not None:  # use MVRs to estimate the next sample size. Set `prefix=True` to use data
+                    data, u = contest_data[a]
+                    new_size = max(
+                        new_size,
+                        asn.find_sample_size(
+                            data=data,
+                            prefix=True,
+                            reps=self.reps,
+                            quantile=self.quantile,
+                            seed=self.sim_seed,
+                        ),
+                    )
+                else:
+                    data = None
+                    if con.audit_type == Audit.AUDIT_TYPE.ONEAUDIT:
+                        data, u = contest_data[a]
+                        # the following treatment of overstatement errors is a little crude because it assigns 
+                        # errors to ONEAudit CVRs as if they were "raw" CVRs rather than averages,
+                        # but it should be conservative as a result.
+                        if self.error_rate_1:
+                            idx = np.arange(0, len(data), math.floor(1/self.error_rate_1))
+                            data[idx] = asn.make_overstatement(overs=1/2)
+                        if self.error_rate_2:
+                            idx = np.arange(0, len(data), math.floor(1/self.error_rate_2))
+                            data[idx] = asn.make_overstatement(overs=1)
+                    new_size = max(
+                        new_size,
+                        asn.find_sample_size(
+                            data=data,
+                            rate_1=self.error_rate_1,
+                            rate_2=self.error_rate_2,
+                            reps=self.reps,
+                            quantile=self.quantile,
+                            seed=self.sim_seed
                         )
+                    )
             con.sample_size = new_size
-        if stratum.use_style:
-            for cvr in cvrs:
+        if stratum.use_style and isinstance(cvrs, CVRTable):
+            cvrs.p[:] = 0
+            for c, con in contests.items():
+                cvrs.p[:] = np.where(
+                    index.mask(c),
+                    np.maximum(con.sample_size / (con.cards - old_sizes[c]), cvrs.p),
+                    cvrs.p,
+                )
+            cvrs.p[cvrs.sampled] = 1
+            total_size = math.ceil(np.sum(cvrs.p[~cvrs.phantom]))
+        elif stratum.use_style:
+            member = {c: index.mask(c) for c in contests}
+            for i, cvr in enumerate(cvrs):
                 if cvr.sampled:
                     cvr.p = 1
                 else:
                     cvr.p = 0
                     for c, con in contests.items():
-                        if cvr.has_contest(c) and not cvr.sampled:
+                        if member[c][i] and not cvr.sampled:
                             cvr.p = max(
                                 con.sample_size / (con.cards - old_sizes[c]), cvr.p
                             )
@@ -1504,7 +2497,21 @@ class Assertion:
             raise NotImplementedError("stratified audits not yet supported")
         stratum = next(iter(audit.strata.values()))
         use_style = stratum.use_style
-        amean = self.assorter.mean(cvr_list, use_style=use_style)
+        self.set_margin_from_mean(self.assorter.mean(cvr_list, use_style=use_style))
+
+    def set_margin_from_mean(self, amean: float = None):
+        """
+        set the assorter margin from the mean of the assorter over the CVRs, and set test.u accordingly
+
+        Parameters
+        ----------
+        amean: float
+            mean of the assorter over the CVRs, as found by Assorter.mean
+
+        Side effects
+        ------------
+        sets self.margin and self.test.u
+        """
         if amean < 1 / 2:
             warnings.warn(
                 f"assertion {self} not satisfied by CVRs: mean value is {amean}"
@@ -1666,6 +2673,161 @@ class Assertion:
             raise NotImplementedError(f"audit type {con.audit_type} not implemented")
         return d, u
 
+    @classmethod
+    def contest_mvrs_to_data(
+        cls,
+        assertions: dict = None,
+        mvr_sample: "Collection[CVR]" = None,
+        cvr_sample: "Collection[CVR]" = None,
+        use_all: bool = False,
+        cache: AssorterCache = None,
+        tables: tuple = None,
+    ) -> dict:
+        """
+        mvrs_to_data for every assertion of one contest, in one pass over the sample
+
+        The sample is put into columns (CVRTable) once, unless `tables` are given. Which pairs enter the data,
+        which MVRs are phantoms or lack the contest, and which CVRs are phantoms or pooled are found once for all
+        the assertions. For each assertion with a spec, the assorter values of all the MVRs and all the CVRs are
+        found with Assorter.kernel, pooled CVRs are mapped to their tally_pool means through an array indexed by
+        tally_pool code, and the overstatement assorter is evaluated on the whole sample at once.
+        Assertions without a spec use mvrs_to_data on the samples as given, unless there is a cache.
+
+        With a cache, only the MVRs and CVRs whose assorter values are not in the cache are assorted (for
+        assertions with a spec, with the kernel on a table of just those cards; for the others, with `assort`
+        on the cards of the samples as given), and the values are cached.
+
+        Parameters
+        ----------
+        assertions: dict of Assertions
+            assertions of the same contest
+        mvr_sample, cvr_sample, use_all:
+            as for mvrs_to_data; the samples may be CVRTables
+        cache: AssorterCache [optional]
+            assorter values from previous rounds
+        tables: tuple [optional]
+            (mvr_sample, cvr_sample) as CVRTables, from _columnar; used by the assertions with a spec, so the
+            samples are converted once for all the contests
+
+        Returns
+        -------
+        dict: (d, u) for each assertion, as returned by mvrs_to_data, with the same keys as `assertions`
+        """
+        out = {}
+        if not assertions:
+            return out
+        con = next(iter(assertions.values())).contest
+        comparison = con.audit_type in [Audit.AUDIT_TYPE.CARD_COMPARISON, Audit.AUDIT_TYPE.ONEAUDIT]
+        vectorized = {
+            a: asn for a, asn in assertions.items() if asn.assorter.spec is not None or cache is not None
+        }
+        if vectorized and tables is None:
+            tables = (cls._as_table(mvr_sample), cls._as_table(cvr_sample) if comparison else None)
+        if vectorized and con.audit_type == Audit.AUDIT_TYPE.POLLING:
+            mvrs = tables[0]
+            mvr_values = cls._assort_rows(vectorized, mvrs, np.arange(len(mvrs)), cache, "mvr", mvr_sample)
+            for a, asn in vectorized.items():
+                if mvr_values[a] is not None:
+                    out[a] = (mvr_values[a], asn.assorter.upper_bound)
+        elif vectorized and comparison:
+            mvrs, cvrs = tables
+            use_style = con.use_style
+            keep = np.ones(len(cvrs), dtype=bool)
+            if use_style:
+                keep = cvrs.has_contest(con.id)
+                if not use_all:
+                    rows = np.flatnonzero(keep)
+                    keep[rows] = [s <= con.sample_threshold for s in cvrs.sample_num_list(rows)]
+            rows = np.flatnonzero(keep)
+            mvr_zero = mvrs.phantom[rows] | (use_style & ~mvrs.has_contest(con.id)[rows])
+            cvr_phantom = cvrs.phantom[rows]
+            cvr_pooled = cvrs.pool[rows]
+            pool_codes = cvrs.tally_pool[rows]
+            mvr_values = cls._assort_rows(vectorized, mvrs, rows, cache, "mvr", mvr_sample)
+            cvr_values = cls._assort_rows(vectorized, cvrs, rows, cache, "cvr", cvr_sample)
+            for a, asn in vectorized.items():
+                assorter = asn.assorter
+                if mvr_values[a] is None or cvr_values[a] is None:
+                    continue
+                mvr_assort = np.where(mvr_zero, 0, mvr_values[a])
+                cvr_assort = np.where(cvr_phantom, 1 / 2, cvr_values[a])
+                if assorter.tally_pool_means is not None and cvr_pooled.any():
+                    codes = np.unique(pool_codes[cvr_pooled])
+                    pool_means = np.zeros(len(cvrs.tally_pools) + 1)  # code -1 (no tally_pool) is last
+                    for code in codes.tolist():
+                        pool_means[code] = assorter.tally_pool_means[None if code < 0 else cvrs.tally_pools[code]]
+                    cvr_assort = np.where(cvr_pooled, pool_means[pool_codes], cvr_assort)
+                ub = assorter.upper_bound
+                d = (1 - (cvr_assort - mvr_assort) / ub) / (2 - asn.margin / ub)
+                out[a] = (d, 2 / (2 - asn.margin / ub))
+        for a, asn in assertions.items():
+            if a not in out:
+                out[a] = asn.mvrs_to_data(mvr_sample, cvr_sample, use_all=use_all)
+        return {a: out[a] for a in assertions}
+
+    @classmethod
+    def _assort_rows(
+        cls,
+        assertions: dict,
+        table: CVRTable,
+        rows: np.ndarray,
+        cache: AssorterCache = None,
+        sample: str = None,
+        cvr_list: "Collection[CVR]" = None,
+    ) -> dict:
+        """
+        the values of the assorters of the assertions of one contest on `rows` of a CVRTable, with the same keys
+        as `assertions`; None for an assertion with a spec whose kernel cannot be used (non-numeric votes).
+
+        Without a cache, every assertion has a spec, and the kernel is evaluated on the whole table. With a
+        cache, the cards that miss for any assertion are taken into one table shared by all the assertions
+        (so IRV assertions share its rank matrix), and assertions without a spec call `assort` on each of them,
+        taken from `cvr_list` (the collection the table was made from).
+        """
+        out = {}
+        if cache is None:
+            for a, asn in assertions.items():
+                try:
+                    out[a] = asn.assorter.kernel(table)[rows]
+                except TypeError:
+                    out[a] = None
+            return out
+        con_id = next(iter(assertions.values())).contest.id
+        ids = table.id[rows].tolist()
+        new = np.zeros(len(rows), dtype=bool)
+        for a in assertions:
+            new |= cache.missing((con_id, a), sample, ids)
+        new_rows = rows[new]
+        new_table = table.take(new_rows) if new.any() else None
+        position = np.cumsum(new) - 1  # row of each card of `rows` in new_table
+        for a, asn in assertions.items():
+            assorter = asn.assorter
+            if assorter.spec is not None:
+                evaluate = lambda pos, assorter=assorter: assorter.kernel(new_table)[position[pos]]
+            else:
+                evaluate = lambda pos, assorter=assorter: [assorter.assort(cvr_list[r]) for r in rows[pos].tolist()]
+            try:
+                out[a] = cache.values((con_id, a), sample, ids, evaluate)
+            except TypeError:
+                if assorter.spec is None:
+                    raise
+                out[a] = None
+        return out
+
+    @classmethod
+    def _as_table(cls, cvr_list: "Collection[CVR]" = None) -> CVRTable:
+        return cvr_list if isinstance(cvr_list, CVRTable) else CVRTable.from_cvrs(cvr_list)
+
+    @classmethod
+    def _columnar(cls, assertions: Iterable, *samples) -> tuple:
+        """
+        the samples as CVRTables (None stays None) if any of the assertions has a spec, so that they are
+        converted once for all the contests; otherwise None
+        """
+        if not any(asn.assorter.spec is not None for asn in assertions):
+            return None
+        return tuple(None if s is None else cls._as_table(s) for s in samples)
+
     def find_sample_size(
         self,
         data: np.array = None,
@@ -1944,6 +3106,7 @@ class Assertion:
                         )
                         / 2,
                         upper_bound=1,
+                        spec={"kind": Assorter.SPEC.PLURALITY, "winner": winr, "loser": losr},
                     ),
                     test=_test,
                 )
@@ -1979,7 +3142,7 @@ class Assertion:
         eliminated.
 
         A CVR with a mark for more than one candidate in the contest is considered an
-        invalid vote.
+        invalid vote, as is a CVR that does not contain the contest.
 
         Parameters
         -----------
@@ -2027,10 +3190,16 @@ class Assertion:
                 assort=lambda c, contest_id=contest.id: (
                     CVR.as_vote(c.get_vote_for(contest.id, winner))
                     / (2 * contest.share_to_win)
-                    if c.has_one_vote(contest.id, cands)
+                    if c.has_contest(contest.id) and c.has_one_vote(contest.id, cands)
                     else 1 / 2
                 ),
                 upper_bound=1 / (2 * contest.share_to_win),
+                spec={
+                    "kind": Assorter.SPEC.SUPERMAJORITY,
+                    "winner": winner,
+                    "candidates": cands,
+                    "share_to_win": contest.share_to_win,
+                },
             ),
             test=_test,
             estim=estim,
@@ -2110,6 +3279,7 @@ class Assertion:
                         winner=winner_func,
                         loser=loser_func,
                         upper_bound=1,
+                        spec={"kind": Assorter.SPEC.IRV_WINNER_ONLY, "winner": winr, "loser": losr},
                     ),
                     winner=winr,
                     loser=losr,
@@ -2144,6 +3314,12 @@ class Assertion:
                         )
                         / 2,
                         upper_bound=1,
+                        spec={
+                            "kind": Assorter.SPEC.IRV_ELIMINATION,
+                            "winner": winr,
+                            "loser": losr,
+                            "remaining": remn,
+                        },
                     ),
                     winner=winr,
                     loser=losr,
@@ -2256,31 +3432,105 @@ class Assertion:
            `assertion.contest.audit_type==Audit.AUDIT_TYPE.POLLING`
            or `assertion.contest.audit_type in [Audit.AUDIT_TYPE.CARD_COMPARISON, Audit.AUDIT_TYPE.ONEAUDIT]`
         """
+        if len(audit.strata) > 1:
+            raise NotImplementedError("stratified audits not yet supported")
+        use_style = next(iter(audit.strata.values())).use_style
+        # the CVRs are converted to columns once; every assertion with a spec is then evaluated on the columns,
+        # and the others on the CVRs as given
+        table = cvr_list if isinstance(cvr_list, CVRTable) else None
+        if table is None and any(
+            asn.assorter.spec is not None for con in contests.values() for asn in con.assertions.values()
+        ):
+            table = CVRTable.from_cvrs(cvr_list)
         min_margin = np.inf
         for c, con in contests.items():
             con.margins = {}
+            means = cls.assorter_means(con.assertions, cvr_list, use_style=use_style, table=table)
             for a, asn in con.assertions.items():
-                asn.set_margin_from_cvrs(audit, cvr_list)
+                asn.set_margin_from_mean(means[a])
                 margin = asn.margin
                 con.margins.update({a: margin})
-                if con.audit_type == Audit.AUDIT_TYPE.POLLING:
-                    u = asn.assorter.upper_bound
-                elif con.audit_type in [
-                    Audit.AUDIT_TYPE.CARD_COMPARISON,
-                    Audit.AUDIT_TYPE.ONEAUDIT,
-                ]:
-                    u = 2 / (2 - margin / asn.assorter.upper_bound)
-                else:
-                    raise NotImplementedError(
-                        f"audit type {con.audit_type} not implemented"
-                    )
-                asn.test.u = u
                 min_margin = min(min_margin, margin)
         return min_margin
 
+    @classmethod
+    def assorter_means(
+        cls,
+        assertions: dict = None,
+        cvr_list: "Collection[CVR]" = None,
+        use_style: bool = True,
+        table: CVRTable = None,
+    ) -> dict:
+        """
+        Find the mean of the assorter of every assertion in a contest, sharing work among the assertions
+
+        For a CVRTable (`cvr_list`, or `table`), the vote indicator of each candidate in a PLURALITY or
+        SUPERMAJORITY assertion is computed once, and every such assorter mean is found from the candidates'
+        vote counts; other assertions with a spec are evaluated with Assorter.kernel, which shares the rank
+        matrix of the contest and the first preferences of each set of remaining candidates among IRV
+        assertions. The means of the other assertions, and of any whose kernel cannot be used (votes that are
+        not numbers), are found by Assorter.mean on `cvr_list`.
+
+        Parameters
+        ----------
+        assertions: dict of Assertions
+            the assertions of one contest
+        cvr_list: Collection
+            collection of CVR objects, or a CVRTable
+        use_style: bool
+            if True, average only over the CVRs that contain the contest
+        table: CVRTable [optional]
+            `cvr_list` as a CVRTable, if it has been converted already
+
+        Returns
+        -------
+        dict: the mean of the assorter of each assertion, with the same keys as `assertions`
+        """
+        means = {}
+        if table is None and isinstance(cvr_list, CVRTable):
+            table = cvr_list
+        if table is not None and assertions:
+            contest_id = next(iter(assertions.values())).contest.id
+            style = table.has_contest(contest_id) if use_style else np.ones(len(table), dtype=bool)
+            n = int(np.sum(style))
+            cands = {}  # candidate -> column of the vote indicators
+            for asn in assertions.values():
+                spec = asn.assorter.spec or {}
+                if spec.get("kind") == Assorter.SPEC.PLURALITY:
+                    cands.update({c: None for c in (spec["winner"], spec["loser"])})
+                elif spec.get("kind") == Assorter.SPEC.SUPERMAJORITY:
+                    cands.update({c: None for c in spec["candidates"]})
+            marks = np.zeros((n, len(cands)), dtype=bool)
+            for j, cand in enumerate(cands):
+                cands[cand] = j
+                marks[:, j] = table.vote_indicator(contest_id, cand)[style]
+            votes = marks.sum(axis=0)
+            for a, asn in assertions.items():
+                spec = asn.assorter.spec or {}
+                if n == 0 and spec.get("kind") in (Assorter.SPEC.PLURALITY, Assorter.SPEC.SUPERMAJORITY):
+                    means[a] = np.nan
+                elif spec.get("kind") == Assorter.SPEC.PLURALITY:
+                    means[a] = (votes[cands[spec["winner"]]] - votes[cands[spec["loser"]]] + n) / 2 / n
+                elif spec.get("kind") == Assorter.SPEC.SUPERMAJORITY:
+                    cols = [cands[c] for c in dict.fromkeys(spec["candidates"])]
+                    one_vote = marks[:, cols].sum(axis=1) == 1
+                    winner = np.sum(one_vote & marks[:, cands[spec["winner"]]])
+                    means[a] = (
+                        winner / (2 * spec["share_to_win"]) + (n - np.sum(one_vote)) / 2
+                    ) / n
+                elif spec and n > 0:
+                    try:
+                        means[a] = np.mean(asn.assorter.kernel(table)[style])
+                    except TypeError:
+                        pass  # votes that are not numbers
+        for a, asn in assertions.items():
+            if a not in means:
+                means[a] = asn.assorter.mean(cvr_list, use_style=use_style)
+        return means
+
     @classmethod
     def set_p_values(
-        cls, contests: dict, mvr_sample: list, cvr_sample: list = None
+        cls, contests: dict, mvr_sample: list, cvr_sample: list = None, cache: AssorterCache = None
     ) -> float:
         """
         Find the p-value for every assertion and update assertions & contests accordingly
@@ -2301,6 +3551,9 @@ class Assertion:
             the cvrs for the same sheets, for ballot-level comparison audits
             not needed for polling audits
 
+        cache: AssorterCache [optional]
+            assorter values of the cards sampled in previous rounds; only the new cards are assorted
+
         Returns
         -------
         p_max: float
@@ -2316,13 +3569,17 @@ class Assertion:
         """
         if cvr_sample is not None:
             assert len(mvr_sample) == len(cvr_sample), "unequal numbers of cvrs and mvrs"
+        tables = cls._columnar(
+            (asn for con in contests.values() for asn in con.assertions.values()), mvr_sample, cvr_sample
+        )
         p_max = 0
         for c, con in contests.items():
             con.p_values = {}
             con.proved = {}
             contest_max_p = 0
+            data = cls.contest_mvrs_to_data(con.assertions, mvr_sample, cvr_sample, cache=cache, tables=tables)
             for a, asn in con.assertions.items():
-                d, u = asn.mvrs_to_data(mvr_sample, cvr_sample)
+                d, u = data[a]
                 asn.test.u = u  # set upper bound for the test for each assorter
                 asn.p_value, asn.p_history = asn.test.test(d)
                 asn.proved = (asn.p_value <= con.risk_limit) or asn.proved
@@ -2378,6 +3635,17 @@ class Assorter:
     tally_pool_means: dict
         mean of the assorter over each tally_pool of CVRs, for ONEAudit
 
+    spec: dict
+        declarative description of the assorter, or None for a custom assorter. `spec["kind"]` is one of
+        Assorter.SPEC.SPEC_KINDS; the other keys are
+            PLURALITY:       winner, loser
+            SUPERMAJORITY:   winner, candidates (all candidates, including the winner), share_to_win
+            IRV_WINNER_ONLY: winner, loser
+            IRV_ELIMINATION: winner, loser, remaining (the candidates not yet eliminated)
+        The assertions made by Assertion.make_plurality_assertions, make_supermajority_assertion, and
+        make_assertions_from_json have a spec. For a CVRTable, `kernel` evaluates the spec on every card with
+        NumPy; otherwise, and for assorters without a spec, `assort` is called on one CVR at a time.
+
     The basic method is assort, but the constructor can be called with (winner, loser)
     instead. In that case,
 
@@ -2385,6 +3653,18 @@ class Assorter:
 
     """
 
+    class SPEC:
+        """
+        kinds of assorter specification
+        """
+
+        SPEC_KINDS = (
+            PLURALITY := "PLURALITY",
+            SUPERMAJORITY := "SUPERMAJORITY",
+            IRV_WINNER_ONLY := "IRV_WINNER_ONLY",
+            IRV_ELIMINATION := "IRV_ELIMINATION",
+        )
+
     def __init__(
         self,
         contest: object = None,
@@ -2393,6 +3673,7 @@ class Assorter:
         loser: str = None,
         upper_bound: float = 1,
         tally_pool_means: dict = None,
+        spec: dict = None,
     ):
         """
         Constructs an Assorter.
@@ -2417,8 +3698,13 @@ class Assorter:
             a priori upper bound on the value the assorter can take
         tally_pool_means: dict
             dict of the mean value of the assorter over each tally_pool of CVRs
+        spec: dict [optional]
+            declarative description of the assorter, equivalent to `assort`; see the class docstring
 
         """
+        if spec is not None and spec.get("kind") not in Assorter.SPEC.SPEC_KINDS:
+            raise ValueError(f"unknown assorter spec kind {spec.get('kind')!r}")
+        self.spec = spec
         self.contest = contest
         self.winner = winner
         self.loser = loser
@@ -2440,7 +3726,8 @@ class Assorter:
             f"contest_id: {self.contest.id}\nupper bound: {self.upper_bound}, "
             + f"winner defined: {callable(self.winner)}, loser defined: {callable(self.loser)}, "
             + f"assort defined: {callable(self.assort)} "
-            + f"tally_pool_means: {bool(self.tally_pool_means)}"
+            + f"tally_pool_means: {bool(self.tally_pool_means)} "
+            + f"spec: {None if self.spec is None else self.spec['kind']}"
         )
 
     def mean(self, cvr_list: "Collection[CVR]" = None, use_style: bool = True):
@@ -2461,12 +3748,93 @@ class Assorter:
             the mean value of the assorter over the collection of cvrs. If use_style, ignores CVRs that
             do not contain the contest.
         """
+        if isinstance(cvr_list, CVRTable):
+            return np.mean(self._assort_table(cvr_list, use_style))
         if use_style:
             filtr = lambda c: c.has_contest(self.contest.id)
         else:
             filtr = lambda c: True
         return np.mean([self.assort(c) for c in cvr_list if filtr(c)])
 
+    def _assort_table(self, cvr_list: CVRTable = None, use_style: bool = True, rows: np.ndarray = None):
+        """
+        values of the assorter applied to the CVRs in a CVRTable
+
+        Parameters
+        ----------
+        cvr_list: CVRTable
+        use_style: Boolean
+            if True, include only the CVRs that contain the contest
+        rows: np.array of int [optional]
+            restrict to these rows of the table
+
+        Returns
+        -------
+        np.array of assorter values, in row order
+
+        Notes
+        -----
+        Assorters without a spec, and votes that are not numbers, fall back to `assort` on a CVR rebuilt from each
+        row, which is slower than `assort` on a list of CVR objects; keep such CVRs in a list where possible.
+        """
+        rows = np.arange(len(cvr_list)) if rows is None else np.asarray(rows, dtype=np.int64)
+        if use_style:
+            rows = rows[cvr_list.has_contest(self.contest.id)[rows]]
+        if self.spec is not None:
+            try:
+                return self.kernel(cvr_list)[rows]
+            except TypeError:
+                pass  # votes that are not numbers: fall back to assort
+        return np.array([self.assort(cvr_list.row(i)) for i in rows], dtype=float)
+
+    def kernel(self, cvr_list: CVRTable = None) -> np.ndarray:
+        """
+        vectorized `assort`: the value of the assorter on every card of a CVRTable, computed from `spec`
+
+        Cards that do not contain the contest are assorted as if they contained it with no votes.
+
+        Parameters
+        ----------
+        cvr_list: CVRTable
+
+        Returns
+        -------
+        np.array of float, in row order
+
+        Raises
+        ------
+        ValueError if the assorter has no spec
+        TypeError if the votes needed are not all numbers
+        """
+        if self.spec is None:
+            raise ValueError("the assorter has no spec: use assort")
+        spec = self.spec
+        kind = spec["kind"]
+        contest_id = self.contest.id
+        if kind == Assorter.SPEC.PLURALITY:
+            return (
+                cvr_list.vote_indicator(contest_id, spec["winner"])
+                - cvr_list.vote_indicator(contest_id, spec["loser"])
+                + 1
+            ) / 2
+        if kind == Assorter.SPEC.SUPERMAJORITY:
+            cands = list(dict.fromkeys(spec["candidates"]))
+            marks, _ = cvr_list.vote_matrix(contest_id, cands)
+            one_vote = marks.sum(axis=1) == 1
+            winner = marks[:, cands.index(spec["winner"])]
+            return np.where(one_vote, winner / (2 * spec["share_to_win"]), 1 / 2)
+        if kind == Assorter.SPEC.IRV_WINNER_ONLY:
+            candidates, ranks = cvr_list.rank_matrix(contest_id)
+            winner, loser = (
+                ranks[:, candidates.index(c)] if c in candidates else np.full(len(cvr_list), np.inf)
+                for c in (spec["winner"], spec["loser"])
+            )
+            return ((winner == 1).astype(float) - (loser < winner) + 1) / 2
+        # IRV_ELIMINATION: the first preferences are shared by the assertions with the same remaining set
+        candidates, first = cvr_list.first_preference(contest_id, spec["remaining"])
+        winner, loser = (candidates.index(c) if c in candidates else -2 for c in (spec["winner"], spec["loser"]))
+        return ((first == winner).astype(float) - (first == loser) + 1) / 2
+
     def set_tally_pool_means(
         self,
         cvr_list: "Collection[CVR]" = None,
@@ -2492,6 +3860,27 @@ class Assorter:
         ------------
         sets self.tally_pool_means
         """
+        if isinstance(cvr_list, CVRTable):
+            codes = cvr_list.tally_pool
+            if not tally_pools:
+                tally_pools = set(
+                    None if tp < 0 else cvr_list.tally_pools[tp] for tp in set(codes[cvr_list.pool].tolist())
+                )
+            rows = np.flatnonzero(cvr_list.pool)
+            if use_style:
+                rows = rows[cvr_list.has_contest(self.contest.id)[rows]]
+            vals = self._assort_table(cvr_list, use_style=False, rows=rows)
+            n_pools = len(cvr_list.tally_pools) + 1  # CVRs with no tally_pool (code -1) are counted last
+            bins = np.where(codes[rows] < 0, n_pools - 1, codes[rows])
+            n = np.bincount(bins, minlength=n_pools)
+            tot = np.bincount(bins, weights=vals, minlength=n_pools)
+            self.tally_pool_means = {}
+            for p in tally_pools:
+                code = n_pools - 1 if p is None else cvr_list.tally_pools.get(p)
+                self.tally_pool_means[p] = (
+                    np.nan if code < 0 or n[code] == 0 else tot[code] / n[code]
+                )
+            return
         if not tally_pools:
             tally_pools = set(c.tally_pool for c in cvr_list if c.pool)
         tally_pool_dict = {}
@@ -2566,6 +3955,8 @@ class Assorter:
             sum of the value of the assorter over a list of CVRs. If use_style, ignores CVRs that
             do not contain the contest.
         """
+        if isinstance(cvr_list, CVRTable):
+            return np.sum(self._assort_table(cvr_list, use_style))
         if use_style:
             filtr = lambda c: c.has_contest(self.contest.id)
         else:
@@ -2761,12 +4152,13 @@ class Contest:
 
         """
         self.sample_size = 0
-        for a in self.assertions.values():
-            data = None
-            if mvr_sample is not None:  # process the MVRs/CVRs to get data appropriate to each assertion
-                data, u = a.mvrs_to_data(mvr_sample, cvr_sample)
-            elif self.audit_type == Audit.AUDIT_TYPE.ONEAUDIT:
-                data, u = a.mvrs_to_data(cvr_sample, cvr_sample) 
+        contest_data = {}
+        if mvr_sample is not None:  # process the MVRs/CVRs to get data appropriate to each assertion
+            contest_data = Assertion.contest_mvrs_to_data(self.assertions, mvr_sample, cvr_sample)
+        elif self.audit_type == Audit.AUDIT_TYPE.ONEAUDIT:
+            contest_data = Assertion.contest_mvrs_to_data(self.assertions, cvr_sample, cvr_sample)
+        for a_id, a in self.assertions.items():
+            data = contest_data[a_id][0] if a_id in contest_data else None
             self.sample_size = max(
                 self.sample_size,
                 a.find_sample_size(
@@ -2806,7 +4198,14 @@ class Contest:
             assn.find_margin_from_tally()
 
     @classmethod
-    def check_cards(cls, contests: Collection["Contest"], cvrs: Collection["CVR"], force: bool = False):
+    def check_cards(
+        cls,
+        contests: Collection["Contest"],
+        cvrs: Collection["CVR"],
+        force: bool = False,
+        contest_index: ContestIndex = None,
+        counts: dict = None,
+    ):
         '''
         Check whether the number of CVRs that contain each contest is not greater than the upper bound
         on the number of cards that contain the contest; optionally, increase the upper bounds to make that so.
@@ -2821,9 +4220,17 @@ class Contest:
             Increase the upper bounds to include all the CVRs.
             This is useful for ONEAudit when the original upper bounds were fine but ONEAudit added the contest
             to some CVRs in some pool batches.
+
+        contest_index: ContestIndex [optional]
+            index of the contests on the CVRs; built if not supplied or not current
+
+        counts: dict [optional]
+            number of CVRs containing each contest, e.g., from a CardCounts accumulator. If given, `cvrs` is
+            not used.
         '''
+        index = None if counts is not None else ContestIndex.of(cvrs, contest_index)
         for c, con in contests.items():
-            found = np.sum([cvr.has_contest(c) for cvr in cvrs])
+            found = counts.get(c, 0) if index is None else index.count(c)
             if found > con.cards:
                 if not force:
                     raise ValueError(f'{found} cards contain contest {c} but upper bound is {con.cards}')
@@ -2857,7 +4264,39 @@ class Contest:
         ------------
         Sets the `tally` dict for the contests in con_list, if their social choice function is appropriate
         """
-        tallies = {}
+        cons = cls._start_tallies(con_dict)
+        if isinstance(cvr_list, CVRTable):
+            cvr_list.tally({c.id: c for c in cons}, enforce_rules=enforce_rules)
+            return
+        for cvr in cvr_list:
+            cls._tally_cvr(cvr, cons, enforce_rules)
+
+    @classmethod
+    def _tally_cvr(cls, cvr: CVR, cons: list, enforce_rules: bool = True):
+        """
+        increment the tallies of the contests in `cons` with the votes on one CVR (see `tally`)
+        """
+        for c in cons:
+            if cvr.has_contest(c.id):
+                if enforce_rules:
+                    n_votes = 0
+                    for candidate, vote in cvr.votes[c.id].items():
+                        if candidate:
+                            n_votes += int(bool(vote))
+                if (not enforce_rules) or (n_votes <= c.n_winners):
+                    for candidate, vote in cvr.votes[c.id].items():
+                        if candidate:
+                            c.tally[candidate] += int(bool(vote))
+
+    @classmethod
+    def _start_tallies(cls, con_dict: dict) -> list:
+        """
+        reset the `tally` of each contest in con_dict that can be tallied; warn about the others
+
+        Returns
+        -------
+        list of the Contests that can be tallied
+        """
         cons = []
         for id, c in con_dict.items():
             if c.choice_function in [
@@ -2872,18 +4311,7 @@ class Contest:
                     f"contest {c.id} ({c.name}) has social choice function "
                     + f"{c.choice_function}: not tabulated"
                 )
-        for cvr in cvr_list:
-            for c in cons:
-                if cvr.has_contest(c.id):
-                    if enforce_rules:
-                        n_votes = 0
-                        for candidate, vote in cvr.votes[c.id].items():
-                            if candidate:
-                                n_votes += int(bool(vote))
-                    if (not enforce_rules) or (n_votes <= c.n_winners):
-                        for candidate, vote in cvr.votes[c.id].items():
-                            if candidate:
-                                c.tally[candidate] += int(bool(vote))
+        return cons
 
     @classmethod
     def from_dict(cls, d: dict) -> dict:
@@ -0,0 +1,121 @@
+"""
+Aggregates of cast-vote records computed while the records are read
+"""
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import Collection, Iterable
+
+
+##########################################################################################
+class CVRAccumulator(ABC):
+    """
+    An aggregate over CVRs that is updated one CVR at a time, so it can be computed as a reader produces CVRs
+    instead of in a separate pass over a list of CVRs afterwards.
+
+    The readers (Dominion.read_cvrs, Dominion.iter_cvrs, Dominion.read_cvrs_directory, Hart.read_cvrs_zip,
+    CVR.from_raire_file) take a collection of accumulators and `add` every CVR they produce to each of them.
+    The memory an accumulator uses depends on the number of contests, candidates, and tally_pools, not on
+    the number of CVRs.
+
+    Example
+    -------
+        cards, pools, tallies = CardCounts(), PoolContests(), Tallies(contests)
+        cvr_list = Dominion.read_cvrs_directory("CVR_Export", accumulators=[cards, pools, tallies])
+        Contest.check_cards(contests, counts=cards.result())
+
+    Subclasses implement `add` and `result`.
+    """
+
+    @abstractmethod
+    def add(self, cvr: "CVR"):
+        """
+        update the aggregate with one CVR
+        """
+
+    @abstractmethod
+    def result(self):
+        """
+        the aggregate of the CVRs added so far
+        """
+
+    @classmethod
+    def feed(cls, cvrs: Iterable, accumulators: Collection = None):
+        """
+        Generator that adds each CVR in `cvrs` to every accumulator as it passes through
+
+        Parameters
+        ----------
+        cvrs: iterable of CVRs
+        accumulators: collection of CVRAccumulators [optional]
+
+        Yields
+        ------
+        the CVRs, unchanged
+        """
+        if not accumulators:
+            yield from cvrs
+            return
+        adds = [a.add for a in accumulators]
+        for c in cvrs:
+            for add in adds:
+                add(c)
+            yield c
+
+
+##########################################################################################
+class CardCounts(CVRAccumulator):
+    """
+    number of CVRs containing each contest, as CVR.tabulate_cards_contests
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+
+    def add(self, cvr: "CVR"):
+        for con in cvr.votes:
+            self.counts[con] += 1
+
+    def result(self) -> dict:
+        return self.counts
+
+
+##########################################################################################
+class PoolContests(CVRAccumulator):
+    """
+    contests mentioned on any pooled CVR in each tally_pool, as CVR.pool_contests
+    """
+
+    def __init__(self):
+        self.tally_pools = defaultdict(set)
+
+    def add(self, cvr: "CVR"):
+        if cvr.pool:
+            self.tally_pools[cvr.tally_pool].update(cvr.votes.keys())
+
+    def result(self) -> dict:
+        return self.tally_pools
+
+
+##########################################################################################
+class Tallies(CVRAccumulator):
+    """
+    the tallies of the contests in `con_dict`, as Contest.tally
+
+    Creating the accumulator resets the `tally` of each contest whose social choice function can be tallied
+    (and warns about the others); adding a CVR increments them.
+    """
+
+    def __init__(self, con_dict: dict = None, enforce_rules: bool = True):
+        from .Audit import Contest
+
+        self.con_dict = con_dict
+        self.enforce_rules = enforce_rules
+        self.cons = Contest._start_tallies(con_dict)
+        self._tally_cvr = Contest._tally_cvr
+
+    def add(self, cvr: "CVR"):
+        self._tally_cvr(cvr, self.cons, self.enforce_rules)
+
+    def result(self) -> dict:
+        return {c.id: c.tally for c in self.cons}
@@ -0,0 +1,326 @@
+"""
+Content-addressed on-disk cache of parsed CVRs
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from collections.abc import Callable, Collection
+
+from .CVRTable import CVRTable
+
+
+##########################################################################################
+class CVRCache:
+    """
+    On-disk cache of parsed CVR collections, keyed by the contents of the source files and the reader options.
+
+    Each entry is a CVRTable stored as an .npz archive of fixed-width arrays (see `CVRTable.to_arrays`);
+    nothing is pickled. Reloading an entry avoids re-parsing Dominion JSON, Hart XML, or RAIRE CSV.
+
+    Because keys are hashes of the file contents, an entry is never returned for sources that have changed:
+    editing a source yields a new key, and the stale entry is eventually evicted. If `max_bytes` is set,
+    least-recently-used entries are deleted whenever the total size of the cache exceeds it.
+
+    Example
+    -------
+        cache = CVRCache("~/.cache/shangrla")
+        cvr_list = cache.load(Dominion.read_cvrs_directory, "data/CVR_Export", pool_groups=[1])
+        cvrs, cvrs_read, unique_ids = cache.load(CVR.from_raire_file, "data/SFDA2019.raire")
+
+    Attributes
+    ----------
+    cache_dir: str
+        directory containing the cache entries
+    max_bytes: int
+        upper limit on the total size of the entries; None for no limit
+    hits, misses: int
+        number of calls to `load` that did and did not find an entry
+    """
+
+    FORMAT_VERSION = 1
+    SUFFIX = ".npz"
+
+    def __init__(self, cache_dir: str, max_bytes: int = None, compress: bool = False):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __str__(self) -> str:
+        return (
+            f"CVRCache: {self.cache_dir=} {self.max_bytes=} entries: {len(self.entries())} "
+            + f"bytes: {self.size()} hits: {self.hits} misses: {self.misses}"
+        )
+
+    @classmethod
+    def hash_sources(cls, sources, h: object = None) -> object:
+        """
+        Update a hash with the contents of files and directories
+
+        Parameters
+        ----------
+        sources: str or Collection of str
+            filenames or directory names. Directories contribute every file beneath them, in sorted order,
+            together with the file's path relative to the directory.
+        h: hashlib hash object [optional]
+            hash to update; default a new sha256
+
+        Returns
+        -------
+        the hash object
+        """
+        h = hashlib.sha256() if h is None else h
+        for source in [sources] if isinstance(sources, (str, os.PathLike)) else sources:
+            source = os.fspath(source)
+            if os.path.isdir(source):
+                files = sorted(
+                    os.path.join(root, f) for root, _, fs in os.walk(source) for f in fs
+                )
+            else:
+                files = [source]
+            for f in files:
+                h.update(os.path.relpath(f, source).encode() + b"\0")
+                with open(f, "rb") as fh:
+                    for block in iter(lambda: fh.read(2**20), b""):
+                        h.update(block)
+                h.update(b"\0")
+        return h
+
+    def key(self, reader: Callable = None, sources=None, **options) -> str:
+        """
+        The cache key for reading `sources` with `reader` and `options`
+
+        Parameters
+        ----------
+        reader: callable
+            the function that parses the sources, e.g., Dominion.read_cvrs_directory. For a classmethod, the
+            class it is bound to is part of the key, so CVR.from_raire_file and CompactCVR.from_raire_file
+            have different keys.
+        sources: str or Collection of str
+            files or directories read by `reader`
+        options: dict
+            keyword arguments to `reader`. Values must be representable in JSON; sets are represented as
+            sorted lists.
+
+        Returns
+        -------
+        hex digest (str)
+
+        Raises
+        ------
+        ValueError if an option cannot be represented in JSON (e.g., a function or a Contest), since such
+        an option has no representation that is stable from one run to the next
+        """
+        name = f"{reader.__module__}.{reader.__qualname__}"
+        owner = getattr(reader, "__self__", None)
+        if owner is not None:
+            owner = owner if isinstance(owner, type) else type(owner)
+            name = f"{owner.__module__}.{owner.__qualname__}.{reader.__name__}"
+        h = hashlib.sha256()
+        h.update(
+            json.dumps(
+                {
+                    "version": self.FORMAT_VERSION,
+                    "reader": name,
+                    "options": options,
+                },
+                sort_keys=True,
+                default=self._json_option,
+            ).encode()
+        )
+        return self.hash_sources(sources, h).hexdigest()
+
+    @classmethod
+    def _json_option(cls, value):
+        if isinstance(value, (set, frozenset)):
+            try:
+                return sorted(value)
+            except TypeError:
+                pass
+        raise ValueError(f"reader option {value!r} cannot be part of a cache key: it is not representable in JSON")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key: str) -> tuple:
+        """
+        Retrieve an entry
+
+        Parameters
+        ----------
+        key: str
+            cache key
+
+        Returns
+        -------
+        cvrs: CVRTable, or None if there is no entry for the key
+        extra: list
+            any additional values stored with the entry
+
+        Side effects
+        ------------
+        marks the entry as recently used
+        """
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                cvrs = CVRTable.from_arrays(arrays)
+                extra = json.loads(str(arrays["extra"][()]))
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None, []
+        os.utime(path)
+        return cvrs, extra
+
+    def put(self, key: str, cvrs: Collection, extra: list = None) -> str:
+        """
+        Store an entry, replacing any entry with the same key
+
+        Parameters
+        ----------
+        key: str
+            cache key
+        cvrs: Collection of CVRs or CVRTable
+            the CVRs to store
+        extra: list [optional]
+            JSON-serializable values to store with the CVRs
+
+        Returns
+        -------
+        path to the entry
+
+        Side effects
+        ------------
+        writes the entry atomically; evicts least-recently-used entries if the cache exceeds `max_bytes`
+        """
+        arrays = CVRTable.from_cvrs(cvrs).to_arrays()
+        arrays["extra"] = np.array(json.dumps(extra or []))
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                (np.savez_compressed if self.compress else np.savez)(f, **arrays)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def load(self, reader: Callable = None, sources=None, as_table: bool = False, **options):
+        """
+        Return the result of `reader(sources, **options)`, from the cache if possible
+
+        If `reader` returns a tuple, its first element must be the CVRs and the remaining elements must be
+        JSON-serializable (e.g., the counts returned by `CVR.from_raire_file`); they are cached with the CVRs
+        and a tuple is returned.
+
+        Parameters
+        ----------
+        reader: callable
+            function that parses `sources`
+        sources: str or Collection of str
+            files or directories read by `reader`; passed to it as its first argument
+        as_table: bool [optional], default False
+            if True, return the CVRs as a CVRTable (fastest); otherwise, as a list of CVR objects. If `reader`
+            is a classmethod of a CVR class (e.g., CompactCVR.from_raire_file), a cached entry is returned as
+            objects of that class, as the reader returns them; otherwise as CVRs.
+        options: dict
+            keyword arguments for `reader`
+
+        Returns
+        -------
+        the CVRs (and any other values returned by `reader`)
+        """
+        key = self.key(reader, sources, **options)
+        cvrs, extra = self.get(key)
+        if cvrs is None:
+            self.misses += 1
+            result = reader(sources, **options)
+            is_tuple = isinstance(result, tuple)
+            cvr_list, extra = (result[0], list(result[1:])) if is_tuple else (result, [])
+            self.put(key, cvr_list, [is_tuple, *extra])
+            if not as_table:
+                return result
+            cvrs = CVRTable.from_cvrs(cvr_list)
+        else:
+            self.hits += 1
+            is_tuple, extra = extra[0], extra[1:]
+            if not as_table:
+                cvrs = self._to_cvrs(reader, cvrs)
+        return (cvrs, *extra) if is_tuple else cvrs
+
+    @classmethod
+    def _to_cvrs(cls, reader: Callable, table: CVRTable) -> list:
+        """
+        the CVRs of a cached entry, as objects of the CVR class `reader` is bound to, if any
+        """
+        from .Audit import CVR, CVRBase
+
+        cvr_list = table.to_cvrs()
+        owner = getattr(reader, "__self__", None)
+        if isinstance(owner, type) and issubclass(owner, CVRBase) and owner is not CVR:
+            cvr_list = owner.from_dict([c.to_dict() for c in cvr_list])
+        return cvr_list
+
+    def entries(self) -> list:
+        """
+        paths of the entries, least recently used first
+        """
+        paths = [
+            os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(self.SUFFIX)
+        ]
+        return sorted(paths, key=os.path.getmtime)
+
+    def size(self) -> int:
+        """
+        total size of the entries in bytes
+        """
+        return sum(os.path.getsize(p) for p in self.entries())
+
+    def evict(self, keep: str = None) -> int:
+        """
+        Delete least-recently-used entries until the total size is at most `max_bytes`
+
+        Parameters
+        ----------
+        keep: str [optional]
+            key of an entry not to delete
+
+        Returns
+        -------
+        number of entries deleted
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = self.entries()
+        total = sum(os.path.getsize(p) for p in entries)
+        deleted = 0
+        for p in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and p == self.path(keep):
+                continue
+            total -= os.path.getsize(p)
+            os.remove(p)
+            deleted += 1
+        return deleted
+
+    def invalidate(self, key: str = None) -> int:
+        """
+        Delete the entry for `key`, or every entry if `key` is None
+
+        Returns
+        -------
+        number of entries deleted
+        """
+        paths = self.entries() if key is None else [self.path(key)]
+        deleted = 0
+        for p in paths:
+            if os.path.exists(p):
+                os.remove(p)
+                deleted += 1
+        return deleted
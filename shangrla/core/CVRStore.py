@@ -0,0 +1,318 @@
+"""
+SQLite-backed storage for cast-vote records, indexed by id, tally_pool, and contest
+"""
+
+import json
+import sqlite3
+import numpy as np
+from collections.abc import Collection, Sequence
+
+
+##########################################################################################
+class CVRStore(Sequence):
+    """
+    Cast-vote records in a local SQLite database, with indexes for looking up cards by id, by tally_pool
+    (batch), and by contest without scanning every record.
+
+    The store is a sequence: `len(store)`, `store[i]`, and iteration (which streams from the database)
+    return CVR objects in the order the CVRs were added, so a store can be passed to code that iterates
+    over CVRs, e.g., Assorter.mean. CVR.assign_sample_nums and CVR.consistent_sampling recognize a store and
+    write sample numbers and the `sampled` flag to the database.
+
+    The CVRs returned are copies: changing their attributes does not change the store. Use `put` to replace
+    stored CVRs.
+
+    Sample numbers must be non-negative integers less than 2**256 (or None). They are stored as fixed-width
+    hexadecimal text, so that ordering by the column orders the cards by sample number.
+
+    Example
+    -------
+        with CVRStore("cvrs.db") as store:
+            store.add(Dominion.iter_cvrs("CvrExport.json"))
+            CVR.assign_sample_nums(store, prng)
+            sample = CVR.consistent_sampling(store, contests)
+            cvr = store.get("1-1-1")
+
+    Attributes
+    ----------
+    path: str
+        the database file, or ":memory:"
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cvrs (
+            pos INTEGER PRIMARY KEY,
+            id,
+            card_in_batch INTEGER,
+            phantom INTEGER NOT NULL,
+            tally_pool,
+            pool INTEGER NOT NULL,
+            sample_num TEXT,
+            p REAL,
+            sampled INTEGER NOT NULL,
+            votes TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS contests (
+            contest NOT NULL,
+            pos INTEGER NOT NULL,
+            PRIMARY KEY (contest, pos)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS cvrs_id ON cvrs (id);
+        CREATE INDEX IF NOT EXISTS cvrs_tally_pool ON cvrs (tally_pool);
+        CREATE INDEX IF NOT EXISTS cvrs_sample_num ON cvrs (sample_num);
+    """
+    COLUMNS = "pos, id, card_in_batch, phantom, tally_pool, pool, sample_num, p, sampled, votes"
+    SAMPLE_NUM_DIGITS = 64
+    BATCH_SIZE = 10000
+    MAX_PARAMS = 999  # host parameters per statement; the default limit of older SQLite builds
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(self.SCHEMA)
+        self._len = self.conn.execute("SELECT COUNT(*) FROM cvrs").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"index {i} out of range for CVRStore of length {len(self)}")
+        return self._query_one("WHERE pos = ?", (i,))
+
+    def __iter__(self):
+        return self._query("ORDER BY pos")
+
+    def __str__(self) -> str:
+        return f"CVRStore: {self.path} {len(self)} CVRs"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    @classmethod
+    def from_cvrs(cls, cvr_list: Collection = None, path: str = ":memory:") -> "CVRStore":
+        """
+        Create a store containing the CVRs
+
+        Parameters
+        ----------
+        cvr_list: iterable of CVRs
+            e.g., a list of CVRs, a CVRTable, or a generator such as Dominion.iter_cvrs
+        path: str
+            database file; default in memory
+        """
+        store = cls(path)
+        store.add(cvr_list)
+        return store
+
+    @classmethod
+    def encode_sample_num(cls, sample_num) -> str:
+        if sample_num is None:
+            return None
+        if isinstance(sample_num, (bool, float, np.floating)) or not 0 <= sample_num < 2**256:
+            raise ValueError(f"CVRStore cannot store sample_num {sample_num!r}: not an integer in [0, 2**256)")
+        return format(int(sample_num), f"0{cls.SAMPLE_NUM_DIGITS}x")
+
+    @classmethod
+    def decode_sample_num(cls, text: str):
+        return None if text is None else int(text, 16)
+
+    @classmethod
+    def _native(cls, value):
+        return value.item() if isinstance(value, np.generic) else value
+
+    def add(self, cvr_list: Collection = None) -> int:
+        """
+        Append CVRs to the store, in batches, in one transaction
+
+        Parameters
+        ----------
+        cvr_list: iterable of CVRs
+
+        Returns
+        -------
+        the number of CVRs added
+        """
+        n = 0
+        with self.conn:
+            rows, entries = [], []
+            for c in cvr_list:
+                pos = self._len + n
+                rows.append(self._encode(pos, c))
+                entries.extend((con, pos) for con in c.votes)
+                n += 1
+                if len(rows) == self.BATCH_SIZE:
+                    self._insert(rows, entries)
+                    rows, entries = [], []
+            self._insert(rows, entries)
+        self._len += n
+        return n
+
+    def _insert(self, rows: list, entries: list):
+        self.conn.executemany(f"INSERT INTO cvrs ({self.COLUMNS}) VALUES (?,?,?,?,?,?,?,?,?,?)", rows)
+        self.conn.executemany("INSERT INTO contests (contest, pos) VALUES (?,?)", entries)
+
+    def _encode(self, pos: int, c) -> tuple:
+        return (
+            pos,
+            self._native(c.id),
+            self._native(c.card_in_batch),
+            bool(c.phantom),
+            self._native(c.tally_pool),
+            bool(c.pool),
+            self.encode_sample_num(c.sample_num),
+            self._native(c.p),
+            bool(c.sampled),
+            json.dumps(c.votes, default=self._native),
+        )
+
+    def _decode(self, row: tuple):
+        from .Audit import CVR
+
+        pos, id, card_in_batch, phantom, tally_pool, pool, sample_num, p, sampled, votes = row
+        return CVR(
+            id=id,
+            card_in_batch=card_in_batch,
+            votes=json.loads(votes),
+            phantom=bool(phantom),
+            tally_pool=tally_pool,
+            pool=bool(pool),
+            sample_num=self.decode_sample_num(sample_num),
+            p=p,
+            sampled=bool(sampled),
+        )
+
+    def _query(self, clause: str, params: tuple = ()):
+        """
+        generator of the CVRs selected by an SQL clause on the cvrs table
+        """
+        cursor = self.conn.execute(f"SELECT {self.COLUMNS} FROM cvrs {clause}", params)
+        while rows := cursor.fetchmany(self.BATCH_SIZE):
+            for row in rows:
+                yield self._decode(row)
+
+    def _query_one(self, clause: str, params: tuple = ()):
+        row = self.conn.execute(f"SELECT {self.COLUMNS} FROM cvrs {clause} LIMIT 1", params).fetchone()
+        return None if row is None else self._decode(row)
+
+    def put(self, i: int, cvr) -> None:
+        """
+        replace the CVR at position i
+        """
+        if not 0 <= i < len(self):
+            raise IndexError(f"index {i} out of range for CVRStore of length {len(self)}")
+        with self.conn:
+            self.conn.execute("DELETE FROM cvrs WHERE pos = ?", (i,))
+            self.conn.execute("DELETE FROM contests WHERE pos = ?", (i,))
+            self._insert([self._encode(i, cvr)], [(con, i) for con in cvr.votes])
+
+    def get(self, cvr_id, default=None):
+        """
+        the CVR with id `cvr_id` (the first, if there are several), or `default`
+        """
+        cvr = self._query_one("WHERE id = ? ORDER BY pos", (self._native(cvr_id),))
+        return default if cvr is None else cvr
+
+    def position(self, cvr_id) -> int:
+        """
+        position of the first CVR with id `cvr_id`, or -1
+        """
+        row = self.conn.execute(
+            "SELECT pos FROM cvrs WHERE id = ? ORDER BY pos LIMIT 1", (self._native(cvr_id),)
+        ).fetchone()
+        return -1 if row is None else row[0]
+
+    def in_tally_pool(self, tally_pool) -> "Iterator[CVR]":
+        """
+        the CVRs in `tally_pool`, in order
+        """
+        return self._query("WHERE tally_pool = ? ORDER BY pos", (self._native(tally_pool),))
+
+    def tally_pools(self) -> list:
+        """
+        the distinct tally_pools, excluding None
+        """
+        return [
+            r[0]
+            for r in self.conn.execute(
+                "SELECT DISTINCT tally_pool FROM cvrs WHERE tally_pool IS NOT NULL ORDER BY tally_pool"
+            )
+        ]
+
+    def with_contest(self, contest_id: str) -> "Iterator[CVR]":
+        """
+        the CVRs that contain the contest, in order
+        """
+        return self._query(
+            "WHERE pos IN (SELECT pos FROM contests WHERE contest = ?) ORDER BY pos", (contest_id,)
+        )
+
+    def contest_positions(self, contest_id: str) -> np.ndarray:
+        """
+        ascending positions of the CVRs that contain the contest
+        """
+        rows = self.conn.execute("SELECT pos FROM contests WHERE contest = ? ORDER BY pos", (contest_id,))
+        return np.fromiter((r[0] for r in rows), dtype=np.int64)
+
+    def has_contest(self, contest_id: str) -> np.ndarray:
+        """
+        vectorized CVR.has_contest: np.array of bool, which cards contain the contest
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.contest_positions(contest_id)] = True
+        return mask
+
+    def set_sample_nums(self, values: Collection):
+        """
+        assign sample numbers to the CVRs, in order
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE cvrs SET sample_num = ? WHERE pos = ?",
+                ((self.encode_sample_num(v), i) for i, v in enumerate(values)),
+            )
+
+    def sample_num_list(self, idx: Collection) -> list:
+        """
+        the sample numbers of the CVRs at positions idx
+        """
+        idx = [int(i) for i in idx]
+        found = {}
+        for start in range(0, len(idx), self.MAX_PARAMS):
+            chunk = sorted(set(idx[start : start + self.MAX_PARAMS]))
+            found.update(
+                self.conn.execute(
+                    f"SELECT pos, sample_num FROM cvrs WHERE pos IN ({','.join('?' * len(chunk))})", chunk
+                )
+            )
+        missing = set(idx) - found.keys()
+        if missing:
+            raise IndexError(f"index {min(missing)} out of range for CVRStore of length {len(self)}")
+        return [self.decode_sample_num(found[i]) for i in idx]
+
+    def sample_order(self) -> np.ndarray:
+        """
+        positions of the CVRs in order of increasing sample number (ties in order of position)
+        """
+        rows = self.conn.execute("SELECT pos FROM cvrs ORDER BY sample_num, pos")
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(self))
+
+    def set_sampled(self, idx: Collection, sampled: bool = True):
+        """
+        set the `sampled` flag of the CVRs at positions idx
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE cvrs SET sampled = ? WHERE pos = ?", ((bool(sampled), int(i)) for i in idx)
+            )
@@ -0,0 +1,1368 @@
+"""
+Columnar storage for large collections of cast-vote records
+"""
+
+import csv
+import json
+import numbers
+import os
+import numpy as np
+from array import array
+from collections import defaultdict
+from collections.abc import Collection
+
+from .Compressed import Compressed
+
+
+##########################################################################################
+class InternTable:
+    """
+    Bidirectional map between hashable labels (contest ids, candidate ids, tally pools) and
+    consecutive integer codes 0, 1, 2, ...
+
+    Each label is stored once, no matter how many cards mention it.
+    """
+
+    def __init__(self, labels: Collection = None):
+        self.labels = []
+        self.codes = {}
+        for label in labels if labels is not None else []:
+            self.code(label)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __contains__(self, label) -> bool:
+        return label in self.codes
+
+    def __getitem__(self, code: int):
+        return self.labels[code]
+
+    def __str__(self) -> str:
+        return str(self.labels)
+
+    def code(self, label) -> int:
+        """
+        return the code for `label`, adding `label` to the table if it is not already present
+        """
+        c = self.codes.get(label)
+        if c is None:
+            c = len(self.labels)
+            self.codes[label] = c
+            self.labels.append(label)
+        return c
+
+    def get(self, label, default: int = -1) -> int:
+        """
+        return the code for `label`, or `default` if `label` is not in the table
+        """
+        return self.codes.get(label, default)
+
+
+##########################################################################################
+class CVRTable:
+    """
+    Columnar representation of a collection of CVRs.
+
+    Card-level attributes are stored as NumPy arrays with one element per card; contests, candidates,
+    and tally pools are interned to integer codes. Votes are stored in two levels of compressed-sparse-row
+    (CSR) arrays:
+        the contests on card i are the entries con_ptr[i]:con_ptr[i+1] of con_code
+        the votes in entry e are the elements vote_ptr[e]:vote_ptr[e+1] of vote_cand and vote_val
+    The order of contests on each card and of candidates within each contest is preserved, so converting
+    a list of CVRs to a CVRTable and back reproduces the original CVRs.
+
+    A CVRTable is a Collection of CVRs: iterating over it or indexing it with an int yields CVR objects
+    constructed on demand. Those objects are copies: changes to their attributes do not change the table.
+    Methods of CVR, Assorter, Assertion, Contest, and Audit that take a collection of CVRs recognize a
+    CVRTable and operate on its columns directly, including methods that set `sample_num`, `sampled`, `p`,
+    and `card_in_batch`. Indexing with a slice, a boolean mask, or an array of indices yields a new CVRTable.
+
+    Attributes
+    ----------
+    id: np.array of objects
+        CVR identifiers
+    card_in_batch: np.array of int64
+        position of the card in its physical batch; -1 if not set
+    phantom: np.array of bool
+    pool: np.array of bool
+    sampled: np.array of bool
+    tally_pool: np.array of int32
+        codes into `tally_pools`; -1 if the CVR does not have a tally_pool
+    sample_num: np.array of objects, or of dtype S32
+        sample numbers; None if not set. (Sample numbers are typically 256-bit integers.)
+        A table read by `load` stores sample numbers that are all non-negative integers less than 2**256 as
+        fixed-width 32-byte big-endian strings, which sort in numerical order; use `sample_num_list` and
+        `set_sample_nums` to read and write them as ints regardless of storage.
+    p: np.array of float64
+        sampling probabilities; nan if not set
+    contests: InternTable
+        contest identifiers
+    candidates: InternTable
+        candidate identifiers (shared across contests)
+    tally_pools: InternTable
+        tally_pool labels
+    con_ptr: np.array of int64, length n+1
+    con_code: np.array of int32
+        contest code of each (card, contest) entry
+    vote_ptr: np.array of int64, length len(con_code)+1
+    vote_cand: np.array of int32
+        candidate code of each vote
+    vote_val: np.array
+        the value of each vote; int64 if every value is an int, bool if every value is a bool, else object
+    """
+
+    COLUMNS = (
+        "id",
+        "card_in_batch",
+        "phantom",
+        "pool",
+        "sampled",
+        "tally_pool",
+        "sample_num",
+        "p",
+    )
+
+    def __init__(
+        self,
+        id: np.ndarray = None,
+        card_in_batch: np.ndarray = None,
+        phantom: np.ndarray = None,
+        pool: np.ndarray = None,
+        sampled: np.ndarray = None,
+        tally_pool: np.ndarray = None,
+        sample_num: np.ndarray = None,
+        p: np.ndarray = None,
+        contests: InternTable = None,
+        candidates: InternTable = None,
+        tally_pools: InternTable = None,
+        con_ptr: np.ndarray = None,
+        con_code: np.ndarray = None,
+        vote_ptr: np.ndarray = None,
+        vote_cand: np.ndarray = None,
+        vote_val: np.ndarray = None,
+    ):
+        n = 0 if id is None else len(id)
+        self.id = np.empty(0, dtype=object) if id is None else id
+        self.card_in_batch = (
+            np.full(n, -1, dtype=np.int64) if card_in_batch is None else card_in_batch
+        )
+        self.phantom = np.zeros(n, dtype=bool) if phantom is None else phantom
+        self.pool = np.zeros(n, dtype=bool) if pool is None else pool
+        self.sampled = np.zeros(n, dtype=bool) if sampled is None else sampled
+        self.tally_pool = (
+            np.full(n, -1, dtype=np.int32) if tally_pool is None else tally_pool
+        )
+        self.sample_num = (
+            np.full(n, None, dtype=object) if sample_num is None else sample_num
+        )
+        self.p = np.full(n, np.nan) if p is None else p
+        self.contests = InternTable() if contests is None else contests
+        self.candidates = InternTable() if candidates is None else candidates
+        self.tally_pools = InternTable() if tally_pools is None else tally_pools
+        self.con_ptr = np.zeros(n + 1, dtype=np.int64) if con_ptr is None else con_ptr
+        self.con_code = np.empty(0, dtype=np.int32) if con_code is None else con_code
+        self.vote_ptr = (
+            np.zeros(len(self.con_code) + 1, dtype=np.int64) if vote_ptr is None else vote_ptr
+        )
+        self.vote_cand = np.empty(0, dtype=np.int32) if vote_cand is None else vote_cand
+        self.vote_val = np.empty(0, dtype=np.int64) if vote_val is None else vote_val
+        self._id_index = None
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.row(key)
+        return self.take(np.arange(len(self))[key])
+
+    def __str__(self) -> str:
+        return (
+            f"CVRTable: {len(self)} CVRs, {len(self.contests)} contests, "
+            + f"{len(self.candidates)} candidates, {len(self.tally_pools)} tally_pools"
+        )
+
+    def invalidate(self):
+        """
+        discard derived arrays and indexes; call after changing the vote arrays or the ids in place
+        """
+        self._id_index = None
+        self._entry_row = None
+        self._vote_entry = None
+        self._vote_mark = None
+        self._contest_index = None
+        self._rank_matrices = {}
+        self._first_preferences = {}
+
+    @property
+    def contest_index(self) -> "ContestIndex":
+        """
+        the ContestIndex of the table, built on first use
+        """
+        if self._contest_index is None:
+            self._contest_index = ContestIndex.from_cvrs(self)
+        return self._contest_index
+
+    @property
+    def id_index(self) -> dict:
+        """
+        dict mapping each CVR id to its row (the first row, if the id is repeated), built on first use
+        """
+        if self._id_index is None:
+            index = {}
+            for row, i in enumerate(self.id.tolist()):
+                index.setdefault(i, row)
+            self._id_index = index
+        return self._id_index
+
+    @property
+    def entry_row(self) -> np.ndarray:
+        """
+        the row (card) of each (card, contest) entry
+        """
+        if self._entry_row is None:
+            self._entry_row = np.repeat(
+                np.arange(len(self), dtype=np.int64), np.diff(self.con_ptr)
+            )
+        return self._entry_row
+
+    @property
+    def vote_entry(self) -> np.ndarray:
+        """
+        the (card, contest) entry of each vote
+        """
+        if self._vote_entry is None:
+            self._vote_entry = np.repeat(
+                np.arange(len(self.con_code), dtype=np.int64), np.diff(self.vote_ptr)
+            )
+        return self._vote_entry
+
+    @property
+    def vote_mark(self) -> np.ndarray:
+        """
+        bool(value) for each vote, i.e., CVR.as_vote() applied to every vote
+        """
+        if self._vote_mark is None:
+            if self.vote_val.dtype == object:
+                self._vote_mark = np.fromiter(
+                    (bool(v) for v in self.vote_val), dtype=bool, count=len(self.vote_val)
+                )
+            else:
+                self._vote_mark = self.vote_val.astype(bool)
+        return self._vote_mark
+
+    @classmethod
+    def from_cvrs(cls, cvr_list: "Collection[CVR]" = None) -> "CVRTable":
+        """
+        Construct a CVRTable from a collection of CVR objects
+
+        Parameters
+        ----------
+        cvr_list: Collection of CVRs
+
+        Returns
+        -------
+        CVRTable containing the same CVRs, in the same order
+        """
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list
+        contests = InternTable()
+        candidates = InternTable()
+        tally_pools = InternTable()
+        ids, card_in_batch, phantom, pool, sampled, tally_pool, sample_num, p = (
+            [], [], [], [], [], [], [], []
+        )
+        con_ptr = [0]
+        con_code = []
+        vote_ptr = [0]
+        vote_cand = []
+        vote_val = []
+        for c in cvr_list:
+            ids.append(c.id)
+            card_in_batch.append(-1 if c.card_in_batch is None else c.card_in_batch)
+            phantom.append(bool(c.phantom))
+            pool.append(bool(c.pool))
+            sampled.append(bool(c.sampled))
+            tally_pool.append(-1 if c.tally_pool is None else tally_pools.code(c.tally_pool))
+            sample_num.append(c.sample_num)
+            p.append(np.nan if c.p is None else c.p)
+            for con, votes in c.votes.items():
+                con_code.append(contests.code(con))
+                for cand, val in votes.items():
+                    vote_cand.append(candidates.code(cand))
+                    vote_val.append(val)
+                vote_ptr.append(len(vote_cand))
+            con_ptr.append(len(con_code))
+        id_arr = np.empty(len(ids), dtype=object)
+        id_arr[:] = ids
+        sample_num_arr = np.empty(len(sample_num), dtype=object)
+        sample_num_arr[:] = sample_num
+        return cls(
+            id=id_arr,
+            card_in_batch=np.array(card_in_batch, dtype=np.int64),
+            phantom=np.array(phantom, dtype=bool),
+            pool=np.array(pool, dtype=bool),
+            sampled=np.array(sampled, dtype=bool),
+            tally_pool=np.array(tally_pool, dtype=np.int32),
+            sample_num=sample_num_arr,
+            p=np.array(p, dtype=float),
+            contests=contests,
+            candidates=candidates,
+            tally_pools=tally_pools,
+            con_ptr=np.array(con_ptr, dtype=np.int64),
+            con_code=np.array(con_code, dtype=np.int32),
+            vote_ptr=np.array(vote_ptr, dtype=np.int64),
+            vote_cand=np.array(vote_cand, dtype=np.int32),
+            vote_val=cls.value_array(vote_val),
+        )
+
+    @classmethod
+    def from_raire_file(cls, cvr_file: str = None) -> tuple:
+        """
+        Read RAIRE-format CVRs from a file into a CVRTable in a single pass; see CVR.from_raire_file
+
+        Rows are merged by ballot id as they are read, with the same semantics as CVR.merge_cvrs: ids are kept
+        in order of first appearance, and a later row for the same ballot and contest replaces the earlier one.
+        While reading, rankings are held as arrays of small integer candidate codes, not as dicts or CVRs.
+
+        Parameters
+        ----------
+        cvr_file: str
+            filename
+
+        Returns
+        -------
+        cvrs: CVRTable
+        cvrs_read: int
+            number of CVRs read
+        unique_ids: int
+            number of distinct CVR identifiers read
+        """
+        contests = InternTable()
+        candidates = InternTable()
+        rows = {}  # ballot id -> row of the table
+        entry_row, entry_con = array("q"), array("i")
+        entry_start, entry_len = array("q"), array("i")
+        vote_cand, vote_rank = array("i"), array("i")
+        with Compressed.open(cvr_file) as f:
+            reader = csv.reader(f, delimiter=",", quotechar='"')
+            skip = int(next(reader)[0])
+            n_rows = 1
+            for _ in range(skip):
+                next(reader)
+                n_rows += 1
+            for c in reader:
+                n_rows += 1
+                row = rows.get(c[1])
+                if row is None:
+                    row = rows[c[1]] = len(rows)
+                entry_row.append(row)
+                entry_con.append(contests.code(c[0]))
+                entry_start.append(len(vote_cand))
+                ranked = [candidates.code(str(cand)) for cand in c[2:]]
+                if len(set(ranked)) == len(ranked):
+                    vote_cand.extend(ranked)
+                    vote_rank.extend(range(1, len(ranked) + 1))
+                else:
+                    # a candidate listed more than once keeps its first position and its last rank
+                    ranks = {}
+                    for j, cand in enumerate(ranked):
+                        ranks[cand] = j + 1
+                    vote_cand.extend(ranks.keys())
+                    vote_rank.extend(ranks.values())
+                entry_len.append(len(vote_cand) - entry_start[-1])
+        entry_row = np.frombuffer(entry_row, dtype=np.int64)
+        entry_con = np.frombuffer(entry_con, dtype=np.int32)
+        # for each (ballot, contest): the position of its first row and the votes of its last row
+        key = entry_row * max(len(contests), 1) + entry_con
+        order = np.argsort(key, kind="stable")
+        first = np.flatnonzero(np.r_[True, key[order][1:] != key[order][:-1]])
+        last = np.r_[first[1:], len(order)] - 1
+        keep = order[last]
+        keep = keep[np.lexsort((order[first], entry_row[keep]))]
+        con_ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_row[keep], minlength=len(rows)), out=con_ptr[1:])
+        starts = np.frombuffer(entry_start, dtype=np.int64)[keep]
+        lengths = np.frombuffer(entry_len, dtype=np.int32)[keep].astype(np.int64)
+        vote_ptr = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=vote_ptr[1:])
+        votes = np.repeat(starts - vote_ptr[:-1], lengths) + np.arange(vote_ptr[-1], dtype=np.int64)
+        table = cls(
+            id=cls._object_array(list(rows)),
+            contests=contests,
+            candidates=candidates,
+            con_ptr=con_ptr,
+            con_code=entry_con[keep],
+            vote_ptr=vote_ptr,
+            vote_cand=np.frombuffer(vote_cand, dtype=np.int32)[votes],
+            vote_val=np.frombuffer(vote_rank, dtype=np.int32)[votes].astype(np.int64),
+        )
+        return table, n_rows - skip, len(rows)
+
+    @classmethod
+    def value_array(cls, values: list) -> np.ndarray:
+        """
+        store vote values compactly without changing their Python types: int64 if every value is an int,
+        bool if every value is a bool, and object otherwise
+        """
+        types = set(type(v) for v in values)
+        if types <= {int}:
+            try:
+                return np.array(values, dtype=np.int64)
+            except OverflowError:
+                pass
+        elif types == {bool}:
+            return np.array(values, dtype=bool)
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+
+    def to_arrays(self) -> dict:
+        """
+        Represent the table as a dict of NumPy arrays with fixed-width dtypes, suitable for `np.savez` or
+        `np.save` without pickling.
+
+        Sample numbers that are all non-negative integers less than 2**256 are stored with dtype S32
+        (see `encode_sample_nums`). Other object columns (`id`, `sample_num`, and `vote_val` if it has
+        dtype object) are encoded as Unicode arrays: as the strings themselves if every element is a str, as decimal strings if every element
+        is an int (e.g., 256-bit sample numbers), and as JSON otherwise. The intern tables and the
+        encodings are recorded as JSON in the 0-d array "meta".
+
+        Returns
+        -------
+        dict of np.arrays; `from_arrays` inverts the representation
+        """
+        arrays = {}
+        encodings = {}
+        for col in self.COLUMNS + ("con_ptr", "con_code", "vote_ptr", "vote_cand", "vote_val"):
+            arr = getattr(self, col)
+            if col == "sample_num" and arr.dtype == object and self._fits_sample_num_bytes(arr):
+                arr = self.encode_sample_nums(arr)
+            if arr.dtype == object:
+                arr, encodings[col] = self._encode_objects(arr)
+            arrays[col] = arr
+        arrays["meta"] = np.array(
+            json.dumps(
+                {
+                    "contests": self.contests.labels,
+                    "candidates": self.candidates.labels,
+                    "tally_pools": self.tally_pools.labels,
+                    "encodings": encodings,
+                }
+            )
+        )
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, keep_fixed_width: bool = False) -> "CVRTable":
+        """
+        Construct a CVRTable from the representation produced by `to_arrays`
+
+        Parameters
+        ----------
+        arrays: dict-like
+            maps names to np.arrays, e.g., the result of `np.load` on an .npz file
+        keep_fixed_width: bool [optional], default False
+            if True, a column of strings (e.g., `id`) is kept as a fixed-width Unicode array rather than
+            converted to an array of Python objects. Elements are then np.str_, a subclass of str.
+
+        Returns
+        -------
+        CVRTable
+        """
+        meta = json.loads(str(arrays["meta"][()]))
+        cols = {}
+        for col in cls.COLUMNS + ("con_ptr", "con_code", "vote_ptr", "vote_cand", "vote_val"):
+            arr = arrays[col]
+            encoding = meta["encodings"].get(col)
+            if encoding is not None and not (keep_fixed_width and encoding == "str"):
+                arr = cls._decode_objects(arr, encoding)
+            cols[col] = arr
+        return cls(
+            **cols,
+            contests=InternTable(meta["contests"]),
+            candidates=InternTable(meta["candidates"]),
+            tally_pools=InternTable(meta["tally_pools"]),
+        )
+
+    @classmethod
+    def _encode_objects(cls, arr: np.ndarray) -> tuple:
+        """
+        encode an object array as a Unicode array; return the array and the name of the encoding
+        """
+        types = set(type(v) for v in arr)
+        if types <= {str}:
+            return arr.astype(str), "str"
+        if types == {int}:
+            return np.array([str(v) for v in arr]), "int"
+        return np.array([json.dumps(v) for v in arr]), "json"
+
+    @classmethod
+    def _decode_objects(cls, arr: np.ndarray, encoding: str) -> np.ndarray:
+        """
+        invert _encode_objects
+        """
+        decode = {"str": str, "int": int, "json": json.loads}[encoding]
+        out = np.empty(len(arr), dtype=object)
+        out[:] = [decode(v) for v in arr.tolist()]
+        return out
+
+    def save(self, directory: str):
+        """
+        Write the table to a directory of .npy files, one per array of `to_arrays`, for use with `load`
+
+        Parameters
+        ----------
+        directory: str
+            created if it does not exist; existing files with the same names are overwritten
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, arr in self.to_arrays().items():
+            np.save(os.path.join(directory, name + ".npy"), arr)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "c") -> "CVRTable":
+        """
+        Read a table written by `save`, memory-mapping the arrays
+
+        The card-level flags, fixed-width ids and sample numbers, and the CSR vote arrays are memory-mapped,
+        so they are paged in from disk by the operating system as they are used rather than read into the
+        Python heap. Only object columns (e.g., ids that are not all strings, or vote values of mixed types)
+        are decoded into memory. Indexing with an int (e.g., to build `cvr_sample`) touches only the pages
+        holding that card.
+
+        Parameters
+        ----------
+        directory: str
+            directory written by `save`
+        mmap_mode: str [optional], default "c"
+            passed to np.load. The default, copy-on-write, lets methods such as `CVR.assign_sample_nums`
+            and `CVR.consistent_sampling` update columns in memory without changing the files.
+            Use None to read the arrays into memory.
+
+        Returns
+        -------
+        CVRTable
+        """
+        arrays = {}
+        for f in os.listdir(directory):
+            if f.endswith(".npy"):
+                name = f[: -len(".npy")]
+                arrays[name] = np.load(
+                    os.path.join(directory, f), mmap_mode=None if name == "meta" else mmap_mode
+                )
+        return cls.from_arrays(arrays, keep_fixed_width=True)
+
+    SAMPLE_NUM_BYTES = 32
+
+    @classmethod
+    def _fits_sample_num_bytes(cls, values: np.ndarray) -> bool:
+        return len(values) > 0 and all(
+            type(v) is int and 0 <= v < 2 ** (8 * cls.SAMPLE_NUM_BYTES) for v in values
+        )
+
+    @classmethod
+    def encode_sample_nums(cls, values: Collection) -> np.ndarray:
+        """
+        encode non-negative ints less than 2**256 as big-endian byte strings of dtype S32, which sort in
+        numerical order
+        """
+        return np.array(
+            [int(v).to_bytes(cls.SAMPLE_NUM_BYTES, "big") for v in values],
+            dtype=f"S{cls.SAMPLE_NUM_BYTES}",
+        )
+
+    def sample_num_list(self, idx: np.ndarray = None) -> list:
+        """
+        sample numbers of the cards `idx` (default all cards) as Python objects, whatever the storage
+        """
+        arr = self.sample_num if idx is None else self.sample_num[idx]
+        if arr.dtype == object:
+            return arr.tolist()
+        # NumPy drops trailing zero bytes from S arrays
+        return [int.from_bytes(v.ljust(self.SAMPLE_NUM_BYTES, b"\0"), "big") for v in arr.tolist()]
+
+    def set_sample_nums(self, values: Collection):
+        """
+        set the sample number of every card, keeping fixed-width storage if the values allow it
+        """
+        if self.sample_num.dtype != object and self._fits_sample_num_bytes(values):
+            self.sample_num[:] = self.encode_sample_nums(values)
+        else:
+            self.sample_num = self._object_array(list(values))
+
+    @classmethod
+    def _object_array(cls, values: list) -> np.ndarray:
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+
+    def to_cvrs(self) -> list:
+        """
+        Convert to a list of CVR objects
+
+        Returns
+        -------
+        list of CVR objects, in the order of the table
+        """
+        from .Audit import CVR
+
+        ids = self.id.tolist()
+        card_in_batch = self.card_in_batch.tolist()
+        phantom = self.phantom.tolist()
+        pool = self.pool.tolist()
+        sampled = self.sampled.tolist()
+        tally_pool = self.tally_pool.tolist()
+        sample_num = self.sample_num_list()
+        p = self.p.tolist()
+        con_ptr = self.con_ptr.tolist()
+        con_labels = [self.contests[c] for c in self.con_code.tolist()]
+        vote_ptr = self.vote_ptr.tolist()
+        cand_labels = [self.candidates[c] for c in self.vote_cand.tolist()]
+        vote_val = self.vote_val.tolist()
+        cvr_list = []
+        for i in range(len(ids)):
+            votes = {}
+            for e in range(con_ptr[i], con_ptr[i + 1]):
+                votes[con_labels[e]] = dict(
+                    zip(
+                        cand_labels[vote_ptr[e] : vote_ptr[e + 1]],
+                        vote_val[vote_ptr[e] : vote_ptr[e + 1]],
+                    )
+                )
+            cvr_list.append(
+                CVR(
+                    id=ids[i],
+                    card_in_batch=None if card_in_batch[i] < 0 else card_in_batch[i],
+                    votes=votes,
+                    phantom=phantom[i],
+                    tally_pool=None if tally_pool[i] < 0 else self.tally_pools[tally_pool[i]],
+                    pool=pool[i],
+                    sample_num=sample_num[i],
+                    p=None if np.isnan(p[i]) else p[i],
+                    sampled=sampled[i],
+                )
+            )
+        return cvr_list
+
+    def votes_of(self, i: int) -> dict:
+        """
+        the votes dict of card i
+        """
+        votes = {}
+        for e in range(self.con_ptr[i], self.con_ptr[i + 1]):
+            lo, hi = self.vote_ptr[e], self.vote_ptr[e + 1]
+            votes[self.contests[self.con_code[e]]] = dict(
+                zip(
+                    [self.candidates[c] for c in self.vote_cand[lo:hi].tolist()],
+                    self.vote_val[lo:hi].tolist(),
+                )
+            )
+        return votes
+
+    def row(self, i: int) -> "CVR":
+        """
+        construct a CVR object for card i
+        """
+        from .Audit import CVR
+
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"index {i} out of range for CVRTable of length {len(self)}")
+        tp = int(self.tally_pool[i])
+        return CVR(
+            id=self.id[i].item() if isinstance(self.id[i], np.generic) else self.id[i],
+            card_in_batch=None if self.card_in_batch[i] < 0 else int(self.card_in_batch[i]),
+            votes=self.votes_of(i),
+            phantom=bool(self.phantom[i]),
+            tally_pool=None if tp < 0 else self.tally_pools[tp],
+            pool=bool(self.pool[i]),
+            sample_num=self.sample_num_list([i])[0],
+            p=None if np.isnan(self.p[i]) else float(self.p[i]),
+            sampled=bool(self.sampled[i]),
+        )
+
+    def take(self, idx: np.ndarray) -> "CVRTable":
+        """
+        Select cards by index
+
+        Parameters
+        ----------
+        idx: np.array of ints
+            indices of the cards to keep, in the order to keep them
+
+        Returns
+        -------
+        CVRTable containing the selected cards. The intern tables are shared with this table.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        entries, con_ptr = self._gather(self.con_ptr, idx)
+        votes, vote_ptr = self._gather(self.vote_ptr, entries)
+        return CVRTable(
+            **{col: getattr(self, col)[idx] for col in self.COLUMNS},
+            contests=self.contests,
+            candidates=self.candidates,
+            tally_pools=self.tally_pools,
+            con_ptr=con_ptr,
+            con_code=self.con_code[entries],
+            vote_ptr=vote_ptr,
+            vote_cand=self.vote_cand[votes],
+            vote_val=self.vote_val[votes],
+        )
+
+    @classmethod
+    def _gather(cls, ptr: np.ndarray, idx: np.ndarray) -> tuple:
+        """
+        indices of the CSR elements belonging to the groups `idx`, and the CSR pointer for the selection
+        """
+        lengths = ptr[idx + 1] - ptr[idx]
+        new_ptr = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_ptr[1:])
+        elements = np.repeat(ptr[idx] - new_ptr[:-1], lengths) + np.arange(
+            new_ptr[-1], dtype=np.int64
+        )
+        return elements, new_ptr
+
+    def permute(self, order: np.ndarray):
+        """
+        Reorder the cards in place
+
+        Parameters
+        ----------
+        order: np.array of ints
+            a permutation of range(len(self))
+        """
+        self.__dict__.update(self.take(order).__dict__)
+
+    @classmethod
+    def concatenate(cls, tables: Collection["CVRTable"]) -> "CVRTable":
+        """
+        Concatenate CVRTables, re-coding contests, candidates, and tally pools as needed
+
+        Parameters
+        ----------
+        tables: Collection of CVRTables
+
+        Returns
+        -------
+        CVRTable containing the cards of all the tables, in order
+        """
+        tables = [t if isinstance(t, CVRTable) else cls.from_cvrs(t) for t in tables]
+        if len(tables) == 1:
+            return tables[0]
+        contests = InternTable()
+        candidates = InternTable()
+        tally_pools = InternTable()
+        cols = defaultdict(list)
+        con_ptr, vote_ptr, con_code, vote_cand, vote_val = [], [], [], [], []
+        n_entries = 0
+        n_votes = 0
+        for t in tables:
+            for col in cls.COLUMNS:
+                cols[col].append(getattr(t, col))
+            con_map = np.array([contests.code(c) for c in t.contests], dtype=np.int32)
+            cand_map = np.array([candidates.code(c) for c in t.candidates], dtype=np.int32)
+            pool_map = np.array(
+                [tally_pools.code(c) for c in t.tally_pools] + [-1], dtype=np.int32
+            )  # code -1 maps to -1
+            cols["tally_pool"][-1] = pool_map[t.tally_pool]
+            con_ptr.append(t.con_ptr[:-1] + n_entries)
+            vote_ptr.append(t.vote_ptr[:-1] + n_votes)
+            con_code.append(con_map[t.con_code] if len(t.con_code) else t.con_code)
+            vote_cand.append(cand_map[t.vote_cand] if len(t.vote_cand) else t.vote_cand)
+            vote_val.append(t.vote_val)
+            n_entries += len(t.con_code)
+            n_votes += len(t.vote_cand)
+        if len(set(a.dtype for a in cols["sample_num"])) > 1:
+            # mixed fixed-width and object storage
+            cols["sample_num"] = [cls._object_array(t.sample_num_list()) for t in tables]
+        con_ptr.append(np.array([n_entries], dtype=np.int64))
+        vote_ptr.append(np.array([n_votes], dtype=np.int64))
+        vote_dtypes = set(v.dtype for v in vote_val if len(v))
+        vote_val = (
+            np.concatenate(vote_val).astype(vote_dtypes.pop())
+            if len(vote_dtypes) == 1
+            else np.concatenate([v.astype(object) for v in vote_val])
+        )
+        return cls(
+            **{col: np.concatenate(v) for col, v in cols.items()},
+            contests=contests,
+            candidates=candidates,
+            tally_pools=tally_pools,
+            con_ptr=np.concatenate(con_ptr),
+            con_code=np.concatenate(con_code).astype(np.int32),
+            vote_ptr=np.concatenate(vote_ptr),
+            vote_cand=np.concatenate(vote_cand).astype(np.int32),
+            vote_val=vote_val,
+        )
+
+    @classmethod
+    def empty_cvrs(
+        cls,
+        ids: Collection,
+        contest_rows: dict = None,
+        phantom: bool = False,
+        tally_pool=None,
+        pool: bool = False,
+    ) -> "CVRTable":
+        """
+        Construct a CVRTable of CVRs that contain no votes, e.g., phantom CVRs
+
+        Parameters
+        ----------
+        ids: Collection
+            identifiers of the CVRs
+        contest_rows: dict
+            keys are contest identifiers; values are the indices of the CVRs that contain the contest
+            (with no votes). On each CVR, contests are listed in the order of the keys.
+        phantom: bool
+            value of `phantom` for every CVR
+        tally_pool: object
+            value of `tally_pool` for every CVR
+        pool: bool
+            value of `pool` for every CVR
+
+        Returns
+        -------
+        CVRTable
+        """
+        n = len(ids)
+        id_arr = np.empty(n, dtype=object)
+        id_arr[:] = list(ids)
+        contests = InternTable()
+        rows, codes = [], []
+        for con, r in (contest_rows or {}).items():
+            r = np.asarray(r, dtype=np.int64)
+            rows.append(r)
+            codes.append(np.full(len(r), contests.code(con), dtype=np.int32))
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.int32)
+        order = np.argsort(rows, kind="stable")
+        con_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=con_ptr[1:])
+        tally_pools = InternTable()
+        return cls(
+            id=id_arr,
+            phantom=np.full(n, phantom, dtype=bool),
+            pool=np.full(n, pool, dtype=bool),
+            tally_pool=np.full(
+                n, -1 if tally_pool is None else tally_pools.code(tally_pool), dtype=np.int32
+            ),
+            contests=contests,
+            tally_pools=tally_pools,
+            con_ptr=con_ptr,
+            con_code=codes[order],
+        )
+
+    def has_contest(self, contest_id: str) -> np.ndarray:
+        """
+        vectorized CVR.has_contest
+
+        Parameters
+        ----------
+        contest_id: str
+            identifier of the contest
+
+        Returns
+        -------
+        np.array of bool: which cards contain the contest
+        """
+        return self.contest_index.mask(contest_id)
+
+    def get_vote_for(self, contest_id: str, candidate: str) -> np.ndarray:
+        """
+        vectorized CVR.get_vote_for
+
+        Parameters
+        ----------
+        contest_id: str
+            identifier of the contest
+        candidate: str
+            identifier of the candidate
+
+        Returns
+        -------
+        np.array of objects: the value of the vote for `candidate` in `contest_id` on each card,
+            or False if the card does not contain the contest or has no vote for the candidate
+        """
+        out = np.full(len(self), False, dtype=object)
+        con = self.contests.get(contest_id)
+        cand = self.candidates.get(candidate)
+        if con >= 0 and cand >= 0:
+            votes = np.flatnonzero(
+                (self.vote_cand == cand) & (self.con_code[self.vote_entry] == con)
+            )
+            out[self.entry_row[self.vote_entry[votes]]] = self.vote_val[votes]
+        return out
+
+    def vote_indicator(self, contest_id: str, candidate: str) -> np.ndarray:
+        """
+        vectorized CVR.as_vote(CVR.get_vote_for(contest_id, candidate))
+
+        Returns
+        -------
+        np.array of int: 1 if the card has a vote (a value that casts to True) for the candidate, else 0
+        """
+        out = np.zeros(len(self), dtype=np.int64)
+        con = self.contests.get(contest_id)
+        cand = self.candidates.get(candidate)
+        if con >= 0 and cand >= 0:
+            votes = np.flatnonzero(
+                (self.vote_cand == cand) & (self.con_code[self.vote_entry] == con)
+            )
+            out[self.entry_row[self.vote_entry[votes]]] = self.vote_mark[votes]
+        return out
+
+    def vote_matrix(self, contest_id: str, candidates: Collection) -> tuple:
+        """
+        the votes for several candidates in one contest, on every card, as dense matrices
+
+        Parameters
+        ----------
+        contest_id: str
+            identifier of the contest
+        candidates: collection of str
+            identifiers of the candidates, without repeats
+
+        Returns
+        -------
+        marks: np.array of bool, shape (len(self), len(candidates))
+            marks[i, j] is CVR.as_vote() of the vote for candidates[j] in the contest on card i
+        values: np.array of float, shape (len(self), len(candidates))
+            the value of that vote (e.g., a rank) where marks[i, j] is True; 0 elsewhere
+
+        Raises
+        ------
+        TypeError if the value of a marked vote is not a number
+        """
+        marks = np.zeros((len(self), len(candidates)), dtype=bool)
+        values = np.zeros((len(self), len(candidates)))
+        con = self.contests.get(contest_id)
+        codes = np.array([self.candidates.get(c) for c in candidates], dtype=np.int64)
+        if con < 0 or not (codes >= 0).any():
+            return marks, values
+        column = np.full(len(self.candidates), -1, dtype=np.int64)
+        column[codes[codes >= 0]] = np.flatnonzero(codes >= 0)
+        votes = np.flatnonzero(
+            (column[self.vote_cand] >= 0) & (self.con_code[self.vote_entry] == con) & self.vote_mark
+        )
+        rows = self.entry_row[self.vote_entry[votes]]
+        cols = column[self.vote_cand[votes]]
+        vals = self.vote_val[votes]
+        if vals.dtype == object and not all(isinstance(v, numbers.Number) for v in vals.tolist()):
+            raise TypeError(f"votes in contest {contest_id} are not all numbers")
+        marks[rows, cols] = True
+        values[rows, cols] = vals.astype(float)
+        return marks, values
+
+    def rank_matrix(self, contest_id: str) -> tuple:
+        """
+        the rankings in a ranked-choice contest, on every card, as a dense matrix; built on first use
+
+        Parameters
+        ----------
+        contest_id: str
+            identifier of the contest
+
+        Returns
+        -------
+        candidates: list of str
+            the candidates with at least one vote in the contest, in order of their codes
+        ranks: np.array of float, shape (len(self), len(candidates))
+            ranks[i, j] is the rank card i gives candidates[j]; inf if the card does not rank the candidate
+
+        Raises
+        ------
+        TypeError if a rank is not a number
+        """
+        if contest_id not in self._rank_matrices:
+            con = self.contests.get(contest_id)
+            in_contest = (self.con_code[self.vote_entry] == con) & self.vote_mark
+            candidates = [self.candidates[code] for code in np.unique(self.vote_cand[in_contest]).tolist()]
+            marks, ranks = self.vote_matrix(contest_id, candidates)
+            ranks[~marks] = np.inf
+            self._rank_matrices[contest_id] = (candidates, ranks)
+        return self._rank_matrices[contest_id]
+
+    def first_preference(self, contest_id: str, remaining: Collection) -> tuple:
+        """
+        vectorized CVR.rcv_votefor_cand for every candidate at once: the candidate each card counts for when
+        only the candidates in `remaining` are standing. Results are kept for each set of remaining
+        candidates, so assertions that share a remaining set reuse them.
+
+        Parameters
+        ----------
+        contest_id: str
+            identifier of the contest
+        remaining: Collection of str
+            identifiers of the candidates still standing
+
+        Returns
+        -------
+        candidates: list of str
+            the columns of `rank_matrix(contest_id)`
+        first: np.array of int
+            first[i] is the column of the candidate card i ranks ahead of every other remaining candidate;
+            -1 if the card ranks no remaining candidate, or ranks two or more of them equal first
+
+        Raises
+        ------
+        TypeError if a rank is not a number
+        """
+        key = (contest_id, frozenset(remaining))
+        candidates, ranks = self.rank_matrix(contest_id)
+        if key not in self._first_preferences:
+            cols = np.array([j for j, c in enumerate(candidates) if c in key[1]], dtype=np.int64)
+            first = np.full(len(self), -1, dtype=np.int64)
+            if len(cols) > 0:
+                standing = ranks[:, cols]
+                j = standing.argmin(axis=1)
+                top = standing[np.arange(len(self)), j]
+                unique = (standing == top[:, None]).sum(axis=1) == 1
+                first = np.where(np.isfinite(top) & unique, cols[j], -1)
+            self._first_preferences[key] = first
+        return candidates, self._first_preferences[key]
+
+    def update_votes(self, rows: np.ndarray, contest_ids: Collection) -> bool:
+        """
+        Add each contest in `contest_ids` (with no votes) to each card in `rows` that does not already contain it.
+        Contests already on a card are unchanged. New contests are listed after the card's existing contests,
+        as CVR.update_votes does.
+
+        Parameters
+        ----------
+        rows: np.array of ints
+            the cards to update
+        contest_ids: Collection
+            identifiers of the contests to add
+
+        Returns
+        -------
+        added: bool
+            True if any contest was added to any card
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        new_rows, new_codes = [], []
+        for con in contest_ids:
+            code = self.contests.code(con)
+            r = rows[~self.has_contest(con)[rows]]
+            new_rows.append(r)
+            new_codes.append(np.full(len(r), code, dtype=np.int32))
+        new_rows = np.concatenate(new_rows) if new_rows else np.empty(0, dtype=np.int64)
+        if len(new_rows) == 0:
+            return False
+        n_old = len(self.con_code)
+        entry_rows = np.concatenate([self.entry_row, new_rows])
+        order = np.argsort(entry_rows, kind="stable")
+        con_code = np.concatenate([self.con_code] + new_codes)[order]
+        n_votes = np.concatenate([np.diff(self.vote_ptr), np.zeros(len(new_rows), dtype=np.int64)])
+        vote_start = np.concatenate([self.vote_ptr[:-1], np.zeros(len(new_rows), dtype=np.int64)])
+        vote_ptr = np.zeros(n_old + len(new_rows) + 1, dtype=np.int64)
+        np.cumsum(n_votes[order], out=vote_ptr[1:])
+        votes = np.repeat(vote_start[order] - vote_ptr[:-1], n_votes[order]) + np.arange(
+            vote_ptr[-1], dtype=np.int64
+        )
+        self.con_ptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_rows, minlength=len(self)), out=self.con_ptr[1:])
+        self.con_code = con_code
+        self.vote_ptr = vote_ptr
+        self.vote_cand = self.vote_cand[votes]
+        self.vote_val = self.vote_val[votes]
+        self.invalidate()
+        return True
+
+    def tabulate_votes(self) -> dict:
+        """
+        vectorized CVR.tabulate_votes
+
+        Returns
+        -------
+        dict of dicts:
+            main key is contest
+            sub key is the candidate in the contest
+            value is the number of votes for that candidate in that contest
+        """
+        return self._tabulate_votes(self._vote_key())
+
+    def _vote_key(self) -> np.ndarray:
+        """
+        a single integer code for the (contest, candidate) pair of each vote: contest code * n_cand + candidate code
+        """
+        n_cand = max(len(self.candidates), 1)
+        return self.con_code[self.vote_entry].astype(np.int64) * n_cand + self.vote_cand
+
+    def _counts_by_key(self, key: np.ndarray, weights: np.ndarray) -> tuple:
+        """
+        the distinct values of `key` in order of first appearance, and the sum of `weights` for each value
+        """
+        keys, first = np.unique(key, return_index=True)
+        counts = np.bincount(key, weights=weights, minlength=keys.max() + 1 if len(keys) else 0)
+        return keys[np.argsort(first, kind="stable")], counts
+
+    def _tabulate_votes(self, key: np.ndarray) -> dict:
+        n_cand = max(len(self.candidates), 1)
+        keys, counts = self._counts_by_key(key, self.vote_mark)
+        d = defaultdict(lambda: defaultdict(int))
+        for k in keys.tolist():
+            d[self.contests[k // n_cand]][self.candidates[k % n_cand]] = int(counts[k])
+        return d
+
+    def tabulate_cards_contests(self) -> dict:
+        """
+        vectorized CVR.tabulate_cards_contests
+
+        Returns
+        -------
+        dict:
+            main key is contest
+            value is the number of cards containing that contest
+        """
+        codes, first = np.unique(self.con_code, return_index=True)
+        counts = np.bincount(self.con_code, minlength=len(self.contests))
+        d = defaultdict(int)
+        for c in codes[np.argsort(first, kind="stable")].tolist():
+            d[self.contests[c]] = int(counts[c])
+        return d
+
+    def tabulate_styles(self) -> dict:
+        """
+        vectorized CVR.tabulate_styles
+
+        Returns
+        -------
+        a dict of styles (frozensets of contest identifiers) and the counts of those styles
+        """
+        membership = np.zeros((len(self), len(self.contests)), dtype=bool)
+        membership[self.entry_row, self.con_code] = True
+        packed = np.packbits(membership, axis=1)
+        styles, first, counts = np.unique(
+            packed, axis=0, return_index=True, return_counts=True
+        )
+        style_counts = defaultdict(int)
+        for s in np.argsort(first, kind="stable"):
+            codes = np.flatnonzero(membership[first[s]])
+            style_counts[frozenset(self.contests[c] for c in codes)] = int(counts[s])
+        return style_counts
+
+    def tally(self, con_dict: dict = None, enforce_rules: bool = True):
+        """
+        vectorized Contest.tally for the contests in con_dict whose social choice function can be tallied
+
+        Parameters
+        ----------
+        con_dict: dict
+            dict of Contest objects to find tallies for. Each contest should have `tally` set to an empty
+            defaultdict(int).
+        enforce_rules: bool
+            If the contest is a vote-for-k plurality and the CVR has more than k votes, then if `enforce_rules`,
+            no candidate's total is incremented, but if `not enforce_rules`, the tally for every candidate
+            with a vote is incremented.
+
+        Side Effects
+        ------------
+        increments the `tally` dict of each contest in con_dict
+        """
+        self._tally(con_dict, enforce_rules, self._vote_key())
+
+    def _tally(self, con_dict: dict, enforce_rules: bool, key: np.ndarray):
+        """
+        tally every contest in con_dict at once: a vote counts if its candidate is not empty and, if
+        `enforce_rules`, its (card, contest) entry has no more marked votes than the contest has winners
+        """
+        n_cand = max(len(self.candidates), 1)
+        by_code = {}
+        limit = np.full(len(self.contests), -1, dtype=np.int64)  # -1: not tallied
+        for c in con_dict.values():
+            code = self.contests.get(c.id)
+            if code >= 0:
+                by_code[code] = c
+                limit[code] = c.n_winners if enforce_rules else len(self.candidates)
+        cand_ok = np.array([bool(c) for c in self.candidates], dtype=bool)
+        votes_ok = cand_ok[self.vote_cand] if len(self.vote_cand) else np.zeros(0, dtype=bool)
+        marks = self.vote_mark & votes_ok
+        n_votes = np.bincount(self.vote_entry, weights=marks, minlength=len(self.con_code))
+        keep = np.flatnonzero(votes_ok & (n_votes[self.vote_entry] <= limit[self.con_code[self.vote_entry]]))
+        keys, counts = self._counts_by_key(key[keep], marks[keep])
+        for k in keys.tolist():
+            by_code[k // n_cand].tally[self.candidates[k % n_cand]] += int(counts[k])
+
+    def tabulate(self, con_dict: dict = None, enforce_rules: bool = True) -> tuple:
+        """
+        CVR.tabulate_votes, CVR.tabulate_styles, CVR.tabulate_cards_contests, and Contest.tally together.
+        The per-vote and per-entry arrays they all use are computed once.
+
+        Parameters
+        ----------
+        con_dict: dict [optional]
+            dict of Contest objects to tally, as for `tally`
+        enforce_rules: bool
+            as for `tally`
+
+        Returns
+        -------
+        votes: dict of dicts, as returned by tabulate_votes
+        styles: dict, as returned by tabulate_styles
+        cards_contests: dict, as returned by tabulate_cards_contests
+
+        Side Effects
+        ------------
+        increments the `tally` dict of each contest in con_dict
+        """
+        key = self._vote_key()
+        votes = self._tabulate_votes(key)
+        if con_dict:
+            self._tally(con_dict, enforce_rules, key)
+        return votes, self.tabulate_styles(), self.tabulate_cards_contests()
+
+
+##########################################################################################
+class ContestIndex:
+    """
+    Inverted index from contest id to the positions of the CVRs that contain the contest.
+
+    Built in one pass over the CVRs (a list of CVR objects or a CVRTable), it replaces the
+    contests x CVRs calls to `has_contest` made by make_phantoms, consistent_sampling, find_sample_size,
+    check_cards, and tabulate_cards_contests. The positions for each contest are stored contiguously
+    in a single sorted array (CSR form), so looking up a contest is a slice.
+
+    The index refers to positions in the collection it was built from, and is only used for that collection
+    (see `is_current`). It becomes stale if contests are added to or removed from any card, or if the
+    collection is reordered, extended, or truncated. An index of a CVRTable is current until the table's
+    votes change (see `CVRTable.invalidate()`). An index of a collection with a `version` counter, such as
+    PhantomCVRs, is current until the counter changes. Code that changes the contests on the CVRs of a list,
+    or rearranges the list in place, should call `invalidate()` on any index of the list it keeps.
+
+    Attributes
+    ----------
+    contests: InternTable
+        the contest ids, coded in order of first appearance
+    ptr: np.array of int
+        the positions of the CVRs containing contest code k are rows[ptr[k]:ptr[k+1]]
+    rows: np.array of int
+        positions of CVRs, grouped by contest and ascending within contest
+    n: int
+        number of CVRs indexed
+    """
+
+    def __init__(self, contests: InternTable, rows: np.ndarray, codes: np.ndarray, n: int, source=None):
+        self.contests = contests
+        order = np.argsort(codes, kind="stable")  # rows are ascending in entry order
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self.ptr = np.zeros(len(contests) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(contests)), out=self.ptr[1:])
+        self.n = n
+        self._source = source  # the collection indexed (for a CVRTable, its con_code)
+        self._version = getattr(source, "version", None)
+        self._stale = False
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __str__(self) -> str:
+        return f"ContestIndex: {self.n} CVRs, {len(self.contests)} contests, {len(self.rows)} entries"
+
+    def invalidate(self):
+        """
+        mark the index stale, e.g., after the contests on the CVRs it indexes have changed
+        """
+        self._stale = True
+
+    @classmethod
+    def from_cvrs(cls, cvr_list: Collection = None) -> "ContestIndex":
+        """
+        Build the index in one pass over the CVRs
+
+        Parameters
+        ----------
+        cvr_list: Collection of CVRs, or CVRTable
+
+        Returns
+        -------
+        ContestIndex
+        """
+        if isinstance(cvr_list, CVRTable):
+            return cls(
+                cvr_list.contests, cvr_list.entry_row, cvr_list.con_code, len(cvr_list), source=cvr_list.con_code
+            )
+        contests = InternTable()
+        rows, codes = array("q"), array("i")
+        for i, c in enumerate(cvr_list):
+            for con in c.votes:
+                rows.append(i)
+                codes.append(contests.code(con))
+        return cls(
+            contests,
+            np.frombuffer(rows, dtype=np.int64),
+            np.frombuffer(codes, dtype=np.int32),
+            len(cvr_list),
+            source=cvr_list,
+        )
+
+    @classmethod
+    def of(cls, cvr_list: Collection = None, contest_index: "ContestIndex" = None) -> "ContestIndex":
+        """
+        Return `contest_index` if it is a current index of `cvr_list`; otherwise, an index built from `cvr_list`.
+        The index of a CVRTable is cached on the table until the table's votes change.
+        """
+        if contest_index is not None and contest_index.is_current(cvr_list):
+            return contest_index
+        if isinstance(cvr_list, CVRTable):
+            return cvr_list.contest_index
+        return cls.from_cvrs(cvr_list)
+
+    def is_current(self, cvr_list: Collection = None) -> bool:
+        """
+        Is this an index of `cvr_list` in its present state? True if the index was built from `cvr_list`, has
+        not been invalidated, and `cvr_list` has the same length and (if it has one) version
+        """
+        if self._stale or self.n != len(cvr_list):
+            return False
+        if isinstance(cvr_list, CVRTable):
+            return self._source is cvr_list.con_code
+        return self._source is cvr_list and self._version == getattr(cvr_list, "version", None)
+
+    def positions(self, contest_id: str) -> np.ndarray:
+        """
+        ascending positions of the CVRs that contain the contest
+        """
+        code = self.contests.get(contest_id)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.rows[self.ptr[code] : self.ptr[code + 1]]
+
+    def mask(self, contest_id: str) -> np.ndarray:
+        """
+        np.array of bool: which CVRs contain the contest (vectorized CVR.has_contest)
+        """
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.positions(contest_id)] = True
+        return mask
+
+    def count(self, contest_id: str, where: np.ndarray = None) -> int:
+        """
+        number of CVRs that contain the contest; if `where` (np.array of bool) is given, count only those CVRs
+        for which `where` is True
+        """
+        pos = self.positions(contest_id)
+        return len(pos) if where is None else int(np.sum(where[pos]))
+
+    def counts(self) -> dict:
+        """
+        the number of CVRs containing each contest, in order of first appearance (CVR.tabulate_cards_contests)
+        """
+        d = defaultdict(int)
+        for code, k in enumerate(np.diff(self.ptr).tolist()):
+            if k > 0:
+                d[self.contests[code]] = k
+        return d
@@ -0,0 +1,198 @@
+"""
+Reading gzip, bzip2, xz, and zstd-compressed inputs without decompressing them to disk
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+
+##########################################################################################
+class Compressed:
+    """
+    Open files that may be compressed, recognizing the compression from the first bytes of the file (not from
+    its name). Uncompressed files are opened as by `open`.
+
+    Compressed files are decompressed as they are read. By default, decompression runs in a background thread
+    that stays up to `depth` chunks ahead of the reader, so decompressing one chunk overlaps with parsing the
+    previous one (zlib, bz2, and lzma release the GIL while they decompress).
+
+    zstd requires Python 3.14 or the optional `zstandard` package.
+
+    Example
+    -------
+        with Compressed.open("CvrExport_0.json.gz") as f:
+            for session in Dominion.iter_sessions(f):
+                ...
+    """
+
+    MAGIC = {
+        b"\x1f\x8b": "gzip",
+        b"BZh": "bz2",
+        b"\xfd7zXZ\x00": "xz",
+        b"\x28\xb5\x2f\xfd": "zstd",
+    }
+    SUFFIXES = (".gz", ".bz2", ".xz", ".zst")
+    CHUNK_SIZE = 2**20
+
+    @classmethod
+    def compression(cls, path) -> str:
+        """
+        the compression of the file: "gzip", "bz2", "xz", "zstd", or None if it is not compressed
+        """
+        with open(path, "rb") as f:
+            head = f.read(6)
+        for magic, name in cls.MAGIC.items():
+            if head.startswith(magic):
+                return name
+        return None
+
+    @classmethod
+    def strip_suffix(cls, name: str) -> str:
+        """
+        the name without a compression suffix; e.g., "CvrExport_1.json.gz" -> "CvrExport_1.json"
+        """
+        for suffix in cls.SUFFIXES:
+            if name.endswith(suffix):
+                return name[: -len(suffix)]
+        return name
+
+    @classmethod
+    def has_suffix(cls, name: str, suffix: str) -> bool:
+        """
+        does the name end with suffix, optionally followed by a compression suffix?
+        """
+        return cls.strip_suffix(name).endswith(suffix)
+
+    @classmethod
+    def open(
+        cls,
+        path,
+        mode: str = "r",
+        encoding: str = None,
+        newline: str = None,
+        background: bool = True,
+        chunk_size: int = None,
+        depth: int = 4,
+    ):
+        """
+        Open a file for reading, decompressing it if it is compressed
+
+        Parameters
+        ----------
+        path: str or path
+        mode: str
+            "r" or "rt" for text, "rb" for bytes
+        encoding, newline: str [optional]
+            as for `open`, in text mode
+        background: bool [optional], default True
+            decompress in a background thread. The file returned does not support seek; use background=False
+            to seek (forward seeks are cheap; backward seeks decompress again from the start).
+        chunk_size: int [optional]
+            number of decompressed bytes the background thread reads at a time; default CHUNK_SIZE
+        depth: int [optional], default 4
+            number of decompressed chunks the background thread may hold ahead of the reader
+
+        Returns
+        -------
+        a file object, to be closed by the caller (e.g., with `with`)
+        """
+        if mode not in ("r", "rt", "rb"):
+            raise ValueError(f"mode {mode!r} is not supported: Compressed.open only reads")
+        compression = cls.compression(path)
+        if compression is None:
+            if mode == "rb":
+                return open(path, "rb")
+            return open(path, "r", encoding=encoding, newline=newline)
+        raw = cls._decompressor(path, compression)
+        if background:
+            raw = io.BufferedReader(_ThreadedReader(raw, chunk_size or cls.CHUNK_SIZE, depth))
+        if mode == "rb":
+            return raw
+        return io.TextIOWrapper(raw, encoding=encoding, newline=newline)
+
+    @classmethod
+    def _decompressor(cls, path, compression: str):
+        """
+        binary file object that decompresses the file
+        """
+        if compression == "gzip":
+            return gzip.open(path, "rb")
+        if compression == "bz2":
+            return bz2.open(path, "rb")
+        if compression == "xz":
+            return lzma.open(path, "rb")
+        try:
+            from compression import zstd
+
+            return zstd.open(path, "rb")
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"{path} is zstd-compressed: reading it requires the zstandard package") from None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+##########################################################################################
+class _ThreadedReader(io.RawIOBase):
+    """
+    raw binary stream whose data are read from another binary stream by a background thread
+    """
+
+    def __init__(self, raw, chunk_size: int, depth: int):
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._buf = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._produce, args=(raw, chunk_size), daemon=True)
+        self._thread.start()
+
+    def _produce(self, raw, chunk_size: int):
+        try:
+            with raw:
+                while not self._stop.is_set():
+                    chunk = raw.read(chunk_size)
+                    self._put(chunk)
+                    if not chunk:
+                        return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._buf = memoryview(item)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+        super().close()
@@ -2,6 +2,6 @@
 Core SHANGRLA functionality.
 """
 
-__all__ = ["Audit", "IRVVisualisationUtils", "NonnegMean"]
+__all__ = ["AssorterCache", "Audit", "CVRAccumulator", "CVRCache", "CVRStore", "CVRTable", "Compressed", "IRVVisualisationUtils", "NonnegMean"]
 
 from . import *
\ No newline at end of file
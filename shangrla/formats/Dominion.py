@@ -8,14 +8,24 @@ import csv
 import warnings
 import re
 import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from collections.abc import Collection
 from collections import defaultdict
 from shangrla.core.Audit import Audit, CVR
+from shangrla.core.Compressed import Compressed
+from shangrla.core.CVRAccumulator import CVRAccumulator
+from shangrla.core.CVRTable import CVRTable
 from shangrla.core.NonnegMean import NonnegMean
 
 
 class Dominion:
 
+    # Image mask is used if the RecordId has been obfuscated (see session_to_cvr)
+    IMAGE_MASK_PATTERN = re.compile(r"[0-9]{5}_[0-9]{5}_[0-9]*")
+
     @classmethod
     def prep_manifest(cls, manifest, max_cards, n_cvrs):
         """
@@ -89,6 +99,9 @@ class Dominion:
         enforce_rules: bool = True,
         include_groups: Collection = [],
         pool_groups: Collection = [],
+        accumulators: Collection = None,
+        contest_ids: Collection = None,
+        include_tabulators: Collection = [],
     ):
         """
         Read CVRs in Dominion format.
@@ -106,7 +119,7 @@ class Dominion:
         Parameters:
         -----------
         cvr_file: string
-            filename for cvrs
+            filename for cvrs; the file may be compressed (see Compressed.open)
         use_current: bool [optional], default True
             if set, ignores votes unless `IsCurrent == True`
         enforce_rules: bool [optional], default True
@@ -117,6 +130,13 @@ class Dominion:
             if nonempty, CVRs with `CountingGroupId` in any of the groups is labeled as pooled (for ONEAudit)
             for subsequent construction of ONEAudit CVRs based on aggregating within each `tally_pool` with
             that `CountingGroupId`.
+        accumulators: collection of CVRAccumulators [optional]
+            each CVR is added to each accumulator as it is read
+        contest_ids: collection [optional]
+            if not None, keep only these contests (Dominion contest "Id"s); other contests are dropped from
+            the CVRs
+        include_tabulators: enumerable
+            if nonempty, use to select only CVRs with specified "TabulatorId"
 
         Returns:
         --------
@@ -126,73 +146,345 @@ class Dominion:
                   `pool=(c["CountingGroupId"] in pool_groups)`
 
         """
-        # Image mask is used if the RecordId has been obfuscated (see below)
-        image_mask_pattern = re.compile(r"[0-9]{5}_[0-9]{5}_[0-9]*")
+        return list(
+            cls.iter_cvrs(
+                cvr_file,
+                use_current,
+                enforce_rules,
+                include_groups,
+                pool_groups,
+                accumulators=accumulators,
+                contest_ids=contest_ids,
+                include_tabulators=include_tabulators,
+            )
+        )
+
+    @classmethod
+    def iter_cvrs(
+        cls,
+        cvr_file: str,
+        use_current: bool = True,
+        enforce_rules: bool = True,
+        include_groups: Collection = [],
+        pool_groups: Collection = [],
+        chunk_size: int = 2**20,
+        accumulators: Collection = None,
+        contest_ids: Collection = None,
+        include_tabulators: Collection = [],
+    ):
+        """
+        Generator that reads CVRs in Dominion format one session at a time.
+
+        The file is parsed incrementally, `chunk_size` characters at a time, so memory use is bounded by the
+        size of the largest session rather than by the size of the file, and each CVR is available as soon as
+        its session has been read. The CVRs are the same as those returned by `read_cvrs`, in the same order.
+        A compressed file is decompressed in a background thread while the sessions are parsed.
+
+        Parameters:
+        -----------
+        cvr_file: string
+            filename for cvrs
+        use_current: bool [optional], default True
+            if set, ignores votes unless `IsCurrent == True`
+        enforce_rules: bool [optional], default True
+            if set, ignores votes unless `IsVote == True`
+        include_groups: enumerable
+            if nonempty, use to select only CVRs with specified "CountingGroupId" (see read_cvrs)
+        pool_groups: enumerable
+            if nonempty, CVRs with `CountingGroupId` in any of the groups is labeled as pooled (see read_cvrs)
+        chunk_size: int [optional], default 2**20
+            number of characters to read from the file at a time
+        accumulators: collection of CVRAccumulators [optional]
+            each CVR is added to each accumulator before it is yielded
+        contest_ids: collection [optional]
+            if not None, keep only these contests (see read_cvrs)
+        include_tabulators: enumerable
+            if nonempty, use to select only CVRs with specified "TabulatorId"
+
+        Yields:
+        -------
+        CVR objects, one per session selected by `include_groups` and `include_tabulators`
+        """
+        keep = None if contest_ids is None else {str(c) for c in contest_ids}
+        with Compressed.open(cvr_file) as f:
+            sessions = (
+                c
+                for c in cls.iter_sessions(f, chunk_size)
+                # Skip CVRs not in the desired include_group or tabulators (if set), before building votes
+                if (not include_groups or c["CountingGroupId"] in include_groups)
+                and (not include_tabulators or c["TabulatorId"] in include_tabulators)
+            )
+            yield from CVRAccumulator.feed(
+                (cls.session_to_cvr(c, use_current, enforce_rules, pool_groups, keep) for c in sessions),
+                accumulators,
+            )
+
+    @classmethod
+    def iter_sessions(cls, f, chunk_size: int = 2**20, offsets: bool = False):
+        """
+        Generator that yields the elements of the "Sessions" array of a Dominion CvrExport JSON document,
+        parsing the document incrementally.
+
+        Top-level members other than "Sessions" are parsed and discarded; parsing stops at the end of the
+        "Sessions" array. Raises ValueError if the document has no "Sessions" array.
+
+        Parameters:
+        -----------
+        f: text file object
+            open CvrExport file
+        chunk_size: int [optional], default 2**20
+            number of characters to read from the file at a time
+        offsets: bool [optional], default False
+            if set, also yield the positions in the file where each session starts and ends
+
+        Yields:
+        -------
+        dict, the JSON object for each session; or, if `offsets`, a tuple (start, end, session), where
+        start and end are character offsets from the start of the file
+        """
+        decoder = json.JSONDecoder()
+        ws = re.compile(r"[\s,]*")
+        buf = ""
+        pos = 0
+        base = 0  # offset in the file of buf[0]
+        eof = False
+
+        def fill():
+            # read more of the file, discarding what has been consumed
+            nonlocal buf, pos, base, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            base += pos
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip(expected: str = None) -> str:
+            # skip whitespace and commas; return the next character without consuming it
+            nonlocal pos
+            while True:
+                pos = ws.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    break
+                fill()
+            char = buf[pos] if pos < len(buf) else ""
+            if expected is not None and (not char or char not in expected):
+                raise ValueError(f"malformed Dominion CVR file: expected {expected!r}, found {char!r}")
+            return char
+
+        def value():
+            # decode the next complete JSON value
+            nonlocal pos
+            skip()
+            while True:
+                try:
+                    v, end = decoder.raw_decode(buf, pos)
+                    # a value that ends at the end of the buffer (e.g., a number) might be incomplete
+                    if end < len(buf) or eof:
+                        pos = end
+                        return v
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        skip("{")
+        pos += 1
+        while skip('"}') == '"':
+            key = value()
+            skip(":")
+            pos += 1
+            if key != "Sessions":
+                value()
+                continue
+            skip("[")
+            pos += 1
+            while skip() != "]":
+                if not offsets:
+                    yield value()
+                    continue
+                start = base + pos
+                session = value()
+                yield start, base + pos, session
+            return
+        raise ValueError('malformed Dominion CVR file: no "Sessions" array')
+
+    @classmethod
+    def session_to_cvr(
+        cls,
+        c: dict,
+        use_current: bool = True,
+        enforce_rules: bool = True,
+        pool_groups: Collection = [],
+        contest_ids: set = None,
+    ) -> CVR:
+        """
+        Construct a CVR from one Dominion session (an element of the "Sessions" array).
+
+        Parameters:
+        -----------
+        c: dict
+            the session
+        use_current: bool [optional], default True
+            if set, ignores votes unless `IsCurrent == True`
+        enforce_rules: bool [optional], default True
+            if set, ignores votes unless `IsVote == True`
+        pool_groups: enumerable
+            if nonempty, CVRs with `CountingGroupId` in any of the groups is labeled as pooled (see read_cvrs)
+        contest_ids: set of str [optional]
+            if not None, the marks of contests whose ids (as strings) are not in the set are skipped
 
-        with open(cvr_file, "r") as f:
-            cvr_json = json.load(f)
+        Returns:
+        --------
+        CVR object
+        """
         # Dominion export wraps the CVRs under several layers; unwrap
         # Desired output format is
         # {"ID": "A-001-01", "votes": {"mayor": {"Alice": 1, "Bob": 2, "Candy": 3, "Dan": 4}}}
-        cvr_list = []
-        for c in cvr_json["Sessions"]:
-            votes = {}
-            # Skip CVRs not in the desired include_group (if set)
-            if include_groups and c["CountingGroupId"] not in include_groups:
-                continue
-            # Use adjudicated/updated CVR data (if present and requested)
-            for k in [
-                j
-                for j in c.keys()
-                if j in (["Original", "Modified"] if use_current else ["Original"])
-            ]:
-                # Dominion somewhere between 5.2.18.2 and 5.10.50.85 added another hierarchical level, "Cards"
-                if "Cards" in c[k].keys():
-                    # List comprehension to combine a list of lists of contests, which is essentially
-                    # the contents of c[k]["Cards"][0:n]["Contests"], where n is the number of "Card" entries
-                    _selector = [
-                        _con
-                        for _eachlist in [_c["Contests"] for _c in c[k]["Cards"]]
-                        for _con in _eachlist
-                    ]
-                else:
-                    _selector = c[k]["Contests"]
-                for con in _selector:
-                    contest_votes = {}
-                    for mark in con["Marks"]:
-                        if mark["IsVote"] or not enforce_rules:
-                            if str(mark["CandidateId"]) in contest_votes.keys():
-                            # replace existing vote/rank if the new rank is lower but still a vote, not 0 or False
-                            # This may break some scoring rules other than IRV, and might not be what local rules
-                            # require. This logic branch matches San Francisco's rules.
-                                if bool(mark["Rank"]):
-                                    contest_votes[str(mark["CandidateId"])] = (
-                                        min(int(contest_votes[str(mark["CandidateId"])]), int(mark["Rank"]))
-                                        if bool(contest_votes[str(mark["CandidateId"])])
-                                        else int(mark["Rank"])
-                                    )
-                            else:
-                                contest_votes[str(mark["CandidateId"])] = mark["Rank"]
-                    votes[str(con["Id"])] = contest_votes
-            # If RecordId is obfuscated, extract it from the ImageMask
-            record_id = c["RecordId"]
-            if record_id == "X":
-                image_match = image_mask_pattern.search(c["ImageMask"])
-                if image_match is not None:
-                    record_id = int(image_match.group(0).split("_")[-1])
-            cvr_list.append(
-                CVR(
-                    id=str(c["TabulatorId"])
-                    + "-"
-                    + str(c["BatchId"])
-                    + "-"
-                    + str(record_id),
-                    tally_pool=str(c["TabulatorId"]) + "-" + str(c["BatchId"]),
-                    pool=(c["CountingGroupId"] in pool_groups),
-                    votes=votes,
-                )
-            )
-        return cvr_list
+        votes = {}
+        # Use adjudicated/updated CVR data (if present and requested)
+        for k in [
+            j
+            for j in c.keys()
+            if j in (["Original", "Modified"] if use_current else ["Original"])
+        ]:
+            # Dominion somewhere between 5.2.18.2 and 5.10.50.85 added another hierarchical level, "Cards"
+            if "Cards" in c[k].keys():
+                # List comprehension to combine a list of lists of contests, which is essentially
+                # the contents of c[k]["Cards"][0:n]["Contests"], where n is the number of "Card" entries
+                _selector = [
+                    _con
+                    for _eachlist in [_c["Contests"] for _c in c[k]["Cards"]]
+                    for _con in _eachlist
+                ]
+            else:
+                _selector = c[k]["Contests"]
+            for con in _selector:
+                con_id = str(con["Id"])
+                if contest_ids is not None and con_id not in contest_ids:
+                    continue
+                contest_votes = {}
+                for mark in con["Marks"]:
+                    if mark["IsVote"] or not enforce_rules:
+                        if str(mark["CandidateId"]) in contest_votes.keys():
+                        # replace existing vote/rank if the new rank is lower but still a vote, not 0 or False
+                        # This may break some scoring rules other than IRV, and might not be what local rules
+                        # require. This logic branch matches San Francisco's rules.
+                            if bool(mark["Rank"]):
+                                contest_votes[str(mark["CandidateId"])] = (
+                                    min(int(contest_votes[str(mark["CandidateId"])]), int(mark["Rank"]))
+                                    if bool(contest_votes[str(mark["CandidateId"])])
+                                    else int(mark["Rank"])
+                                )
+                        else:
+                            contest_votes[str(mark["CandidateId"])] = mark["Rank"]
+                votes[con_id] = contest_votes
+        return CVR(
+            id=cls.session_id(c),
+            tally_pool=str(c["TabulatorId"]) + "-" + str(c["BatchId"]),
+            pool=(c["CountingGroupId"] in pool_groups),
+            votes=votes,
+        )
+
+    @classmethod
+    def session_id(cls, c: dict) -> str:
+        """
+        The CVR id of a Dominion session: `TabulatorId-BatchId-RecordId`.
+        If RecordId is obfuscated ("X"), it is extracted from the ImageMask.
+        """
+        record_id = c["RecordId"]
+        if record_id == "X":
+            image_match = cls.IMAGE_MASK_PATTERN.search(c["ImageMask"])
+            if image_match is not None:
+                record_id = int(image_match.group(0).split("_")[-1])
+        return str(c["TabulatorId"]) + "-" + str(c["BatchId"]) + "-" + str(record_id)
+
+    @classmethod
+    def index_cvrs(cls, cvr_files, include_groups: Collection = [], chunk_size: int = 2**20) -> dict:
+        """
+        Index the sessions in Dominion CvrExport files by CVR id, recording where each session is stored,
+        so that `load_cvrs_by_id` can later parse only the sessions it needs.
+
+        The index is built in one streaming pass over each file. It is a plain dict of tuples of strings and
+        ints, so it can be saved with json and reused.
+
+        Parameters:
+        -----------
+        cvr_files: string or collection of strings
+            CvrExport filenames, or a directory containing files `CvrExport_*.json` (see export_files).
+            Offsets in compressed files are offsets in the decompressed data.
+        include_groups: enumerable
+            if nonempty, index only sessions with the specified "CountingGroupId" (see read_cvrs)
+        chunk_size: int [optional], default 2**20
+            number of bytes to read from a file at a time
+
+        Returns:
+        --------
+        index: dict
+            key is the CVR id, `TabulatorId-BatchId-RecordId`;
+            value is a tuple (file, byte offset of the session, length of the session in bytes)
+        """
+        if isinstance(cvr_files, str):
+            cvr_files = cls.export_files(cvr_files) if os.path.isdir(cvr_files) else [cvr_files]
+        index = {}
+        for file in cvr_files:
+            # latin-1 maps each byte to one character, so character offsets are byte offsets
+            with Compressed.open(file, encoding="latin-1", newline="") as f:
+                for start, end, c in cls.iter_sessions(f, chunk_size, offsets=True):
+                    if include_groups and c["CountingGroupId"] not in include_groups:
+                        continue
+                    cvr_id = cls.session_id(c)
+                    if cvr_id in index:
+                        warnings.warn(f"duplicate CVR id {cvr_id} in {file}; keeping the first")
+                        continue
+                    index[cvr_id] = (file, start, end - start)
+        return index
+
+    @classmethod
+    def load_cvrs_by_id(
+        cls,
+        index: dict,
+        ids: Collection,
+        use_current: bool = True,
+        enforce_rules: bool = True,
+        pool_groups: Collection = [],
+        contest_ids: Collection = None,
+    ) -> list:
+        """
+        Read the CVRs with the given ids, parsing only their sessions.
+
+        For instance, after drawing a sample from compact CVR data (e.g., a CVRTable), the full CVRs of the
+        sampled cards can be assembled with `load_cvrs_by_id(index, [cvr_list.id[i] for i in sample])`.
+
+        Parameters:
+        -----------
+        index: dict
+            index of the CvrExport files, from `index_cvrs`
+        ids: collection of strings
+            the CVR ids to read
+        use_current, enforce_rules, pool_groups, contest_ids:
+            as for read_cvrs
+
+        Returns:
+        --------
+        cvr_list: list of CVR objects, in the order of `ids`
+        """
+        missing = [i for i in ids if i not in index]
+        if missing:
+            raise ValueError(f"{len(missing)} ids are not in the index, e.g., {missing[:5]}")
+        by_file = defaultdict(list)
+        for i in set(ids):
+            file, offset, length = index[i]
+            by_file[file].append((offset, length, i))
+        keep = None if contest_ids is None else {str(c) for c in contest_ids}
+        cvrs = {}
+        for file, sessions in by_file.items():
+            # the offsets are visited in increasing order, so a compressed file is decompressed at most once
+            with Compressed.open(file, "rb", background=False) as f:
+                for offset, length, i in sorted(sessions):
+                    f.seek(offset)
+                    c = json.loads(f.read(length))
+                    cvrs[i] = cls.session_to_cvr(c, use_current, enforce_rules, pool_groups, keep)
+        return [cvrs[i] for i in ids]
 
     @classmethod
     def read_cvrs_directory(
@@ -202,10 +494,19 @@ class Dominion:
         enforce_rules: bool = True,
         include_groups: Collection = [],
         pool_groups: Collection = [],
+        workers: int = 1,
+        timings: list = None,
+        accumulators: Collection = None,
+        contest_ids: Collection = None,
+        include_tabulators: Collection = [],
     ):
         """
         Read CVRs in Dominion format from a given directory.
 
+        The files `CvrExport_*.json`, possibly compressed (see export_files), are read in sorted order. If
+        `workers > 1`, the files are parsed in parallel by a pool of `workers` processes; the CVRs are returned
+        in the same order either way.
+
         Parameters:
         -----------
         cvr_directory: string
@@ -218,21 +519,71 @@ class Dominion:
             if set, use to select only CVRs with specified "CountingGroupId" (see read_cvrs)
         pool_groups: collection of ints [optional], default []
             if set, mark CVRs for pooling with ONEAudit
+        workers: int [optional], default 1
+            number of processes to use to parse the files
+        timings: list [optional]
+            if not None, a dict is appended for each file, in sorted-file order, with keys
+            `file` (the filename), `cvrs` (the number of CVRs read from it), and `seconds` (time spent parsing it)
+        accumulators: collection of CVRAccumulators [optional]
+            each CVR is added to each accumulator, in order, as the CVRs from each file are collected
+        contest_ids: collection [optional]
+            if not None, keep only these contests (see read_cvrs)
+        include_tabulators: collection of ints [optional], default []
+            if set, use to select only CVRs with specified "TabulatorId"
 
         Returns:
         --------
         cvr_list: list of CVR objects
 
         """
+        files = cls.export_files(cvr_directory)
+        read = partial(
+            Dominion._read_cvrs_timed,
+            use_current=use_current,
+            enforce_rules=enforce_rules,
+            include_groups=include_groups,
+            pool_groups=pool_groups,
+            contest_ids=contest_ids,
+            include_tabulators=include_tabulators,
+        )
         cvr_list = []
-        for file in [f for f in sorted(glob.glob(f"{cvr_directory}/CvrExport_*.json"))]:
-            cvr_list.extend(
-                Dominion.read_cvrs(
-                    file, use_current, enforce_rules, include_groups, pool_groups
-                )
-            )
+        if workers > 1 and len(files) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(read, files, chunksize=max(1, len(files) // (4 * workers)))
+                for file, (cvrs, seconds) in zip(files, results):
+                    cls._record_timing(timings, file, cvrs, seconds)
+                    cvr_list.extend(CVRAccumulator.feed(cvrs, accumulators))
+        else:
+            for file in files:
+                cvrs, seconds = read(file)
+                cls._record_timing(timings, file, cvrs, seconds)
+                cvr_list.extend(CVRAccumulator.feed(cvrs, accumulators))
         return cvr_list
 
+    @classmethod
+    def export_files(cls, cvr_directory: str) -> list:
+        """
+        the CvrExport files in a directory, sorted: files `CvrExport_*.json`, each possibly compressed
+        (`CvrExport_*.json.gz`, `.bz2`, `.xz`, or `.zst`)
+        """
+        return sorted(
+            f for f in glob.glob(f"{cvr_directory}/CvrExport_*.json*") if Compressed.has_suffix(f, ".json")
+        )
+
+    @classmethod
+    def _read_cvrs_timed(cls, file: str, **kwargs) -> tuple:
+        """
+        read_cvrs, also returning the time taken in seconds
+        """
+        start = time.perf_counter()
+        cvrs = cls.read_cvrs(file, **kwargs)
+        return cvrs, time.perf_counter() - start
+
+    @classmethod
+    def _record_timing(cls, timings: list, file: str, cvrs: list, seconds: float):
+        if timings is not None:
+            timings.append({"file": file, "cvrs": len(cvrs), "seconds": seconds})
+
     @classmethod
     def raire_to_dominion(cls, cvr_list: list = None):
         """
@@ -247,6 +598,10 @@ class Dominion:
         -------
         cvrs: list of CVR objects with "-" substituted for "_" in the id attribute.
         """
+        if isinstance(cvr_list, CVRTable):
+            cvr_list.id[:] = [str(i).replace("_", "-") for i in cvr_list.id]
+            cvr_list.invalidate()
+            return cvr_list
         for c in cvr_list:
             c.id = str(c.id).replace("_", "-")
         return cvr_list
@@ -295,11 +650,11 @@ class Dominion:
         contest_dict = {}
 
         # Ingest ContestManifest.json
-        with open(contest_manifest) as fp:
+        with Compressed.open(contest_manifest) as fp:
             contestdata = json.load(fp)
 
         # Ingest CandidateManifest.json
-        with open(candidate_manifest) as fp:
+        with Compressed.open(candidate_manifest) as fp:
             candidatedata = json.load(fp)
 
         # Build a list of candidate dicts containing candidate id, candidate name and contest id,
@@ -472,13 +827,37 @@ class Dominion:
         return cards, sample_order, mvr_phantoms
 
     @classmethod
-    def sample_from_cvrs(cls, cvr_list: list, manifest: list, sample: np.array):
+    def manifest_lookup(cls, manifest) -> dict:
+        """
+        Map each tabulator and batch in a Dominion manifest to the card's location
+
+        Parameters
+        ----------
+        manifest: pandas dataframe
+            a ballot manifest as a pandas dataframe
+
+        Returns
+        -------
+        dict: keys are `"{Tabulator Number}-{Batch Number}"`, values are `[VBMCart.Cart number, Tray #]`
+        """
+        return {
+            f"{tab}-{batch}": [cart, tray]
+            for tab, batch, cart, tray in zip(
+                manifest["Tabulator Number"].tolist(),
+                manifest["Batch Number"].tolist(),
+                manifest["VBMCart.Cart number"].tolist(),
+                manifest["Tray #"].tolist(),
+            )
+        }
+
+    @classmethod
+    def sample_from_cvrs(cls, cvr_list: list, manifest: list, sample: np.array, lookup: dict = None):
         """
         Sample from a list of CVRs: return info to find the cards, CVRs, & mvrs for sampled phantom cards
 
         Parameters
         ----------
-        cvr_list: list of CVR objects.
+        cvr_list: list of CVR objects, or PhantomCVRs.
             The id for the cvr is assumed to be composed of a scanner number, batch number, and
             ballot number, joined with underscores, Dominion's format
 
@@ -486,6 +865,8 @@ class Dominion:
             a ballot manifest as a pandas dataframe
         sample: numpy array of ints
             the CVRs to sample
+        lookup: dict [optional]
+            the result of `manifest_lookup(manifest)`; pass it to avoid rebuilding it on every call
 
         Returns
         -------
@@ -502,32 +883,24 @@ class Dominion:
         sample_order = {}
         cvr_sample = []
         mvr_phantoms = []
-
-        # Convert the pandas DataFrame into a list of tuples to create a lookup table
-        _manifest = list(manifest.itertuples(index=False, name=None))
-        _columns = list(manifest.columns)
-        index = dict([(_, _columns.index(_)) for _ in _columns])
-        lookuptable = {}
-        for _m in _manifest:
-            _key = f'{_m[index["Tabulator Number"]]}-{_m[index["Batch Number"]]}'
-            _val = [_m[index["VBMCart.Cart number"]], _m[index["Tray #"]]]
-            lookuptable[_key] = _val
+        lookuptable = cls.manifest_lookup(manifest) if lookup is None else lookup
 
         for i, s in enumerate(sample):
-            cvr_sample.append(cvr_list[s])
-            cvr_id = cvr_list[s].id
-            card_in_batch = cvr_list[s].card_in_batch
-            tab, batch, card_num = cvr_id.split("-")
-            card_id = f"{tab}-{batch}-{card_num}"
-            search_key = f"{tab}-{batch}"
-            if not cvr_list[s].phantom:
-                card = lookuptable[search_key] + [
+            cvr = cvr_list[s]
+            cvr_sample.append(cvr)
+            cvr_id = cvr.id
+            if not cvr.phantom:
+                tab, batch, card_num = cvr_id.split("-")
+                card_id = f"{tab}-{batch}-{card_num}"
+                card = lookuptable[f"{tab}-{batch}"] + [
                     tab,
                     batch,
-                    card_in_batch,
+                    cvr.card_in_batch,
                     card_id,
                 ]
-            else:
+            else:  # phantom ids need not have three parts, e.g., the default "phantom-1"
+                tab, batch, card_num = (cvr_id.split("-", 2) + ["", ""])[:3]
+                card_id = cvr_id
                 card = ["", "", tab, batch, card_num, card_id]
                 mvr_phantoms.append(CVR(id=cvr_id, votes={}, phantom=True))
             cards.append(card)
@@ -9,8 +9,12 @@ import pandas as pd
 import warnings
 import xml.etree.ElementTree as ET
 
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Collection
 from zipfile import ZipFile
 from shangrla.core.Audit import CVR, Contest
+from shangrla.core.Compressed import Compressed
+from shangrla.core.CVRAccumulator import CVRAccumulator
 
 
 class Hart:
@@ -18,6 +22,19 @@ class Hart:
     WRITE_IN = "WRITE_IN"
     NO_CANDIDATE = "NO_CANDIDATE"
 
+    # fully qualified element tags used by parse_cvr, so that lookups need no namespace map
+    NAMESPACE = "{http://tempuri.org/CVRDesign.xsd}"
+    TAG_NAME = NAMESPACE + "Name"
+    TAG_OPTIONS = NAMESPACE + "Options"
+    TAG_OPTION = NAMESPACE + "Option"
+    TAG_WRITE_IN = NAMESPACE + "WriteInData"
+    TAG_VALUE = NAMESPACE + "Value"
+    TAG_BATCH_SEQUENCE = NAMESPACE + "BatchSequence"
+    TAG_SHEET_NUMBER = NAMESPACE + "SheetNumber"
+    TAG_PRECINCT_SPLIT = NAMESPACE + "PrecinctSplit"
+    TAG_CVR_GUID = NAMESPACE + "CvrGuid"
+    CLEAN_PATTERN = re.compile("\n/ +/")
+
     @classmethod
     def prep_manifest(cls, manifest: pd.DataFrame, max_cards: int, n_cvrs: int):
         """
@@ -78,7 +95,7 @@ class Hart:
         return manifest, manifest_cards, phantoms
 
     @classmethod
-    def read_cvr(cls, cvr_string: str = None) -> CVR:
+    def read_cvr(cls, cvr_string: str = None, contest_ids: Collection = None) -> CVR:
         """
         read a single Hart CVR from XML into python
 
@@ -86,6 +103,8 @@ class Hart:
         -----------
         cvr_string: string
             the raw string of a Hart XML CVL
+        contest_ids: collection [optional]
+            if not None, keep only the contests with these names; the options of other contests are not read
 
         Returns:
         --------
@@ -112,6 +131,8 @@ class Hart:
         for contest in cvr_root[0]:
             # record the name of the contest
             con = contest.findall("xmlns:Name", namespaces)[0].text
+            if contest_ids is not None and con not in contest_ids:
+                continue
             votes[con] = {}
             options = contest.find("xmlns:Options", namespaces).findall(
                 "xmlns:Option", namespaces
@@ -130,33 +151,95 @@ class Hart:
         return CVR(id=batch_sequence + "_" + sheet_number, votes=votes)
 
     @classmethod
-    def read_cvrs_directory(cls, cvr_directory):
+    def parse_cvr(cls, cvr_xml, contest_ids: Collection = None) -> CVR:
+        """
+        read a single Hart CVR from XML into python; faster equivalent of read_cvr
+
+        Looks up elements by their fully qualified tags rather than by namespace-prefixed paths, and reads only
+        the elements the CVR needs. Returns the same CVR as read_cvr, and fails on the same inputs (e.g., a
+        CVR without a PrecinctSplit or CvrGuid).
+
+        Parameters:
+        -----------
+        cvr_xml: string or bytes
+            the raw Hart XML CVR. Bytes are decoded as UTF-8, whatever the XML declaration says, as
+            read_cvrs_zip has always done.
+        contest_ids: collection [optional]
+            if not None, keep only the contests with these names (see read_cvr)
+
+        Returns:
+        --------
+        CVR object with unique identifier, contests, and votes
+        """
+        if isinstance(cvr_xml, bytes):
+            cvr_xml = cvr_xml.decode()
+        if "\n/" in cvr_xml:
+            cvr_xml = cls.CLEAN_PATTERN.sub(" ", cvr_xml)
+        cvr_root = ET.fromstring(cvr_xml)
+        # read_cvr reads these (without using them), so a CVR that lacks them is rejected
+        precinct_split = cvr_root.findall(cls.TAG_PRECINCT_SPLIT)[0]
+        precinct_name, precinct_ID = precinct_split[0].text, precinct_split[1].text
+        cvr_guid = cvr_root.findall(cls.TAG_CVR_GUID)[0].text
+        votes = {}
+        # contests are contained in "Contests", the first element of cvr_root
+        for contest in cvr_root[0]:
+            con = contest.find(cls.TAG_NAME).text
+            if contest_ids is not None and con not in contest_ids:
+                continue
+            contest_votes = votes[con] = {}
+            for candidate in contest.find(cls.TAG_OPTIONS):
+                if candidate.tag != cls.TAG_OPTION:
+                    continue
+                # look for write-ins before name; sometimes write-ins have empty nametags
+                if candidate.find(cls.TAG_WRITE_IN) is not None:
+                    cand = Contest.CANDIDATES.WRITE_IN
+                else:
+                    name = candidate.find(cls.TAG_NAME)
+                    if name is None:
+                        raise Warning("Option with no candidate name or write in:\n" + con)
+                    cand = name.text
+                contest_votes[cand] = candidate.find(cls.TAG_VALUE).text
+        batch_sequence = cvr_root.find(cls.TAG_BATCH_SEQUENCE).text
+        sheet_number = cvr_root.find(cls.TAG_SHEET_NUMBER).text
+        return CVR(id=batch_sequence + "_" + sheet_number, votes=votes)
+
+    @classmethod
+    def read_cvrs_directory(cls, cvr_directory, contest_ids: Collection = None):
         """
         read a batch of Hart CVRs from a directory of XMLs to a list
 
         Parameters:
         -----------
         cvr_directory: string
-            name of folder containing CVRs as XML files
+            name of folder containing CVRs as XML files; the files may be compressed (e.g., `*.xml.gz`)
+        contest_ids: collection [optional]
+            if not None, keep only the contests with these names (see read_cvr)
 
         Returns:
         --------
         cvr_list: list of CVRs as returned by read_CVR()
         """
         cvr_list = []
-        for file in [f for f in os.listdir(cvr_directory) if f.endswith(".xml")]:
+        for file in [f for f in os.listdir(cvr_directory) if Compressed.has_suffix(f, ".xml")]:
             cvr_path = cvr_directory + "/" + file
-            with open(
-                cvr_path, "r", encoding="latin-1"
+            with Compressed.open(
+                cvr_path, "r", encoding="latin-1", background=False
             ) as xml_file:  # latin-1 encoding?
                 raw_string = xml_file.read()
-            cvr_list.append(cls.read_cvr(raw_string))
+            cvr_list.append(cls.parse_cvr(raw_string, contest_ids))
 
         return cvr_list
 
     # add new function to wrap read_cvr that reads from ZIPs instead of from a directory
     @classmethod
-    def read_cvrs_zip(cls, cvr_zip, size=None):
+    def read_cvrs_zip(
+        cls,
+        cvr_zip,
+        size=None,
+        workers: int = 1,
+        accumulators: Collection = None,
+        contest_ids: Collection = None,
+    ):
         """
         read a batch of Hart CVRs from a zipfile of XMLs to a list
 
@@ -164,24 +247,50 @@ class Hart:
         -----------
         cvr_zip: string
             name of zipfile containing CVRs as XML files
+        size: int [optional]
+            if not None, only the first `size` members of the zipfile are read
+        workers: int [optional], default 1
+            number of processes to use to decompress and parse the members. Each process opens the zipfile
+            and reads a contiguous run of members; the CVRs are returned in zipfile order either way.
+        accumulators: collection of CVRAccumulators [optional]
+            each CVR is added to each accumulator, in zipfile order, as it is collected
+        contest_ids: collection [optional]
+            if not None, keep only the contests with these names (see read_cvr)
 
         Returns:
         --------
         cvr_list: list of CVRs as returned by read_CVR()
         """
-        cvr_list = []
         with ZipFile(cvr_zip, "r") as data:
             file_list = data.namelist()
             if size is None:
                 size = len(file_list)
-            for cvr in file_list[0:size]:
-                if cvr.endswith(".xml"):
-                    with data.open(cvr) as xml_file:
-                        raw_string = xml_file.read().decode()
-                        cvr_object = cls.read_cvr(raw_string)
-                        cvr_list.append(cvr_object)
+            members = [cvr for cvr in file_list[0:size] if cvr.endswith(".xml")]
+            if workers <= 1 or len(members) < 2:
+                return list(
+                    CVRAccumulator.feed(
+                        (cls.parse_cvr(data.read(cvr), contest_ids) for cvr in members), accumulators
+                    )
+                )
+        n_chunks = min(len(members), 4 * workers)
+        bounds = np.linspace(0, len(members), n_chunks + 1).astype(int)
+        chunks = [members[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        cvr_list = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for cvrs in executor.map(
+                cls._read_zip_members, [cvr_zip] * len(chunks), chunks, [contest_ids] * len(chunks)
+            ):
+                cvr_list.extend(CVRAccumulator.feed(cvrs, accumulators))
         return cvr_list
 
+    @classmethod
+    def _read_zip_members(cls, cvr_zip, members: list, contest_ids: Collection = None) -> list:
+        """
+        parse the listed XML members of a zipfile, in order
+        """
+        with ZipFile(cvr_zip, "r") as data:
+            return [cls.parse_cvr(data.read(cvr), contest_ids) for cvr in members]
+
     @classmethod
     def sample_from_manifest(cls, manifest: object = None, sample: list = None):
         """
@@ -238,7 +347,26 @@ class Hart:
         return cards, sample_order, mvr_phantoms
 
     @classmethod
-    def sample_from_cvrs(cls, cvr_list: list, manifest: list, sample: np.array):
+    def manifest_lookup(cls, manifest: pd.DataFrame) -> dict:
+        """
+        Map each batch name in a Hart manifest to its tabulator (that of the first row for the batch)
+
+        Parameters
+        ----------
+        manifest: pandas dataframe
+            a ballot manifest as a pandas dataframe
+
+        Returns
+        -------
+        dict: keys are `Batch Name` as str, values are `Tabulator`
+        """
+        lookup = {}
+        for batch, tab in zip(manifest["Batch Name"].astype(str).tolist(), manifest["Tabulator"].tolist()):
+            lookup.setdefault(batch, tab)
+        return lookup
+
+    @classmethod
+    def sample_from_cvrs(cls, cvr_list: list, manifest: list, sample: np.array, lookup: dict = None):
         """
         Sample from a list of CVRs: return info to find the cards, CVRs, & mvrs for sampled phantom cards
 
@@ -251,6 +379,8 @@ class Hart:
             a ballot manifest as a pandas dataframe
         sample: numpy array of ints
             the CVRs to sample
+        lookup: dict [optional]
+            the result of `manifest_lookup(manifest)`; pass it to avoid rebuilding it on every call
 
         Returns
         -------
@@ -267,14 +397,16 @@ class Hart:
         sample_order = {}
         cvr_sample = []
         mvr_phantoms = []
+        lookup = cls.manifest_lookup(manifest) if lookup is None else lookup
         for i, s in enumerate(sample):
             cvr_sample.append(cvr_list[s])
             cvr_id = cvr_list[s].id
             if not cvr_list[s].phantom:
                 batch, card_num = cvr_id.split("_")
                 card_id = f"{batch}_{card_num}"
-                manifest_row = manifest[(manifest["Batch Name"] == str(batch))].iloc[0]
-                card = [manifest_row["Tabulator"]] + [batch, card_num, card_id]
+                if str(batch) not in lookup:
+                    raise IndexError(f"batch {batch} is not in the manifest")
+                card = [lookup[str(batch)]] + [batch, card_num, card_id]
             else:
                 word, batch, card_num = cvr_id.split("-")
                 card_id = f"phantom-{batch}-{card_num}"
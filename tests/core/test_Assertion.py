@@ -4,6 +4,7 @@ import sys
 import pytest
 from collections import defaultdict
 
+from shangrla.core.AssorterCache import AssorterCache
 from shangrla.core.Audit import Audit, Assertion, Assorter, Contest, CVR
 from shangrla.core.NonnegMean import NonnegMean
 
@@ -67,6 +68,46 @@ class TestAssertion:
         raw_AvB_asrtn.set_margin_from_cvrs(comparison_audit, plur_cvr_list)
         assert raw_AvB_asrtn.margin == 0.5
 
+    def test_set_all_margins_from_cvrs(self, comparison_audit):
+        rng = np.random.default_rng(1234)
+        cands = ['Alice', 'Bob', 'Candy', 'Dan', 'Edie']
+        cvr_list = []
+        for i in range(500):
+            plur = rng.choice(cands, size=rng.integers(0, 3), replace=False, p=[.35, .35, .1, .1, .1])
+            smaj = rng.choice(cands[:3], size=rng.integers(0, 3), replace=False, p=[.6, .2, .2])
+            votes = {'plur': {c: True for c in plur}, 'smaj': {c: True for c in smaj}}
+            cvr_list.append(CVR(id=str(i), votes=votes if i % 5 else {'plur': votes['plur']}))
+        contests = Contest.from_dict_of_dicts({
+            'plur': {'id': 'plur', 'risk_limit': 0.05, 'cards': 500, 'n_winners': 2, 'candidates': cands,
+                     'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY, 'winner': ['Alice', 'Bob'],
+                     'audit_type': Audit.AUDIT_TYPE.CARD_COMPARISON, 'test': NonnegMean.alpha_mart},
+            'smaj': {'id': 'smaj', 'risk_limit': 0.05, 'cards': 500, 'n_winners': 1, 'candidates': cands[:3],
+                     'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.SUPERMAJORITY, 'share_to_win': 0.4,
+                     'winner': ['Alice'], 'audit_type': Audit.AUDIT_TYPE.POLLING, 'test': NonnegMean.alpha_mart},
+        })
+        Assertion.make_all_assertions(contests)
+        seen = []
+        custom = Assertion(contests['smaj'],
+                           Assorter(contest=contests['smaj'], assort=lambda c: (seen.append(c), 0.75)[1]),
+                           test=NonnegMean(N=500))
+        contests['smaj'].assertions['custom'] = custom
+        expected = {a: 2 * asn.assorter.mean(cvr_list) - 1
+                    for con in contests.values() for a, asn in con.assertions.items()}
+        assert len(contests['plur'].assertions) == 6
+        seen.clear()
+        min_margin = Assertion.set_all_margins_from_cvrs(comparison_audit, contests, cvr_list)
+        assert min_margin == pytest.approx(min(expected.values()))
+        # the assertion without a spec is evaluated on the CVR objects given, not on rows of a table
+        given = {id(c) for c in cvr_list}
+        assert seen and all(id(c) in given for c in seen)
+        for con in contests.values():
+            for a, asn in con.assertions.items():
+                assert con.margins[a] == asn.margin == pytest.approx(expected[a])
+                if con.audit_type == Audit.AUDIT_TYPE.POLLING:
+                    assert asn.test.u == asn.assorter.upper_bound
+                else:
+                    assert asn.test.u == 2 / (2 - asn.margin / asn.assorter.upper_bound)
+
 
     def test_make_plurality_assertions(self, con_test):
         winner = ["Alice","Bob"]
@@ -274,6 +315,67 @@ class TestAssertion:
         np.testing.assert_almost_equal(raw_AvB_asrtn.assorter.tally_pool_means['2'], 0)
         
 
+    @pytest.mark.parametrize("use_style", [True, False])
+    def test_contest_mvrs_to_data(self, use_style):
+        rng = np.random.default_rng(4321)
+        cands = ['Alice', 'Bob', 'Candy']
+        contest = Contest.from_dict({'id': 'AvB', 'name': 'AvB', 'risk_limit': 0.05, 'cards': 400, 'n_winners': 1,
+                                     'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY,
+                                     'candidates': cands, 'winner': ['Alice'], 'use_style': use_style,
+                                     'audit_type': Audit.AUDIT_TYPE.ONEAUDIT, 'test': NonnegMean.alpha_mart})
+        contest.sample_threshold = 2**255
+        cvr_sample, mvr_sample = [], []
+        for i in range(400):
+            vote = {c: 1 for c in rng.choice(cands, size=rng.integers(0, 2))}
+            cvr = CVR(id=str(i), votes={'AvB': vote, 'CvD': {}}, phantom=(i % 17 == 0), pool=(i % 3 == 0),
+                      tally_pool=['a', 'b', None][i % 5 % 3], sample_num=int.from_bytes(rng.bytes(32), "big"))
+            if i % 11 == 0:
+                cvr.votes.pop('AvB')
+            cvr_sample.append(cvr)
+            mvr_vote = {c: 1 for c in rng.choice(cands, size=1)} if i % 7 == 0 else vote
+            mvr_sample.append(CVR(id=str(i), votes={} if i % 13 == 0 else {'AvB': mvr_vote},
+                                  phantom=(i % 19 == 0)))
+        Assertion.make_all_assertions({'AvB': contest})
+        for asn in contest.assertions.values():
+            asn.margin = 0.2
+            asn.assorter.tally_pool_means = {'a': 0.6, 'b': 0.45, None: 0.5}
+        custom = Assertion(contest, Assorter(contest=contest, assort=lambda c: c.get_vote_for('AvB', 'Bob')),
+                           margin=0.1, test=NonnegMean(N=400))
+        contest.assertions['custom'] = custom
+        data = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample, cvr_sample)
+        assert list(data) == list(contest.assertions)
+        for a, asn in contest.assertions.items():
+            d, u = asn.mvrs_to_data(mvr_sample, cvr_sample)
+            np.testing.assert_array_equal(data[a][0], d)
+            assert data[a][1] == u
+        contest.audit_type = Audit.AUDIT_TYPE.POLLING
+        data = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample)
+        for a, asn in contest.assertions.items():
+            np.testing.assert_array_equal(data[a][0], asn.mvrs_to_data(mvr_sample)[0])
+
+    @pytest.mark.parametrize("use_cache", [True, False])
+    def test_custom_assorter_sample(self, use_cache):
+        # assorters without a spec are evaluated on the CVR objects given, not on rows of the tables
+        contest = Contest.from_dict({'id': 'AvB', 'name': 'AvB', 'risk_limit': 0.05, 'cards': 50, 'n_winners': 1,
+                                     'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY,
+                                     'candidates': ['Alice', 'Bob'], 'winner': ['Alice'], 'use_style': False,
+                                     'audit_type': Audit.AUDIT_TYPE.CARD_COMPARISON, 'test': NonnegMean.alpha_mart})
+        cvr_sample = [CVR(id=str(i), votes={'AvB': {['Alice', 'Bob'][i % 3 == 0]: 1}}) for i in range(50)]
+        mvr_sample = [CVR(id=c.id, votes=c.votes) for c in cvr_sample]
+        Assertion.make_all_assertions({'AvB': contest})
+        seen = []
+        assort = lambda c: (seen.append(c), c.get_vote_for('AvB', 'Alice'))[1]
+        contest.assertions['custom'] = Assertion(contest, Assorter(contest=contest, assort=assort), margin=0.1,
+                                                 test=NonnegMean(N=50))
+        for asn in contest.assertions.values():
+            asn.margin = 0.2
+        cache = AssorterCache() if use_cache else None
+        Assertion.set_p_values({'AvB': contest}, mvr_sample, cvr_sample, cache=cache)
+        audit = Audit.from_dict({'reps': 2, 'strata': {'stratum_1': {'max_cards': 50, 'use_style': False}}})
+        audit.find_sample_size({'AvB': contest}, mvr_sample=mvr_sample, cvr_sample=cvr_sample, cache=cache)
+        given = {id(c) for c in mvr_sample + cvr_sample}
+        assert seen and all(id(c) in given for c in seen)
+
     def test_count_tally_pool_vals(self, raw_AvB_asrtn):
         cvr_dicts = [{'id': 1, 'tally_pool': '1', 'pool': True, 'votes': {'AvB': {'Alice': 1}, 'CvD': {'Candy':True}}},
                      {'id': 2, 'tally_pool': '1', 'pool': True, 'votes': {'CvD': {'Elvis':True, 'Candy':False}, 'EvF': {}}},
@@ -0,0 +1,85 @@
+import numpy as np
+import sys
+import pytest
+
+from shangrla.core.AssorterCache import AssorterCache
+from shangrla.core.Audit import Audit, Assertion, Assorter, Contest, CVR
+from shangrla.core.NonnegMean import NonnegMean
+
+#######################################################################################################
+
+
+class TestAssorterCache:
+
+    def test_values(self):
+        cache = AssorterCache()
+        assert np.isnan(cache.hit_rate)
+        calls = []
+        evaluate = lambda pos: (calls.append(pos.tolist()), [float(p) for p in pos])[1]
+        np.testing.assert_array_equal(cache.values(('c', 'a'), 'mvr', ['x', 'y'], evaluate), [0, 1])
+        np.testing.assert_array_equal(cache.values(('c', 'a'), 'mvr', ['z', 'y', 'x'], evaluate), [0, 1, 0])
+        assert calls == [[0, 1], [0]]
+        assert (cache.hits, cache.misses, len(cache)) == (2, 3, 3)
+        assert cache.hit_rate == pytest.approx(2/5)
+        # the CVRs and the other assertions are cached separately
+        np.testing.assert_array_equal(cache.missing(('c', 'a'), 'cvr', ['x']), [True])
+        np.testing.assert_array_equal(cache.missing(('c', 'b'), 'mvr', ['x']), [True])
+        # a corrected MVR gets a new version, and its value is computed again
+        assert cache.invalidate(['y'], sample='mvr') == 1
+        assert cache.version('y') == 1
+        np.testing.assert_array_equal(cache.missing(('c', 'a'), 'mvr', ['x', 'y']), [False, True])
+        with pytest.raises(ZeroDivisionError):
+            cache.values(('c', 'a'), 'mvr', ['y'], lambda pos: 1 / 0)
+        assert cache.invalidate() == 2
+        assert len(cache) == 0
+
+    @pytest.mark.parametrize("audit_type", [Audit.AUDIT_TYPE.CARD_COMPARISON, Audit.AUDIT_TYPE.POLLING])
+    def test_rounds(self, audit_type):
+        rng = np.random.default_rng(2468)
+        cands = ['Alice', 'Bob', 'Candy']
+        contest = Contest.from_dict({'id': 'AvB', 'name': 'AvB', 'risk_limit': 0.05, 'cards': 300, 'n_winners': 1,
+                                     'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY,
+                                     'candidates': cands, 'winner': ['Alice'], 'use_style': False,
+                                     'audit_type': audit_type, 'test': NonnegMean.alpha_mart})
+        cvr_sample, mvr_sample = [], []
+        for i in range(300):
+            vote = {str(c): 1 for c in rng.choice(cands, size=1, p=[0.6, 0.3, 0.1])}
+            cvr_sample.append(CVR(id=str(i), votes={'AvB': vote}, phantom=(i % 37 == 0), sample_num=i))
+            mvr_sample.append(CVR(id=str(i), votes={'AvB': {'Bob': 1} if i % 29 == 0 else vote}))
+        Assertion.make_all_assertions({'AvB': contest})
+        contest.assertions['custom'] = Assertion(
+            contest, Assorter(contest=contest, assort=lambda c: c.get_vote_for('AvB', 'Alice')), margin=0.1,
+            test=NonnegMean(N=300))
+        for asn in contest.assertions.values():
+            asn.margin = 0.2
+        cache = AssorterCache()
+        n_samples = 2 if audit_type == Audit.AUDIT_TYPE.CARD_COMPARISON else 1
+        n_values = 0
+        for n in [100, 200, 300]:
+            cvrs = cvr_sample[:n] if audit_type == Audit.AUDIT_TYPE.CARD_COMPARISON else None
+            data = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample[:n], cvrs, cache=cache)
+            expected = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample[:n], cvrs)
+            for a in contest.assertions:
+                np.testing.assert_array_equal(data[a][0], expected[a][0])
+                assert data[a][1] == expected[a][1]
+            n_values += n * n_samples * len(contest.assertions)
+            assert cache.misses == n * n_samples * len(contest.assertions)  # each card is assorted once
+            assert cache.hits + cache.misses == n_values
+        # correct an MVR
+        mvr_sample[5] = CVR(id='5', votes={'AvB': {'Alice': 1, 'Bob': 1}})
+        cache.invalidate(['5'], sample='mvr')
+        data = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample, cvrs, cache=cache)
+        expected = Assertion.contest_mvrs_to_data(contest.assertions, mvr_sample, cvrs)
+        for a in contest.assertions:
+            np.testing.assert_array_equal(data[a][0], expected[a][0])
+        # set_p_values with and without the cache agree
+        if audit_type == Audit.AUDIT_TYPE.CARD_COMPARISON:
+            Assertion.set_p_values({'AvB': contest}, mvr_sample, cvrs, cache=cache)
+            p_values = dict(contest.p_values)
+            Assertion.set_p_values({'AvB': contest}, mvr_sample, cvrs)
+            assert contest.p_values == p_values
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
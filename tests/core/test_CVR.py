@@ -1,9 +1,13 @@
+import gzip
 import numpy as np
+import pickle
 import sys
+from collections import defaultdict
 import pytest
 from cryptorandom.cryptorandom import SHA256
 
-from shangrla.core.Audit import Audit, Assertion, Contest, CVR
+from shangrla.core.Audit import Audit, Assertion, Contest, CVR, CompactCVR, PhantomCVRs
+from shangrla.core.CVRTable import CVRTable
 
 #######################################################################################################
 
@@ -159,6 +163,89 @@ class TestCVR:
         assert c[2].id == "99813_1_6"
         assert c[2].votes == {'339': {'18':1, '17':2, '15':3, '16':4}, '3': {'2':1}} # merges votes?
 
+    def test_from_raire_file(self, tmp_path):
+        rows = ["2",
+                "Contest,339,3,15,16,17",
+                "Contest,3,2,1,2",
+                "339,99813_1_1,17",
+                "339,99813_1_6,18,17,15,16",
+                "3,99813_1_6,2",
+                "3,99813_1_1,1,2,1",
+                "339,99813_1_6,16",
+                "339,99813_1_9"]
+        raire_file = tmp_path / "test.raire"
+        raire_file.write_text("\n".join(rows) + "\n")
+        raire = [r.split(",") for r in rows]
+        # reference: one CVR per row, merged
+        expected = CVR.merge_cvrs([CVR.from_vote({str(c[j]): j - 1 for j in range(2, len(c))}, id=c[1], contest_id=c[0])
+                                   for c in raire[3:]])
+        assert [c.id for c in expected] == ["99813_1_1", "99813_1_6", "99813_1_9"]
+        assert expected[1].votes == {'339': {'16': 1}, '3': {'2': 1}}
+        assert expected[0].votes == {'339': {'17': 1}, '3': {'1': 3, '2': 2}}
+        assert not expected[1].pool
+        cvrs, cvrs_read, unique_ids = CVR.from_raire_file(raire_file)
+        assert (cvrs_read, unique_ids) == (len(raire) - 2, 3)
+        assert [str(c) for c in cvrs] == [str(c) for c in expected]
+        assert [str(c) for c in CVR.from_raire(raire)[0]] == [str(c) for c in expected]
+        table, cvrs_read, unique_ids = CVRTable.from_raire_file(raire_file)
+        assert (cvrs_read, unique_ids) == (len(raire) - 2, 3)
+        assert [str(c) for c in table] == [str(c) for c in expected]
+        # compressed input is decompressed as it is read
+        gz_file = tmp_path / "test.raire.gz"
+        gz_file.write_bytes(gzip.compress(raire_file.read_bytes()))
+        cvrs, cvrs_read, unique_ids = CVR.from_raire_file(gz_file)
+        assert [str(c) for c in cvrs] == [str(c) for c in expected]
+        assert [str(c) for c in CVRTable.from_raire_file(gz_file)[0]] == [str(c) for c in expected]
+
+    def test_ndjson(self, tmp_path):
+        cvr_list = [CVR(id="1", card_in_batch=3, votes={"AvB": {"Alice": 1}}, tally_pool="a", pool=True,
+                        sample_num=2**200 + 1, p=0.5, sampled=True),
+                    CVR(id=2, votes={"mayor": {"Alice": 1, "Bob": 2, "Dan": ''}}, sample_num=np.int64(7))]
+        cvr_list = PhantomCVRs(cvr_list, 1)
+        path = tmp_path / "cvrs.ndjson"
+        assert CVR.write_ndjson(cvr_list, path) == 3
+        assert [str(c) for c in CVR.iter_ndjson(path)] == [str(c) for c in cvr_list]
+        # MVRs can be appended as they are entered
+        CVR.write_ndjson([CVR(id="4", votes={})], path, append=True)
+        with open(path) as f:
+            mvrs = CVR.read_ndjson(f)
+        assert [c.id for c in mvrs] == ["1", 2, "phantom-1", "4"]
+        assert mvrs[2].phantom and not mvrs[3].phantom and mvrs[0].card_in_batch == 3
+        with open(path, "a") as f:
+            f.write("\n[]\n")
+        with pytest.raises(ValueError, match="line 6"):
+            CVR.read_ndjson(path)
+
+    def test_merge_cvrs_external(self, tmp_path):
+        def records():
+            rng = np.random.default_rng(12345)
+            for i in range(200):
+                id = int(rng.integers(40))
+                yield CVR(id=str(id) if id % 3 else id, votes={f"c{i % 7}": {f"x{i % 5}": i}},
+                          phantom=bool(rng.integers(2)), pool=bool(rng.integers(4) == 0),
+                          tally_pool=None if rng.integers(2) else f"tp{id}")
+        expected = [str(c) for c in CVR.merge_cvrs(list(records()))]
+        for max_in_memory in [1, 7, 1000]:
+            merged = CVR.merge_cvrs(records(), max_in_memory=max_in_memory, tmp_dir=tmp_path)
+            assert [str(c) for c in merged] == expected
+        conflict = [CVR(id="1", tally_pool="a"), CVR(id="2"), CVR(id="1", tally_pool="b")]
+        with pytest.raises(ValueError):
+            CVR.merge_cvrs(conflict, max_in_memory=2)
+        with pytest.raises(ValueError):
+            CVR.merge_cvrs(conflict)
+
+    def test_merge_cvrs_pool(self):
+        def records():
+            return [CVR(id="1", votes={"a": {"x": 1}}), CVR(id="1", votes={"b": {"y": 1}}),
+                    CVR(id="2", votes={"a": {"x": 1}}, pool=True), CVR(id="2", votes={"b": {"y": 1}}),
+                    CVR(id="3", votes={"a": {"x": 1}}), CVR(id="3", votes={"b": {"y": 1}}, pool=True),
+                    CVR(id="4", votes={"a": {"x": 1}})]
+        for merged in [CVR.merge_cvrs(records()), CVR.merge_cvrs(records(), max_in_memory=2)]:
+            # pool is the union of the pool values of the CVRs with the id, not the merged CVR itself
+            assert [c.pool for c in merged] == [False, True, True, False]
+            assert all(isinstance(c.pool, bool) for c in merged)
+            assert "pool: False" in str(merged[0])
+
     def test_make_phantoms(self):
         audit = Audit.from_dict({'strata': {'stratum_1': {'max_cards':   8,
                                           'use_style':   True,
@@ -221,6 +308,68 @@ class TestCVR:
         assert np.sum([c.has_contest('city_council') and not c.phantom for c in cvr_list]) ==  5
         assert np.sum([c.has_contest('measure_1') and not c.phantom for c in cvr_list]) == 4
 
+    def test_make_phantoms_virtual(self):
+        contest_dict = {'city_council': {'id': 'city_council', 'cards': None, 'choice_function': 'plurality',
+                                         'n_winners': 3, 'sample_size': 4},
+                        'measure_1': {'id': 'measure_1', 'cards': 5, 'choice_function': 'supermajority',
+                                      'n_winners': 1, 'sample_size': 3}}
+        cvrs = [CVR(id="1", votes={"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}),
+                CVR(id="2", votes={"city_council": {"Bob": 1}, "measure_1": {"yes": 1}}),
+                CVR(id="3", votes={"city_council": {"Bob": 1}, "measure_1": {"no": 1}}),
+                CVR(id="4", votes={"city_council": {"Charlie": 1}}),
+                CVR(id="5", votes={"city_council": {"Doug": 1}}),
+                CVR(id="6", votes={"measure_1": {"no": 1}})]
+        for use_style in [True, False]:
+            audit = Audit.from_dict({'strata': {'stratum_1': {'max_cards': 9, 'use_style': use_style}}})
+            contests = Contest.from_dict_of_dicts(contest_dict)
+            cvr_list, phantoms = CVR.make_phantoms(audit, contests, cvrs)
+            virtual_contests = Contest.from_dict_of_dicts(contest_dict)
+            virtual, virtual_phantoms = CVR.make_phantoms(audit, virtual_contests, cvrs, virtual=True)
+            assert isinstance(virtual, PhantomCVRs)
+            assert virtual_phantoms == phantoms == (4 if use_style else 3)
+            assert [str(c) for c in virtual] == [str(c) for c in cvr_list]
+            assert [str(c) for c in virtual[-2:]] == [str(c) for c in cvr_list[-2:]]
+            for c in contests:
+                assert virtual_contests[c].cvrs == contests[c].cvrs
+            # sample numbers, sorting, and sampling match the materialized phantoms
+            CVR.assign_sample_nums(cvr_list, SHA256(1234567890))
+            CVR.assign_sample_nums(virtual, SHA256(1234567890))
+            assert [c.sample_num for c in virtual] == [c.sample_num for c in cvr_list]
+            sample = CVR.consistent_sampling(cvr_list, contests)
+            assert CVR.consistent_sampling(virtual, virtual_contests) == sample
+            assert [c.sampled for c in virtual] == [c.sampled for c in cvr_list]
+            CVR.sort_cvr_sample_num(cvr_list)
+            CVR.sort_cvr_sample_num(virtual)
+            assert [str(c) for c in virtual] == [str(c) for c in cvr_list]
+            phantom = next(i for i, c in enumerate(virtual) if c.phantom)
+            assert virtual.is_phantom(phantom) and not virtual.is_phantom(virtual.order.tolist().index(0))
+            assert virtual[phantom].update_votes({"measure_2": {}})
+            assert virtual[phantom].has_contest("measure_2")
+            for c in cvrs:
+                c.sampled = False
+
+    def test_phantom_ids(self):
+        # assigning an id to a virtual phantom renames it in the list, as for a materialized phantom
+        virtual = PhantomCVRs([CVR(id="a_1", votes={})], 2, prefix="phantom_")
+        for c in virtual:
+            c.id = str(c.id).replace("_", "-")
+        assert [c.id for c in virtual] == ["a-1", "phantom-1", "phantom-2"]
+        assert virtual[1].phantom and virtual.changed_ids == {0: "phantom-1", 1: "phantom-2"}
+        virtual.sort(key=lambda c: c.id, reverse=True)
+        assert [c.id for c in virtual] == ["phantom-2", "phantom-1", "a-1"]
+
+    def test_phantom_votes(self):
+        # changes made in place to the votes of a virtual phantom persist, as for a CVR
+        virtual = PhantomCVRs([CVR(id="1", votes={})], 2, contest_phantoms={"B": 1})
+        assert virtual[1].has_contest("B") and not virtual[2].has_contest("B") and virtual.changed_votes == {}
+        virtual[1].votes["A"] = {"Alice": 1}
+        virtual[2].votes["A"] = {}
+        virtual[1].votes["B"]["Bob"] = 1
+        assert virtual[1].votes == {"B": {"Bob": 1}, "A": {"Alice": 1}}
+        assert virtual[2].votes == {"A": {}}
+        assert virtual[1].has_contest("A") and virtual[2].has_contest("A") and not virtual[2].has_contest("B")
+        assert virtual[1].get_vote_for("A", "Alice") == 1
+
     def test_assign_sample_nums(self):
         cvrs = [CVR(id="1", votes={"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}, phantom=False),
                     CVR(id="2", votes={"city_council": {"Bob": 1},   "measure_1": {"yes": 1}}, phantom=False),
@@ -273,6 +422,24 @@ class TestCVR:
         np.testing.assert_approx_equal(con_tests['city_council'].sample_threshold, 2)
         np.testing.assert_approx_equal(con_tests['measure_1'].sample_threshold, 5)
 
+    def test_prep_comparison_sample(self):
+        cvr_sample = [CVR(id=i, votes={"AvB": {"Alice": 1}}) for i in ["a", "b", "c"]]
+        mvr_sample = [CVR(id=i, votes={"AvB": {"Bob": 1}}) for i in ["c", "a", "b"]]
+        sample_order = {"a": {"selection_order": 2}, "b": {"selection_order": 0}, "c": {"selection_order": 1}}
+        CVR.prep_comparison_sample(mvr_sample, cvr_sample, sample_order)
+        assert [c.id for c in cvr_sample] == ["b", "c", "a"]
+        assert [c.id for c in mvr_sample] == ["b", "c", "a"]
+        # a list of ids in selection order is equivalent
+        CVR.prep_comparison_sample(mvr_sample, cvr_sample, ["c", "a", "b"])
+        assert [c.id for c in mvr_sample] == [c.id for c in cvr_sample] == ["c", "a", "b"]
+        mvr_rows, cvr_rows = CVR.align_by_id(mvr_sample[::-1], CVRTable.from_cvrs(cvr_sample))
+        assert list(mvr_rows) == [2, 1, 0] and list(cvr_rows) == [0, 1, 2]
+        # every mismatch is reported at once
+        bad = [CVR(id=i) for i in ["a", "d", "d"]]
+        with pytest.raises(ValueError, match=r"2 CVRs have no MVR: \['c', 'b'\].*1 MVRs have no CVR: \['d'\].*"
+                                             r"repeated MVR ids: \['d'\]"):
+            CVR.align_by_id(bad, cvr_sample)
+
     def test_tabulate_styles(self):
         cvrs = [CVR(id="1", votes={"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}, phantom=False),
                 CVR(id="2", votes={"city_council": {"Bob": 1}, "measure_1": {"yes": 1}}, phantom=False),
@@ -309,6 +476,39 @@ class TestCVR:
         assert d['city_council']['Doug'] == 1
         assert d['measure_1']['no'] == 4
 
+    def test_set_card_in_batch_lex_bulk(self):
+        rng = np.random.default_rng(12345)
+        cvr_dicts = [{'id': f"{rng.integers(30)}-{rng.integers(30)}", 'votes': {},
+                      'tally_pool': [None, "A", "B", 3][rng.integers(4)]} for _ in range(300)]
+        cvrs = CVR.from_dict(cvr_dicts)
+        # reference: position of the first occurrence of the id in the sorted ids of its tally_pool
+        expected_dict = defaultdict(list)
+        for c in cvrs:
+            expected_dict[c.tally_pool].append(c.id)
+        for id_list in expected_dict.values():
+            id_list.sort()
+        expected = [expected_dict[c.tally_pool].index(c.id) for c in cvrs]
+        tally_pool_dict, positions = CVR.set_card_in_batch_lex(cvrs, return_positions=True)
+        assert tally_pool_dict == expected_dict
+        assert list(tally_pool_dict) == list(expected_dict)
+        assert [c.card_in_batch for c in cvrs] == expected
+        assert positions.tolist() == expected
+        table = CVRTable.from_cvrs(CVR.from_dict(cvr_dicts))
+        assert CVR.set_card_in_batch_lex(table) == expected_dict
+        assert table.card_in_batch.tolist() == expected
+        assert CVR.set_card_in_batch_lex([]) == {}
+
+    def test_set_card_in_batch_lex_mixed_ids(self):
+        # ids of different types in different tally_pools are never compared
+        def cvrs():
+            return [CVR(id=1, tally_pool="p1"), CVR(id="phantom-1", tally_pool="p2"), CVR(id=2, tally_pool="p1")]
+        cvr_list = cvrs()
+        assert CVR.set_card_in_batch_lex(cvr_list) == {"p1": [1, 2], "p2": ["phantom-1"]}
+        assert [c.card_in_batch for c in cvr_list] == [0, 0, 1]
+        table = CVRTable.from_cvrs(cvrs())
+        assert CVR.set_card_in_batch_lex(table) == {"p1": [1, 2], "p2": ["phantom-1"]}
+        assert table.card_in_batch.tolist() == [0, 0, 1]
+
     def test_set_card_in_batch_lex(self):
         cvrs = [CVR(id="B-100", votes={"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}, phantom=False,
                    tally_pool="A"),
@@ -340,6 +540,81 @@ class TestCVR:
         assert cvrs[7].card_in_batch == 1
         
 
+
+class TestCompactCVR:
+
+    cvr_dicts = [{'id': 1, 'votes': {'AvB': {}, 'CvD': {'Candy': True}}},
+                 {'id': 2, 'votes': {'CvD': {'Elvis': True, 'Candy': False}}},
+                 {'id': 3, 'votes': {'mayor': {'Alice': 1, 'Bob': 2, 'Candy': 3, 'Dan': ''}}}]
+
+    def test_matches_cvr(self):
+        cvr_list = CVR.from_dict(self.cvr_dicts)
+        compact = CompactCVR.from_dict(self.cvr_dicts)
+        assert all(isinstance(c, CompactCVR) for c in compact)
+        for c, d in zip(cvr_list, compact):
+            assert str(c) == str(d)
+            for con in ['AvB', 'CvD', 'mayor', 'EvF']:
+                assert c.has_contest(con) == d.has_contest(con)
+                for cand in ['Alice', 'Bob', 'Candy', 'Dan', 'Elvis', 'Zed']:
+                    v = d.get_vote_for(con, cand)
+                    assert v == c.get_vote_for(con, cand)
+                    assert type(v) == type(c.get_vote_for(con, cand))
+        assert [str(c) for c in CompactCVR.from_cvrs(cvr_list)] == [str(c) for c in cvr_list]
+
+    def test_update_votes(self):
+        cvr_list = CVR.from_dict(self.cvr_dicts)
+        compact = CompactCVR.from_dict(self.cvr_dicts)
+        for cvrs in [cvr_list, compact]:
+            assert cvrs[0].update_votes({'QvR': {}})
+            assert not cvrs[0].update_votes({'CvD': {'Dan': 7}})
+            assert cvrs[1].update_votes({'QvR': {}, 'CvD': {'Dan': 7, 'Elvis': False, 'Candy': True}})
+        assert [str(c) for c in compact] == [str(c) for c in cvr_list]
+        assert compact[1].votes == {'CvD': {'Elvis': False, 'Candy': True, 'Dan': 7}, 'QvR': {}}
+
+    def test_slots(self):
+        c = CompactCVR(id=1, votes={'AvB': {'Alice': 1}})
+        assert not hasattr(c, '__dict__')
+        with pytest.raises(AttributeError):
+            c.color = 'red'
+        assert c.contests.get('AvB') >= 0
+        d = CompactCVR(id=2)
+        assert d.votes == {}
+        assert d.contests is not c.contests  # constructed on its own: tables of its own
+        assert CVR(id=1).votes is not CVR(id=2).votes
+
+    def test_interning(self, tmp_path):
+        compact = CompactCVR.from_dict(self.cvr_dicts)
+        assert all(c.contests is compact[0].contests for c in compact)
+        assert CompactCVR.from_dict(self.cvr_dicts[:1])[0].contests is not compact[0].contests
+        with CompactCVR.interning() as interned:
+            a, b = CompactCVR(id=1, votes={'AvB': {}}), CompactCVR(id=2, votes={'CvD': {}})
+        assert a.contests is b.contests is interned.contests
+        assert list(interned.contests) == ['AvB', 'CvD']
+        CVR.write_ndjson(CVR.from_dict(self.cvr_dicts), tmp_path / 'cvrs.ndjson')
+        read = list(CompactCVR.iter_ndjson(tmp_path / 'cvrs.ndjson'))
+        assert [str(c) for c in read] == [str(c) for c in compact]
+        assert all(c.contests is read[0].contests for c in read)
+        # pickling carries the votes, not the tables
+        copy = pickle.loads(pickle.dumps(compact[2]))
+        assert str(copy) == str(compact[2])
+        assert copy.contests is not compact[2].contests
+        merged = CVR.merge_cvrs(compact + compact, max_in_memory=2)
+        assert [str(c) for c in merged] == [str(c) for c in compact]
+        assert all(c.contests is merged[0].contests for c in merged)
+
+    def test_from_raire(self):
+        raire_cvrs = [['1'],
+                      ["Contest","339","5","15","16","17","18","45"],
+                      ["339","99813_1_1","17"],
+                      ["339","99813_1_6","18","17","15","16"],
+                      ["3","99813_1_6","2"]
+                     ]
+        c, n = CompactCVR.from_raire(raire_cvrs)
+        assert isinstance(c[1], CompactCVR)
+        assert c[1].votes == {'339': {'18':1, '17':2, '15':3, '16':4}, '3': {'2':1}}
+        assert c[1].get_vote_for('339', '15') == 3
+
+
 ##########################################################################################
 if __name__ == "__main__":
     sys.exit(pytest.main(["-qq"], plugins=None))
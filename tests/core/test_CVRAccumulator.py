@@ -0,0 +1,58 @@
+import sys
+import pytest
+
+from shangrla.core.Audit import Contest, CVR
+from shangrla.core.CVRAccumulator import CardCounts, CVRAccumulator, PoolContests, Tallies
+from shangrla.formats.Dominion import Dominion
+from shangrla.formats.Hart import Hart
+
+#######################################################################################################
+
+
+class TestCVRAccumulator:
+
+    con_dict = {'1': {'id': '1', 'n_winners': 1, 'cards': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY},
+                '2': {'id': '2', 'n_winners': 1, 'cards': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY}}
+
+    def test_dominion(self):
+        contests = Contest.from_dict_of_dicts(self.con_dict)
+        cards, pools, tallies = CardCounts(), PoolContests(), Tallies(contests)
+        directory = "tests/core/data/Dominion_CVRs/CVR_Export"
+        cvr_list = Dominion.read_cvrs_directory(directory, pool_groups=[2], accumulators=[cards, pools, tallies])
+        assert cards.result() == CVR.tabulate_cards_contests(cvr_list)
+        assert pools.result() == CVR.pool_contests(cvr_list)
+        expected = Contest.from_dict_of_dicts(self.con_dict)
+        Contest.tally(expected, cvr_list)
+        assert tallies.result() == {c: expected[c].tally for c in expected}
+        assert contests['1'].tally == expected['1'].tally
+        checked = Contest.from_dict_of_dicts(self.con_dict)
+        with pytest.raises(ValueError):
+            Contest.check_cards(checked, None, counts=cards.result())
+        Contest.check_cards(checked, None, force=True, counts=cards.result())
+        assert checked['1'].cards == cards.result()['1'] == 2
+        assert checked['2'].cards == 1
+        # the streaming reader updates the accumulators as the CVRs are consumed
+        cards = CardCounts()
+        stream = Dominion.iter_cvrs(f"{directory}/CvrExport_0.json", accumulators=[cards])
+        next(stream)
+        assert sum(cards.result().values()) == len(next(iter(Dominion.read_cvrs(f"{directory}/CvrExport_0.json"))).votes)
+
+    def test_raire_and_hart(self):
+        cards = CardCounts()
+        cvr_list, _, _ = CVR.from_raire_file("tests/raire/data/Aspen_2009_Mayor.raire", accumulators=[cards])
+        assert cards.result() == CVR.tabulate_cards_contests(cvr_list)
+        cards, pools = CardCounts(), PoolContests()
+        cvr_list = Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip", accumulators=[cards, pools])
+        assert cards.result() == CVR.tabulate_cards_contests(cvr_list)
+        assert pools.result() == {}
+
+    def test_feed(self):
+        cvrs = [CVR(id=1, votes={'a': {}}), CVR(id=2, votes={'a': {}, 'b': {}})]
+        assert list(CVRAccumulator.feed(cvrs)) == cvrs
+        with pytest.raises(TypeError):
+            CVRAccumulator()
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
@@ -0,0 +1,96 @@
+import os
+import shutil
+import sys
+import time
+import pytest
+
+from shangrla.core.Audit import CVR, CompactCVR
+from shangrla.core.CVRCache import CVRCache
+from shangrla.core.CVRTable import CVRTable
+from shangrla.formats.Dominion import Dominion
+from shangrla.formats.Hart import Hart
+
+#######################################################################################################
+
+
+class TestCVRCache:
+
+    raire_file = "tests/raire/data/Aspen_2009_Mayor.raire"
+
+    def test_load_raire(self, tmp_path):
+        cache = CVRCache(tmp_path / "cache")
+        expected = CVR.from_raire_file(self.raire_file)
+        for hits in [0, 1]:
+            cvrs, cvrs_read, unique_ids = cache.load(CVR.from_raire_file, self.raire_file)
+            assert cache.hits == hits
+            assert (cvrs_read, unique_ids) == expected[1:]
+            assert [str(c) for c in cvrs] == [str(c) for c in expected[0]]
+        table, _, _ = cache.load(CVR.from_raire_file, self.raire_file, as_table=True)
+        assert isinstance(table, CVRTable)
+        assert len(table) == len(expected[0])
+
+    def test_load_type(self, tmp_path):
+        # a hit returns CVRs of the same class as a miss
+        cache = CVRCache(tmp_path / "cache")
+        MyCVR = type("MyCVR", (CVR,), {})
+        for reader in [CVR.from_raire_file, CompactCVR.from_raire_file, MyCVR.from_raire_file]:
+            miss, _, _ = cache.load(reader, self.raire_file)
+            hit, _, _ = cache.load(reader, self.raire_file)
+            assert type(miss[0]) is type(hit[0]) is reader.__self__
+            assert [str(c) for c in hit] == [str(c) for c in miss]
+
+    def test_options_and_invalidation(self, tmp_path):
+        src = tmp_path / "CVR_Export"
+        shutil.copytree("tests/core/data/Dominion_CVRs/CVR_Export", src)
+        cache = CVRCache(tmp_path / "cache")
+        pooled = cache.load(Dominion.read_cvrs_directory, src, pool_groups=[2])
+        assert [c.pool for c in pooled] == [False, True]
+        assert [c.pool for c in cache.load(Dominion.read_cvrs_directory, src)] == [False, False]
+        assert cache.misses == 2
+        assert [c.pool for c in cache.load(Dominion.read_cvrs_directory, src, pool_groups=[2])] == [False, True]
+        assert cache.hits == 1
+        # changing a source file changes the key
+        os.remove(src / "CvrExport_1.json")
+        assert len(cache.load(Dominion.read_cvrs_directory, src, pool_groups=[2])) == 1
+        assert cache.misses == 3
+        assert len(cache.entries()) == 3
+        assert cache.invalidate() == 3
+        assert cache.entries() == []
+
+    def test_key(self, tmp_path):
+        cache = CVRCache(tmp_path / "cache")
+        key = cache.key(CVR.from_raire_file, self.raire_file)
+        assert cache.key(CompactCVR.from_raire_file, self.raire_file) != key
+        # an inherited classmethod has the qualname of the base class; the class it is bound to tells them apart
+        MyCVR = type("MyCVR", (CVR,), {})
+        assert MyCVR.from_raire_file.__qualname__ == CVR.from_raire_file.__qualname__
+        assert cache.key(MyCVR.from_raire_file, self.raire_file) != key
+        assert cache.key(CVR.from_raire_file, self.raire_file) == key
+        assert (cache.key(Hart.read_cvrs_zip, self.raire_file, contest_ids={"MAYOR", "PRESIDENT"})
+                == cache.key(Hart.read_cvrs_zip, self.raire_file, contest_ids={"PRESIDENT", "MAYOR"}))
+        for option in [lambda c: c, object()]:
+            with pytest.raises(ValueError):
+                cache.key(Hart.read_cvrs_zip, self.raire_file, contest_ids=option)
+
+    def test_lru_eviction(self, tmp_path):
+        cache = CVRCache(tmp_path / "cache")
+        cvr_list = CVR.from_dict([{'id': i, 'votes': {'AvB': {'Alice': i}}} for i in range(50)])
+        for k in ["a", "b", "c"]:
+            cache.put(k, cvr_list)
+            time.sleep(0.01)
+        size = os.path.getsize(cache.path("a"))
+        cache.get("a")  # "b" is now the least recently used
+        cache.max_bytes = 2 * size + size // 2
+        assert cache.evict() == 1
+        assert not os.path.exists(cache.path("b"))
+        assert cache.get("b") == (None, [])
+        cvrs, extra = cache.get("a")
+        assert [str(c) for c in cvrs] == [str(c) for c in CVRTable.from_cvrs(cvr_list)]
+        cache.put("d", cvr_list)
+        assert os.path.exists(cache.path("d"))
+        assert len(cache.entries()) == 2
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
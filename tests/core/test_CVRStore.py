@@ -0,0 +1,100 @@
+import sys
+import numpy as np
+import pytest
+from cryptorandom.cryptorandom import SHA256
+
+from shangrla.core.Audit import Contest, CVR
+from shangrla.core.CVRStore import CVRStore
+from shangrla.core.CVRTable import CVRTable
+
+#######################################################################################################
+
+
+class TestCVRStore:
+
+    cvr_dicts = [
+        {'id': "1", 'tally_pool': 'a', 'pool': True, 'votes': {"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}},
+        {'id': "2", 'tally_pool': 'a', 'pool': True, 'votes': {"city_council": {"Bob": 1}}},
+        {'id': "3", 'sample_num': 7, 'p': 0.5, 'votes': {"city_council": {"Bob": 1}, "measure_1": {"no": 1}}},
+        {'id': "4", 'card_in_batch': 2, 'votes': {"city_council": {"Charlie": 1, "Bob": 0}}},
+        {'id': "5", 'votes': {"city_council": {"Doug": ''}}},
+        {'id': "6", 'tally_pool': 'b', 'pool': True, 'votes': {"measure_1": {"no": True}}},
+        {'id': 7, 'votes': {"city_council": {"Alice": 1}, "measure_1": {"yes": 1}, "measure_2": {"no": 1}}},
+        {'id': "8", 'votes': {"measure_1": {"no": 1}, "measure_2": {"yes": 1}}},
+        {'id': "9", 'phantom': True, 'votes': {"measure_1": {}, "measure_3": {"yes": 1}}},
+    ]
+
+    def cvrs(self):
+        return CVR.from_dict([{'sampled': False, **d, 'votes': {k: dict(v) for k, v in d['votes'].items()}}
+                              for d in self.cvr_dicts])
+
+    def test_round_trip(self, tmp_path):
+        cvr_list = self.cvrs()
+        with CVRStore.from_cvrs(cvr_list, tmp_path / "cvrs.db") as store:
+            assert len(store) == len(cvr_list)
+            assert [str(c) for c in store] == [str(c) for c in cvr_list]
+            assert str(store[-1]) == str(cvr_list[-1])
+            assert [str(c) for c in store[2:4]] == [str(c) for c in cvr_list[2:4]]
+        # reopening the database finds the CVRs; adding appends
+        store = CVRStore(tmp_path / "cvrs.db")
+        assert store.add(CVRTable.from_cvrs(cvr_list[:2])) == 2
+        assert len(store) == len(cvr_list) + 2
+        assert str(store[len(cvr_list) + 1]) == str(cvr_list[1])
+        with pytest.raises(IndexError):
+            store[len(store)]
+
+    def test_lookups(self):
+        cvr_list = self.cvrs()
+        store = CVRStore.from_cvrs(cvr_list)
+        assert str(store.get("4")) == str(cvr_list[3])
+        assert store.get(7).id == 7
+        assert store.get("7") is None and store.position("7") == -1
+        assert store.position("8") == 7
+        assert [c.id for c in store.in_tally_pool('a')] == ["1", "2"]
+        assert store.tally_pools() == ['a', 'b']
+        assert [c.id for c in store.with_contest("measure_2")] == [7, "8"]
+        assert list(store.has_contest("measure_1")) == [c.has_contest("measure_1") for c in cvr_list]
+        store.put(4, CVR(id="5", votes={"measure_2": {"yes": 1}}))
+        assert [c.id for c in store.with_contest("measure_2")] == ["5", 7, "8"]
+        assert not store.has_contest("city_council")[4]
+
+    def test_sampling(self):
+        cvr_list = self.cvrs()
+        store = CVRStore.from_cvrs(cvr_list)
+        CVR.assign_sample_nums(cvr_list, SHA256(1234567890))
+        CVR.assign_sample_nums(store, SHA256(1234567890))
+        assert [c.sample_num for c in store] == [c.sample_num for c in cvr_list]
+        contest_dict = {'city_council': {'id': 'city_council', 'sample_size': 3},
+                        'measure_1': {'id': 'measure_1', 'sample_size': 4}}
+        contests = Contest.from_dict_of_dicts(contest_dict)
+        store_contests = Contest.from_dict_of_dicts(contest_dict)
+        sample = CVR.consistent_sampling(cvr_list, contests)
+        assert CVR.consistent_sampling(store, store_contests) == sample
+        assert [c.sampled for c in store] == [c.sampled for c in cvr_list]
+        for c in contests:
+            assert contests[c].sample_threshold == store_contests[c].sample_threshold
+        with pytest.raises(ValueError):
+            store.set_sample_nums([0.5])
+
+    def test_sample_num_list(self, monkeypatch):
+        cvr_list = self.cvrs()
+        store = CVRStore.from_cvrs(cvr_list)
+        CVR.assign_sample_nums(store, SHA256(1234567890))
+        sample_nums = [c.sample_num for c in store]
+        idx = np.array([8, 0, 3, 3, 5])
+        monkeypatch.setattr(CVRStore, "MAX_PARAMS", 2)  # several chunks, with a repeated position
+        assert store.sample_num_list(idx) == [sample_nums[i] for i in idx]
+        assert store.sample_num_list([]) == []
+        with pytest.raises(IndexError):
+            store.sample_num_list([1, len(store)])
+
+    def test_assorter_mean(self, plur_cvr_list, raw_AvB_asrtn):
+        store = CVRStore.from_cvrs(plur_cvr_list)
+        assert raw_AvB_asrtn.assorter.mean(store) == raw_AvB_asrtn.assorter.mean(plur_cvr_list)
+        assert raw_AvB_asrtn.assorter.mean(store.with_contest("AvB")) == \
+            raw_AvB_asrtn.assorter.mean(plur_cvr_list)
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
@@ -0,0 +1,342 @@
+import numpy as np
+import sys
+import pytest
+from cryptorandom.cryptorandom import SHA256
+
+from shangrla.core.Audit import Audit, Assertion, Assorter, Contest, CVR, PhantomCVRs
+from shangrla.core.CVRTable import ContestIndex, CVRTable, InternTable
+from shangrla.core.NonnegMean import NonnegMean
+
+#######################################################################################################
+
+
+class TestCVRTable:
+
+    cvr_dicts = [
+        {'id': "1", 'tally_pool': 'a', 'pool': True, 'votes': {"city_council": {"Alice": 1}, "measure_1": {"yes": 1}}},
+        {'id': "2", 'tally_pool': 'a', 'pool': True, 'votes': {"city_council": {"Bob": 1}}},
+        {'id': "3", 'sample_num': 7, 'p': 0.5, 'votes': {"city_council": {"Bob": 1}, "measure_1": {"no": 1}}},
+        {'id': "4", 'votes': {"city_council": {"Charlie": 1, "Bob": 0}}},
+        {'id': "5", 'votes': {"city_council": {"Doug": 1}}},
+        {'id': "6", 'tally_pool': 'b', 'pool': True, 'votes': {"measure_1": {"no": 1}}},
+        {'id': "7", 'votes': {"city_council": {"Alice": 1}, "measure_1": {"yes": 1}, "measure_2": {"no": 1}}},
+        {'id': "8", 'votes': {"measure_1": {"no": 1}, "measure_2": {"yes": 1}}},
+        {'id': "9", 'votes': {"measure_1": {}, "measure_3": {"yes": 1}}},
+    ]
+
+    def cvrs(self):
+        return CVR.from_dict([{'sampled': False, **d, 'votes': {k: dict(v) for k, v in d['votes'].items()}}
+                              for d in self.cvr_dicts])
+
+    def test_intern_table(self):
+        t = InternTable(["a", "b", "a"])
+        assert len(t) == 2
+        assert t.code("b") == 1
+        assert t.code("c") == 2
+        assert t[2] == "c"
+        assert t.get("d") == -1
+        assert "a" in t
+
+    def test_round_trip(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(cvr_list)
+        assert len(table) == len(cvr_list)
+        for c, d in zip(cvr_list, table.to_cvrs()):
+            assert str(c) == str(d)
+        assert str(table[3]) == str(cvr_list[3])
+        assert [c.id for c in table] == [c.id for c in cvr_list]
+        assert table[2].p == 0.5
+        assert table[2].sample_num == 7
+        assert table[0].tally_pool == 'a'
+        assert table[2].tally_pool is None
+
+    def test_to_from_arrays(self):
+        cvr_list = self.cvrs() + [CVR.from_vote({"Alice": 1, "Bob": 2, "Dan": ''}, id=10)]
+        CVR.assign_sample_nums(cvr_list, SHA256(1234567890))
+        cvr_list[0].sample_num = None
+        table = CVRTable.from_cvrs(cvr_list)
+        arrays = table.to_arrays()
+        assert all(a.dtype != object for a in arrays.values())
+        assert [str(c) for c in CVRTable.from_arrays(arrays)] == [str(c) for c in table]
+
+    def test_save_load(self, tmp_path):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(cvr_list)
+        CVR.assign_sample_nums(table, SHA256(1234567890))
+        table.save(tmp_path / "cvrs")
+        loaded = CVRTable.load(tmp_path / "cvrs")
+        assert isinstance(loaded.vote_cand, np.memmap)
+        assert isinstance(loaded.phantom, np.memmap)
+        assert loaded.sample_num.dtype == np.dtype("S32")
+        assert loaded.sample_num_list() == list(table.sample_num)
+        assert [str(c) for c in loaded] == [str(c) for c in table]
+        assert str(loaded[4]) == str(table[4])
+        # sampling works on the memory-mapped table without changing the files
+        CVR.assign_sample_nums(table, SHA256(987654321))
+        CVR.assign_sample_nums(loaded, SHA256(987654321))
+        assert loaded.sample_num_list() == list(table.sample_num)
+        contest_dict = {'city_council': {'id': 'city_council', 'sample_size': 3},
+                        'measure_1': {'id': 'measure_1', 'sample_size': 4}}
+        contests = Contest.from_dict_of_dicts(contest_dict)
+        loaded_contests = Contest.from_dict_of_dicts(contest_dict)
+        assert CVR.consistent_sampling(loaded, loaded_contests) == CVR.consistent_sampling(table, contests)
+        assert loaded_contests['measure_1'].sample_threshold == contests['measure_1'].sample_threshold
+        assert list(loaded.sampled) == list(table.sampled)
+        assert not CVRTable.load(tmp_path / "cvrs").sampled.any()
+        both = CVRTable.concatenate([loaded, CVRTable.from_cvrs(cvr_list)])
+        assert both.sample_num_list()[:len(table)] == list(table.sample_num)
+
+    def test_mixed_values(self):
+        cvr_list = [CVR.from_vote({"Alice": 1, "Bob": 2, "Dan": ''}, id=1),
+                    CVR.from_vote({"Alice": True}, id=2)]
+        table = CVRTable.from_cvrs(cvr_list)
+        assert table.vote_val.dtype == object
+        assert table[0].votes == {"AvB": {"Alice": 1, "Bob": 2, "Dan": ''}}
+        assert table[1].get_vote_for("AvB", "Alice") is True
+        assert list(table.vote_indicator("AvB", "Dan")) == [0, 0]
+        assert list(table.get_vote_for("AvB", "Bob")) == [2, False]
+
+    def test_take_and_concatenate(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(cvr_list)
+        sub = table[[5, 0, 8]]
+        assert [str(c) for c in sub] == [str(cvr_list[i]) for i in (5, 0, 8)]
+        assert [c.id for c in table[table.pool]] == ["1", "2", "6"]
+        both = CVRTable.concatenate([table[:3], CVRTable.from_cvrs(cvr_list[3:])])
+        assert [str(c) for c in both] == [str(c) for c in cvr_list]
+
+    def test_has_contest(self):
+        table = CVRTable.from_cvrs(self.cvrs())
+        assert list(table.has_contest("measure_1")) == [True, False, True, False, False, True, True, True, True]
+        assert not table.has_contest("no_such_contest").any()
+        assert list(table.vote_indicator("city_council", "Bob")) == [0, 1, 1, 0, 0, 0, 0, 0, 0]
+
+    def test_contest_index(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(self.cvrs())
+        index = ContestIndex.from_cvrs(cvr_list)
+        for con in ["city_council", "measure_1", "measure_2", "measure_3", "no_such_contest"]:
+            mask = [c.has_contest(con) for c in cvr_list]
+            assert list(index.mask(con)) == mask
+            assert list(table.contest_index.mask(con)) == mask
+            assert index.count(con) == sum(mask)
+        assert list(index.positions("measure_2")) == [6, 7]
+        assert index.count("measure_1", where=np.array([c.pool for c in cvr_list])) == 2
+        assert index.counts() == CVR.tabulate_cards_contests(cvr_list)
+        assert CVR.tabulate_cards_contests(cvr_list, contest_index=index) == CVR.tabulate_cards_contests(table)
+        # the index is stale once it is invalidated, e.g., after contests are added
+        assert index.is_current(cvr_list) and ContestIndex.of(cvr_list, index) is index
+        cvr_list[4].update_votes({"measure_3": {}})
+        index.invalidate()
+        assert not index.is_current(cvr_list)
+        assert ContestIndex.of(cvr_list, index).count("measure_3") == 2
+        table_index = table.contest_index
+        assert ContestIndex.of(table, table_index) is table_index
+        table.update_votes([4], ["measure_3"])
+        assert not table_index.is_current(table)
+        assert table.contest_index.count("measure_3") == 2
+        assert not table_index.is_current(table[:5])
+        assert not table.contest_index.is_current(cvr_list) and not index.is_current(table)
+
+    def test_contest_index_source(self):
+        # an index of a list is not used for another list of the same length, or once the list has grown
+        cvr_list = [CVR(id=1, votes={"x": {}}), CVR(id=2, votes={"y": {}})]
+        index = ContestIndex.from_cvrs(cvr_list)
+        other = [CVR(id=2, votes={"y": {}}), CVR(id=1, votes={"x": {}})]
+        assert not index.is_current(other) and not index.is_current(list(cvr_list))
+        assert list(ContestIndex.of(other, index).positions("x")) == [1]
+        assert ContestIndex.of(cvr_list, index) is index
+        cvr_list.append(CVR(id=3, votes={"z": {}}))
+        assert list(ContestIndex.of(cvr_list, index).positions("z")) == [2]
+        # a PhantomCVRs list versions itself
+        virtual = PhantomCVRs(cvr_list, 2, contest_phantoms={"x": 1})
+        index = ContestIndex.from_cvrs(virtual)
+        assert ContestIndex.of(virtual, index) is index
+        virtual[4].update_votes({"z": {}})
+        assert not index.is_current(virtual)
+        assert list(ContestIndex.of(virtual, index).positions("z")) == [2, 4]
+        index = ContestIndex.of(virtual, index)
+        virtual.sort(key=lambda c: str(c.id), reverse=True)
+        assert list(ContestIndex.of(virtual, index).positions("x")) == [1, 4]
+
+    def test_tabulate(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(cvr_list)
+        assert CVR.tabulate_votes(table) == CVR.tabulate_votes(cvr_list)
+        assert CVR.tabulate_styles(table) == CVR.tabulate_styles(cvr_list)
+        assert CVR.tabulate_cards_contests(table) == CVR.tabulate_cards_contests(cvr_list)
+        assert CVR.pool_contests(table) == CVR.pool_contests(cvr_list)
+
+    def test_tally(self):
+        cvr_dict = [{'id': 1, 'votes': {'AvB': {'Alice': True}, 'CvD': {'Candy': True}}},
+                    {'id': 2, 'votes': {'AvB': {'Bob': True}, 'CvD': {'Elvis': True, 'Candy': False}}},
+                    {'id': 3, 'votes': {'CvD': {'Elvis': True, 'Candy': True}}},
+                    {'id': 4, 'votes': {'AvB': {'Alice': 1}, 'CvD': {'Candy': 'yes'}}}]
+        con_dict = {'AvB': {'id': 'AvB', 'n_winners': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY},
+                    'CvD': {'id': 'CvD', 'n_winners': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY}}
+        for enforce_rules in [True, False]:
+            contests = Contest.from_dict_of_dicts(con_dict)
+            Contest.tally(contests, CVR.from_dict(cvr_dict), enforce_rules=enforce_rules)
+            table_contests = Contest.from_dict_of_dicts(con_dict)
+            Contest.tally(table_contests, CVRTable.from_cvrs(CVR.from_dict(cvr_dict)), enforce_rules=enforce_rules)
+            for c in contests:
+                assert contests[c].tally == table_contests[c].tally
+        assert table_contests['CvD'].tally == {'Candy': 3, 'Elvis': 2}
+
+    def test_tabulate_single_pass(self):
+        cvr_dict = [{'id': 1, 'votes': {'AvB': {'Alice': True}, 'CvD': {'Candy': True}}},
+                    {'id': 2, 'votes': {'AvB': {'Bob': True}, 'CvD': {'Elvis': True, 'Candy': False}}},
+                    {'id': 3, 'votes': {'CvD': {'Elvis': True, 'Candy': True}}},
+                    {'id': 4, 'votes': {'AvB': {'Alice': 1, '': 1}, 'CvD': {'Candy': 'yes'}}},
+                    {'id': 5, 'votes': {'IRV': {'Alice': 1, 'Bob': 2}}}]
+        con_dict = {'AvB': {'id': 'AvB', 'n_winners': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY},
+                    'CvD': {'id': 'CvD', 'n_winners': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.PLURALITY},
+                    'IRV': {'id': 'IRV', 'n_winners': 1, 'choice_function': Contest.SOCIAL_CHOICE_FUNCTION.IRV}}
+        cvr_list = CVR.from_dict(cvr_dict)
+        for enforce_rules in [True, False]:
+            contests = Contest.from_dict_of_dicts(con_dict)
+            with pytest.warns(UserWarning):
+                Contest.tally(contests, cvr_list, enforce_rules=enforce_rules)
+            for cvrs in [cvr_list, CVRTable.from_cvrs(cvr_list)]:
+                engine_contests = Contest.from_dict_of_dicts(con_dict)
+                with pytest.warns(UserWarning):
+                    votes, styles, cards = CVR.tabulate(cvrs, engine_contests, enforce_rules=enforce_rules)
+                assert votes == CVR.tabulate_votes(cvr_list)
+                assert styles == CVR.tabulate_styles(cvr_list)
+                assert cards == CVR.tabulate_cards_contests(cvr_list)
+                for c in ['AvB', 'CvD']:
+                    assert list(engine_contests[c].tally.items()) == list(contests[c].tally.items())
+        assert engine_contests['CvD'].tally == {'Candy': 3, 'Elvis': 2}
+        assert CVR.tabulate(cvr_list)[2] == {'AvB': 3, 'CvD': 4, 'IRV': 1}
+
+    def test_add_pool_contests(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(self.cvrs())
+        tally_pools = CVR.pool_contests(cvr_list)
+        assert CVR.add_pool_contests(cvr_list, tally_pools)
+        assert CVR.add_pool_contests(table, tally_pools)
+        assert [str(c) for c in table] == [str(c) for c in cvr_list]
+        assert not CVR.add_pool_contests(table, tally_pools)
+
+    def test_make_phantoms(self):
+        contest_dict = {'city_council': {'id': 'city_council', 'cards': None, 'choice_function': 'plurality',
+                                         'n_winners': 1, 'candidates': ['Alice', 'Bob'], 'winner': ['Alice']},
+                        'measure_1': {'id': 'measure_1', 'cards': 9, 'choice_function': 'plurality',
+                                      'n_winners': 1, 'candidates': ['yes', 'no'], 'winner': ['yes']}}
+        for use_style in [True, False]:
+            audit = Audit.from_dict({'strata': {'stratum_1': {'max_cards': 11, 'use_style': use_style}}})
+            contests = Contest.from_dict_of_dicts(contest_dict)
+            cvr_list, phantoms = CVR.make_phantoms(audit, contests, self.cvrs())
+            table_contests = Contest.from_dict_of_dicts(contest_dict)
+            table, table_phantoms = CVR.make_phantoms(audit, table_contests, CVRTable.from_cvrs(self.cvrs()))
+            assert isinstance(table, CVRTable)
+            assert phantoms == table_phantoms
+            assert [str(c) for c in table] == [str(c) for c in cvr_list]
+            for c in contests:
+                assert contests[c].cvrs == table_contests[c].cvrs
+                assert contests[c].cards == table_contests[c].cards
+
+    def test_sampling(self):
+        cvr_list = self.cvrs()
+        table = CVRTable.from_cvrs(self.cvrs())
+        CVR.assign_sample_nums(cvr_list, SHA256(1234567890))
+        CVR.assign_sample_nums(table, SHA256(1234567890))
+        assert list(table.sample_num) == [c.sample_num for c in cvr_list]
+        contest_dict = {'city_council': {'id': 'city_council', 'sample_size': 3},
+                        'measure_1': {'id': 'measure_1', 'sample_size': 4}}
+        contests = Contest.from_dict_of_dicts(contest_dict)
+        table_contests = Contest.from_dict_of_dicts(contest_dict)
+        sample = CVR.consistent_sampling(cvr_list, contests)
+        assert CVR.consistent_sampling(table, table_contests) == sample
+        assert list(table.sampled) == [c.sampled for c in cvr_list]
+        for c in contests:
+            assert contests[c].sample_threshold == table_contests[c].sample_threshold
+        for c in contests.values():
+            c.sample_size += 2
+            table_contests[c.id].sample_size += 2
+        assert CVR.consistent_sampling(table, table_contests, list(sample)) == \
+            CVR.consistent_sampling(cvr_list, contests, list(sample))
+        assert CVR.sort_cvr_sample_num(table)
+        assert list(table.sample_num) == sorted(c.sample_num for c in cvr_list)
+
+    def test_assorter_mean(self, plur_cvr_list, raw_AvB_asrtn):
+        table = CVRTable.from_cvrs(plur_cvr_list)
+        assert raw_AvB_asrtn.assorter.mean(table) == raw_AvB_asrtn.assorter.mean(plur_cvr_list)
+        assert raw_AvB_asrtn.assorter.sum(table) == raw_AvB_asrtn.assorter.sum(plur_cvr_list)
+        for c in plur_cvr_list:
+            c.pool = True
+        table = CVRTable.from_cvrs(plur_cvr_list)
+        raw_AvB_asrtn.assorter.set_tally_pool_means(plur_cvr_list)
+        means = raw_AvB_asrtn.assorter.tally_pool_means
+        raw_AvB_asrtn.assorter.set_tally_pool_means(table)
+        assert raw_AvB_asrtn.assorter.tally_pool_means == means
+
+    def test_rank_matrix(self):
+        cvr_list = [
+            CVR(id='1', votes={'irv': {'Alice': 1, 'Bob': 2, 'Candy': 3}}),
+            CVR(id='2', votes={'irv': {'Bob': 1, 'Alice': 2}, 'other': {'Dan': 1}}),
+            CVR(id='3', votes={'irv': {'Candy': 2, 'Alice': 2}}),
+            CVR(id='4', votes={'irv': {'Candy': 1, 'Bob': 0}}),
+            CVR(id='5', votes={'other': {'Dan': 1}}),
+        ]
+        table = CVRTable.from_cvrs(cvr_list)
+        candidates, ranks = table.rank_matrix('irv')
+        assert candidates == ['Alice', 'Bob', 'Candy']
+        np.testing.assert_array_equal(ranks[:, 0], [1, 2, 2, np.inf, np.inf])
+        assert table.rank_matrix('irv')[1] is ranks
+        for remaining in [['Alice', 'Bob', 'Candy'], ['Bob', 'Candy'], ['Candy', 'Dan'], []]:
+            candidates, first = table.first_preference('irv', remaining)
+            for j, cand in enumerate(candidates):
+                expected = [c.rcv_votefor_cand('irv', cand, remaining) for c in cvr_list]
+                np.testing.assert_array_equal(first == j, expected)
+        # the first preferences are kept for each remaining set, whatever its order
+        first = table.first_preference('irv', ['Bob', 'Candy'])[1]
+        assert table.first_preference('irv', ['Candy', 'Bob'])[1] is first
+        np.testing.assert_array_equal(first, [1, 1, 2, 2, -1])
+        table.invalidate()
+        assert table.first_preference('irv', ['Candy', 'Bob'])[1] is not first
+
+    def test_assorter_kernels(self, con_test, AvB_IRV):
+        rng = np.random.default_rng(12345)
+        cands = ['Alice', 'Bob', 'Candy', 'Dan']
+        cvr_list = []
+        for i in range(300):
+            ranked = rng.permutation(cands)[:rng.integers(0, 5)]
+            votes = {c: r + 1 for r, c in enumerate(ranked)}
+            if i % 7 == 0:
+                votes = {c: int(rng.integers(1, 3)) for c in ranked}  # repeated ranks
+            cvr_list.append(CVR(id=str(i), votes={'AvB': dict(votes), 'AvB_IRV': dict(votes)}))
+            if i % 5 == 0:
+                cvr_list[-1].votes.pop(['AvB', 'AvB_IRV'][i % 2])  # cards without the contest
+        table = CVRTable.from_cvrs(cvr_list)
+        assertions = list(Assertion.make_plurality_assertions(con_test, ['Alice'], ['Bob', 'Candy']).values())
+        assertions += Assertion.make_supermajority_assertion(con_test, 2/3, 'Alice', ['Bob', 'Candy']).values()
+        json_assertions = [
+            {'winner': 'Alice', 'loser': 'Bob', 'assertion_type': Assertion.WINNER_ONLY},
+            {'winner': 'Bob', 'loser': 'Candy', 'assertion_type': Assertion.IRV_ELIMINATION,
+             'already_eliminated': ['Dan']},
+            {'winner': 'Alice', 'loser': 'Dan', 'assertion_type': Assertion.IRV_ELIMINATION,
+             'already_eliminated': ['Bob', 'Candy']},
+        ]
+        assertions += Assertion.make_assertions_from_json(AvB_IRV, cands, json_assertions).values()
+        assert [a.assorter.spec['kind'] for a in assertions] == [
+            'PLURALITY', 'PLURALITY', 'SUPERMAJORITY', 'IRV_WINNER_ONLY', 'IRV_ELIMINATION', 'IRV_ELIMINATION'
+        ]
+        for a in assertions:
+            expected = [a.assorter.assort(c) for c in cvr_list]
+            np.testing.assert_array_equal(a.assorter.kernel(table), expected)
+            assert a.assorter.mean(table) == pytest.approx(a.assorter.mean(cvr_list))
+        # a custom assorter has no kernel; non-numeric votes fall back to assort
+        custom = Assorter(contest=con_test, assort=lambda c: 1/2)
+        with pytest.raises(ValueError):
+            custom.kernel(table)
+        assert custom.mean(table) == 1/2
+        strings = CVRTable.from_cvrs([CVR(id=1, votes={'AvB_IRV': {'Alice': '1', 'Bob': ''}})])
+        with pytest.raises(TypeError):
+            strings.vote_matrix('AvB_IRV', ['Alice', 'Bob'])
+        assert assertions[3].assorter.mean(strings) == 1/2
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
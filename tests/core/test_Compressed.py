@@ -0,0 +1,54 @@
+import bz2
+import gzip
+import lzma
+import sys
+import pytest
+
+from shangrla.core.Compressed import Compressed
+
+#######################################################################################################
+
+
+class TestCompressed:
+
+    text = "".join(f"line {i}: café\n" for i in range(20000))
+
+    def write(self, tmp_path, compression: str):
+        data = self.text.encode("utf-8")
+        compress = {None: bytes, "gzip": gzip.compress, "bz2": bz2.compress, "xz": lzma.compress}[compression]
+        path = tmp_path / f"data_{compression}"
+        path.write_bytes(compress(data))
+        return path
+
+    @pytest.mark.parametrize("compression", [None, "gzip", "bz2", "xz"])
+    def test_open(self, tmp_path, compression):
+        path = self.write(tmp_path, compression)
+        assert Compressed.compression(path) == compression
+        for background in [True, False]:
+            with Compressed.open(path, encoding="utf-8", background=background, chunk_size=1000) as f:
+                assert f.read() == self.text
+            with Compressed.open(path, "rb", background=background) as f:
+                assert f.read() == self.text.encode("utf-8")
+        # lines can be iterated, and closing before the end stops the background thread
+        with Compressed.open(path, encoding="utf-8", chunk_size=100, depth=1) as f:
+            assert next(iter(f)) == "line 0: café\n"
+        with pytest.raises(ValueError):
+            Compressed.open(path, "w")
+
+    def test_errors(self, tmp_path):
+        path = tmp_path / "truncated.gz"
+        path.write_bytes(gzip.compress(self.text.encode("utf-8"))[:5000])
+        with Compressed.open(path) as f:
+            with pytest.raises(EOFError):
+                f.read()
+
+    def test_suffix(self):
+        assert Compressed.strip_suffix("CvrExport_1.json.gz") == "CvrExport_1.json"
+        assert Compressed.strip_suffix("CvrExport_1.json") == "CvrExport_1.json"
+        assert Compressed.has_suffix("a.xml.zst", ".xml")
+        assert not Compressed.has_suffix("a.xml.bak", ".xml")
+
+
+##########################################################################################
+if __name__ == "__main__":
+    sys.exit(pytest.main(["-qq"], plugins=None))
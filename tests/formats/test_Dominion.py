@@ -1,10 +1,15 @@
+import gzip
+import io
+import lzma
+import os
 import pandas as pd
 import sys
 import pytest
 from pathlib import Path
 
 from shangrla.formats.Dominion import Dominion
-from shangrla.core.Audit import CVR
+from shangrla.core.Audit import CVR, PhantomCVRs
+from shangrla.core.CVRTable import CVRTable
 
 ##########################################################################################
 
@@ -177,6 +182,20 @@ class TestDominion:
         assert cvr_2.get_vote_for("1", "6") is False
         assert cvr_2.get_vote_for("1", "999") is False
 
+    def test_read_cvrs_directory_parallel(self):
+        """
+        Reading with a pool of workers should give the same CVRs in the same order, and record timings
+        """
+        cvr_list = Dominion.read_cvrs_directory("tests/core/data/Dominion_CVRs/CVR_Export", pool_groups=[2])
+        timings = []
+        parallel = Dominion.read_cvrs_directory(
+            "tests/core/data/Dominion_CVRs/CVR_Export", pool_groups=[2], workers=2, timings=timings
+        )
+        assert [str(c) for c in parallel] == [str(c) for c in cvr_list]
+        assert [Path(t["file"]).name for t in timings] == ["CvrExport_0.json", "CvrExport_1.json"]
+        assert [t["cvrs"] for t in timings] == [1, 1]
+        assert all(t["seconds"] >= 0 for t in timings)
+
     def test_sample_from_manifest(self):
         """
         Test the card lookup function
@@ -273,6 +292,104 @@ class TestDominion:
             '12-101-14',
             '12-102-15',
         ]
+        # a lookup built once gives the same cards
+        lookup = Dominion.manifest_lookup(manifest)
+        assert Dominion.sample_from_cvrs(cvr_list, manifest, sample, lookup=lookup)[0] == cards
+
+        # phantoms with the default prefix, represented virtually
+        cvr_list = PhantomCVRs(cvr_list, 3)
+        cards, sample_order, cvr_sample, mvr_phantoms = Dominion.sample_from_cvrs(cvr_list, manifest, [2, 301, 300])
+        assert [cvr.id for cvr in cvr_sample] == ['10-100-3', 'phantom-2', 'phantom-1']
+        assert [mvr.id for mvr in mvr_phantoms] == ['phantom-2', 'phantom-1']
+        assert cards[1] == ["", "", "phantom", "1", "", "phantom-1"]
+        assert sample_order['phantom-1'] == {"selection_order": 2, "serial": 301}
+
+
+    def test_iter_cvrs(self):
+        """
+        The streaming reader should give the same CVRs as read_cvrs, whatever the chunk size
+        """
+        for file, kwargs in [("tests/core/data/Dominion_CVRs/test_5.2.18.2.Dominion.json",
+                              {"use_current": False, "enforce_rules": False, "pool_groups": [1]}),
+                             ("tests/core/data/Dominion_CVRs/test_5.10.50.85.Dominion.json",
+                              {"include_groups": [2]}),
+                             ("tests/core/data/Dominion_CVRs/test_5.10.50.85.Dominion.json", {})]:
+            cvr_list = Dominion.read_cvrs(file, **kwargs)
+            for chunk_size in [1, 10, 1000]:
+                streamed = list(Dominion.iter_cvrs(file, chunk_size=chunk_size, **kwargs))
+                assert [str(c) for c in streamed] == [str(c) for c in cvr_list]
+
+    def test_iter_sessions(self):
+        doc = '{"Version": "5.10", "Count": 12345, "Sessions" : [ {"RecordId": 1, "Name": "a]b"},\n{"RecordId": 2}] ,"After": {}}'
+        for chunk_size in [1, 3, 100]:
+            sessions = list(Dominion.iter_sessions(io.StringIO(doc), chunk_size))
+            assert sessions == [{"RecordId": 1, "Name": "a]b"}, {"RecordId": 2}]
+        assert list(Dominion.iter_sessions(io.StringIO('{"Sessions": []}'))) == []
+        with pytest.raises(ValueError):
+            list(Dominion.iter_sessions(io.StringIO('[{"RecordId": 1}]')))
+        for doc in ['{}', '{"Version": "5.10", "Count": 1}']:
+            with pytest.raises(ValueError, match="Sessions"):
+                list(Dominion.iter_sessions(io.StringIO(doc)))
+        with pytest.raises(ValueError):
+            list(Dominion.iter_sessions(io.StringIO('{"Sessions": [{"RecordId": 1}, {"Reco'), 4))
+
+    def test_raire_to_dominion(self):
+        # the id index of a table is rebuilt after its ids are rewritten
+        table = CVRTable.from_cvrs([CVR(id="1_1", votes={"A": {"x": 1}}), CVR(id="1_2", votes={"A": {"y": 1}})])
+        assert CVR.index_ids(table) == {"1_1": 0, "1_2": 1}
+        Dominion.raire_to_dominion(table)
+        assert CVR.index_ids(table) == {"1-1": 0, "1-2": 1}
+        mvrs = [CVR(id="1-2", votes={"A": {"y": 1}}), CVR(id="1-1", votes={"A": {"x": 1}})]
+        mvr_rows, cvr_rows = CVR.align_by_id(mvrs, table)
+        assert list(mvr_rows) == [1, 0] and list(cvr_rows) == [0, 1]
+
+    def test_contest_ids_and_tabulators(self):
+        file = "tests/core/data/Dominion_CVRs/test_5.10.50.85.Dominion.json"
+        cvr_list = Dominion.read_cvrs(file)
+        projected = Dominion.read_cvrs(file, contest_ids=[1, "13"])
+        assert [c.id for c in projected] == [c.id for c in cvr_list]
+        for c, p in zip(cvr_list, projected):
+            assert p.votes == {con: v for con, v in c.votes.items() if con in ("1", "13")}
+        assert Dominion.read_cvrs(file, include_tabulators=[2]) == []
+        directory = "tests/core/data/Dominion_CVRs/CVR_Export"
+        assert [c.votes for c in Dominion.read_cvrs_directory(directory, contest_ids=[])] == [{}, {}]
+        index = Dominion.index_cvrs(file)
+        assert Dominion.load_cvrs_by_id(index, ["1-17-123456789"], contest_ids=["12"])[0].votes == \
+            {"12": cvr_list[2].votes["12"]}
+
+    def test_index_cvrs(self, tmp_path):
+        directory = "tests/core/data/Dominion_CVRs/CVR_Export"
+        cvr_list = Dominion.read_cvrs_directory(directory, pool_groups=[2])
+        index = Dominion.index_cvrs(directory)
+        assert sorted(index) == sorted(c.id for c in cvr_list)
+        ids = [cvr_list[-1].id, cvr_list[0].id]
+        loaded = Dominion.load_cvrs_by_id(index, ids, pool_groups=[2])
+        assert [str(c) for c in loaded] == [str(cvr_list[-1]), str(cvr_list[0])]
+        with pytest.raises(ValueError):
+            Dominion.load_cvrs_by_id(index, ["no-such-id"])
+        # offsets are byte offsets, unaffected by multi-byte characters and CRLF line ends
+        file = "tests/core/data/Dominion_CVRs/test_5.10.50.85.Dominion.json"
+        with open(file, encoding="utf-8") as f:
+            text = f.read().replace('"ElectionId": "GENERAL ELECTION"', '"ElectionId": "ÉLECTION ✓"')
+        copy = tmp_path / "CvrExport_0.json"
+        copy.write_bytes(text.replace("\n", "\r\n").encode("utf-8"))
+        expected = Dominion.read_cvrs(file, include_groups=[2])
+        index = Dominion.index_cvrs([str(copy)], include_groups=[2], chunk_size=100)
+        assert list(index) == [c.id for c in expected]
+        loaded = Dominion.load_cvrs_by_id(index, list(index)[::-1])
+        assert [str(c) for c in loaded] == [str(c) for c in expected[::-1]]
+        # compressed exports are read, indexed, and loaded without decompressing them to disk
+        (tmp_path / "CvrExport_0.json.xz").write_bytes(lzma.compress(copy.read_bytes()))
+        (tmp_path / "CvrExport_1.json.gz").write_bytes(gzip.compress(Path(file).read_bytes()))
+        copy.unlink()
+        assert [os.path.basename(f) for f in Dominion.export_files(tmp_path)] == \
+            ["CvrExport_0.json.xz", "CvrExport_1.json.gz"]
+        cvr_list = Dominion.read_cvrs_directory(tmp_path, include_groups=[2])
+        assert [str(c) for c in cvr_list] == [str(c) for c in expected + expected]
+        with pytest.warns(UserWarning, match="duplicate CVR id"):
+            index = Dominion.index_cvrs(str(tmp_path), include_groups=[2])
+        loaded = Dominion.load_cvrs_by_id(index, list(index)[::-1])
+        assert [str(c) for c in loaded] == [str(c) for c in expected[::-1]]
 
 
 ##########################################################################################
@@ -27,6 +27,52 @@ class TestHart:
         assert cvr_2.get_vote_for("MAYOR", "WRITE_IN")
         assert cvr_2.get_vote_for("PRESIDENT", "George Washington")
 
+    def test_parse_cvr(self):
+        for f in ["tests/core/data/Hart_CVRs/test_Hart_CVR_1.xml", "tests/core/data/Hart_CVRs/test_Hart_CVR_2.xml"]:
+            with open(f, "rb") as xml_file:
+                raw = xml_file.read()
+            expected = str(Hart.read_cvr(raw.decode()))
+            assert str(Hart.parse_cvr(raw)) == expected
+            assert str(Hart.parse_cvr(raw.decode())) == expected
+        no_name = raw.decode().replace("<Name>George Washington</Name>", "")
+        for read in [Hart.read_cvr, Hart.parse_cvr]:
+            with pytest.raises(Warning):
+                read(no_name)
+
+    def test_parse_cvr_precinct_split(self):
+        with open("tests/core/data/Hart_CVRs/test_Hart_CVR_2.xml", "rb") as xml_file:
+            raw = xml_file.read().decode()
+        assert "<PrecinctSplit>" in raw
+        # bytes are decoded as UTF-8, as read_cvrs_zip always did, even if the declaration says otherwise
+        latin = raw.replace('<?xml version="1.0"?>', '<?xml version="1.0" encoding="ISO-8859-1"?>')
+        latin = latin.replace("George Washington", "José Martí").encode()
+        expected = Hart.read_cvr(latin.decode())
+        assert expected.get_vote_for("PRESIDENT", "José Martí")
+        assert str(Hart.parse_cvr(latin)) == str(expected)
+        # a CVR without a PrecinctSplit or a CvrGuid is rejected, as by read_cvr
+        start, end = raw.index("<PrecinctSplit>"), raw.index("</PrecinctSplit>") + len("</PrecinctSplit>")
+        for broken in [raw[:start] + raw[end:], raw.replace("CvrGuid", "Guid")]:
+            for read in [Hart.read_cvr, Hart.parse_cvr]:
+                with pytest.raises(IndexError):
+                    read(broken)
+
+    def test_read_cvrs_zip_parallel(self):
+        cvr_list = Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip")
+        parallel = Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip", workers=2)
+        assert [str(c) for c in parallel] == [str(c) for c in cvr_list]
+        assert len(Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip", size=3, workers=2)) == 1
+
+    def test_contest_ids(self):
+        cvr_list = Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip")
+        for workers in [1, 2]:
+            projected = Hart.read_cvrs_zip("tests/core/data/Hart_CVRs.zip", workers=workers,
+                                           contest_ids={"MAYOR", "PRESIDENT"})
+            for c, p in zip(cvr_list, projected):
+                assert p.votes == {con: c.votes[con] for con in ["PRESIDENT", "MAYOR"]}
+        with open("tests/core/data/Hart_CVRs/test_Hart_CVR_2.xml") as xml_file:
+            raw = xml_file.read()
+        assert Hart.read_cvr(raw, contest_ids=["GOVERNOR"]).votes == Hart.parse_cvr(raw, ["GOVERNOR"]).votes
+        assert list(Hart.read_cvr(raw, contest_ids=["GOVERNOR"]).votes) == ["GOVERNOR"]
 
     def test_prep_manifest(self):
         # without phantoms
@@ -78,6 +124,8 @@ class TestHart:
         assert sample_order["1_1"]["selection_order"] == 0
         assert cvr_sample[1] == cvr_list[1]
         assert mvr_phantoms_sample == []
+        lookup = Hart.manifest_lookup(manifest)
+        assert Hart.sample_from_cvrs(cvr_list, manifest, sampled_cvr_indices, lookup=lookup)[0] == cards_to_retrieve
 
 
 ##########################################################################################